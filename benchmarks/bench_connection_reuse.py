@@ -0,0 +1,71 @@
+"""
+Задержка повторных вызовов get_diary с переиспользованием соединений (keep-alive) и без него.
+
+Поднимает локальный aiohttp сервер, ограничитель частоты отключён.
+Usage:
+    python benchmarks/bench_connection_reuse.py [число запросов]
+"""
+import asyncio
+import statistics
+import sys
+from pathlib import Path
+from time import perf_counter
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dnevnikru_aio.limiter import TokenBucket  # noqa: E402
+from dnevnikru_aio.session import ConnectorSettings, DiaryAPI  # noqa: E402
+
+DIARY_PAGE = """<html><body>
+<h5 class="h5 h5_bold">Иванов Иван, Школа №1, 9А, 2021 / 2022, с 13.09 по 19.09</h5>
+<div class="current-progress-themes"><ul></ul></div>
+<div class="current-progress-attendance"><ul></ul></div>
+<div class="current-progress-marks"><ul></ul></div>
+<div class="current-progress-schedule"><ul><li class="current-progress-schedule__item">
+<div class="current-progress-schedule__day-title">понедельник</div>
+<ul><li class="current-progress-lessons__item">Алгебра</li></ul></li></ul></div>
+<div class="current-progress-homeworks"><ul><li class="current-progress-list__item"><b>Алгебра</b>
+<p class="paragraph paragraph_no-margin paragraph_inline">№ 1</p></li></ul></div>
+</body></html>"""
+
+
+async def diary_handler(request):
+    return web.Response(text=DIARY_PAGE, content_type="text/html")
+
+
+async def measure(base: str, settings: ConnectorSettings, count: int):
+    api = DiaryAPI("login", "password", limiter=TokenBucket(rate=1e6, burst=1_000_000),
+                   connector_settings=settings)
+    api.WEEK_DIARY_URI = base + "/diary/"
+    latencies = []
+    async with api:
+        for _ in range(count):
+            start = perf_counter()
+            await api.get_diary("13.09.2021")
+            latencies.append(perf_counter() - start)
+    return latencies
+
+
+async def main(count: int = 200):
+    app = web.Application()
+    app.router.add_get("/diary/{tail:.*}", diary_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = "http://127.0.0.1:{}".format(site._server.sockets[0].getsockname()[1])
+    print(f"{'mode':<12}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    try:
+        modes = (("keep-alive", ConnectorSettings()), ("force_close", ConnectorSettings(force_close=True)))
+        for name, settings in modes:
+            latencies = sorted(await measure(base, settings, count))
+            print(f"{name:<12}{statistics.mean(latencies) * 1000:>10.2f}{latencies[len(latencies) // 2] * 1000:>10.2f}"
+                  f"{latencies[int(len(latencies) * 0.99)] * 1000:>10.2f}")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(*[int(n) for n in sys.argv[1:2]]))
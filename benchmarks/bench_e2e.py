@@ -0,0 +1,108 @@
+"""
+Сквозной нагрузочный бенчмарк на локальной заглушке дневник.ру (benchmarks/stub_server.py).
+
+N аккаунтов одновременно проходят авторизацию, загрузку дневника и обход списка пользователей школы
+через DnevnikPool. Выводит запросов/с, p50/p99 задержки попыток запросов, число повторов и статусы ответов.
+
+Usage:
+    python benchmarks/bench_e2e.py [--accounts 50] [--school-size 1000] [--latency 0.02] [--error-rate 0.02]
+                                   [--concurrency 4] [--rate 0] [--backend lxml]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+from collections import Counter
+from pathlib import Path
+from time import perf_counter
+from typing import List
+
+from aiohttp import TraceConfig
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from dnevnikru_aio import DnevnikPool  # noqa: E402
+from dnevnikru_aio.retry import RetryPolicy  # noqa: E402
+from stub_server import StubConfig, StubServer  # noqa: E402
+
+
+class Latencies:
+    """Задержки попыток запросов через aiohttp.TraceConfig"""
+    def __init__(self):
+        self.values: List[float] = []
+        self.statuses = Counter()
+        self.trace = TraceConfig()
+        self.trace.on_request_start.append(self._start)
+        self.trace.on_request_end.append(self._end)
+        self.trace.on_request_exception.append(self._exception)
+
+    async def _start(self, session, ctx, params):
+        ctx.start = perf_counter()
+
+    async def _end(self, session, ctx, params):
+        self.values.append(perf_counter() - ctx.start)
+        self.statuses[params.response.status] += 1
+
+    async def _exception(self, session, ctx, params):
+        self.values.append(perf_counter() - ctx.start)
+        self.statuses[type(params.exception).__name__] += 1
+
+    def percentile(self, q: float) -> float:
+        values = sorted(self.values)
+        return values[min(int(len(values) * q), len(values) - 1)] if values else 0.0
+
+
+async def account_flow(pool: DnevnikPool, login: str, concurrency: int) -> int:
+    """Авторизация, дневник за неделю и обход всей школы. Возвращает число полученных пользователей"""
+    async with pool.lease(login) as d:
+        await d.get_diary("13.09.2021")
+        users = 0
+        async for page in d.get_all_peoples(concurrency=concurrency, ordered=False):
+            users += len(page.items)
+    return users
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--school-size", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа заглушки, с")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.02, help="доля ответов 429/5xx")
+    parser.add_argument("--concurrency", type=int, default=4, help="параллельных страниц при обходе школы")
+    parser.add_argument("--rate", type=float, default=0, help="общий лимит запросов/с, 0 - без лимита")
+    parser.add_argument("--backend", default="lxml", help="бэкенд парсеров")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    config = StubConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        school_size=args.school_size, seed=args.seed)
+    latencies = Latencies()
+    policy = RetryPolicy(attempts=5, backoff=0.05, max_backoff=1)
+    accounts = {f"user{i}": "password" for i in range(args.accounts)}
+    async with StubServer(config) as stub:
+        async with DnevnikPool(accounts, rate=args.rate or None, per_account=None, base_url=stub.url,
+                               parser_backend=args.backend, retry_policy=policy,
+                               trace_configs=[latencies.trace]) as pool:
+            start = perf_counter()
+            results = await asyncio.gather(*[account_flow(pool, login, args.concurrency) for login in accounts],
+                                           return_exceptions=True)
+            elapsed = perf_counter() - start
+
+    errors = Counter(type(r).__name__ for r in results if isinstance(r, BaseException))
+    users = sum(r for r in results if not isinstance(r, BaseException))
+    stats = policy.stats
+    print(f"accounts        {args.accounts} ({sum(errors.values())} failed {dict(errors)})")
+    print(f"users crawled   {users}")
+    print(f"elapsed         {elapsed:.2f} s")
+    print(f"requests        {len(latencies.values)} attempts, {len(latencies.values) / elapsed:.0f} req/s")
+    print(f"latency         mean {statistics.mean(latencies.values) * 1000:.1f} ms, "
+          f"p50 {latencies.percentile(0.5) * 1000:.1f} ms, p99 {latencies.percentile(0.99) * 1000:.1f} ms")
+    print(f"retries         {stats.retries} (failed requests {stats.failures}, delay {stats.total_delay:.2f} s)")
+    print(f"statuses        {dict(latencies.statuses)}")
+    print(f"stub logins     {stub.stats.logins}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+"""
+Задержка event loop при разборе страниц в текущем потоке и в пулах потоков/процессов.
+
+Страницы выгружаются скриптом tests/download_html.py в текущую директорию,
+по умолчанию используются обезличенные страницы из benchmarks/fixtures.
+Usage:
+    python benchmarks/bench_loop_lag.py [директория со страницами] [число страниц]
+"""
+import asyncio
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dnevnikru_aio.parsers import get_parsers, parse_page  # noqa: E402
+from dnevnikru_aio.utils import LoopLagMonitor  # noqa: E402
+
+FIXTURES = str(Path(__file__).resolve().parent / "fixtures")
+
+
+async def run(page: str, count: int, executor=None):
+    parser_cls = get_parsers("bs4").users
+    loop = asyncio.get_running_loop()
+
+    async def parse():
+        if executor is None:
+            return parse_page(parser_cls, page)
+        return await loop.run_in_executor(executor, parse_page, parser_cls, page)
+
+    async with LoopLagMonitor() as lag:
+        start = perf_counter()
+        await asyncio.gather(*[parse() for _ in range(count)])
+        elapsed = perf_counter() - start
+    return elapsed, lag
+
+
+def main(directory: str = FIXTURES, count: int = 20):
+    page = (Path(directory) / "school.html").read_text()
+    print(f"{'mode':<10}{'total s':>10}{'max lag ms':>12}{'p99 lag ms':>12}")
+    with ThreadPoolExecutor(4) as threads, ProcessPoolExecutor(4) as processes:
+        for name, executor in (("inline", None), ("threads", threads), ("processes", processes)):
+            elapsed, lag = asyncio.run(run(page, count, executor))
+            print(f"{name:<10}{elapsed:>10.2f}{lag.max_lag * 1000:>12.1f}{lag.percentile(99) * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *[int(n) for n in sys.argv[2:3]])
@@ -0,0 +1,65 @@
+"""
+Память на объект модели: модели со __slots__ против тех же dataclass с __dict__,
+и эффект интернирования повторяющихся строк.
+
+Usage:
+    python benchmarks/bench_models_memory.py [число объектов]
+"""
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dnevnikru_aio.types import Progress, User  # noqa: E402
+
+LESSONS = ["Алгебра", "Геометрия", "Физика", "Химия", "Литература", "Англ. язык"]
+TYPES = ["Ответ на уроке", "Самостоятельная работа", "Контрольная работа"]
+USER_URL = "https://dnevnik.ru/user/user.aspx?user="
+
+
+@dataclass()
+class DictUser:
+    full_name: str
+    url: str
+
+
+@dataclass()
+class DictProgress:
+    grade: str
+    type: str
+    lesson: str
+
+
+def measure(factory, count: int) -> float:
+    """Байт на объект"""
+    tracemalloc.start()
+    objects = [factory(i) for i in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return current / count
+
+
+def fresh(s: str) -> str:
+    """Новая копия строки, как после разбора страницы"""
+    return "".join(list(s))
+
+
+def main(count: int = 100_000):
+    cases = (
+        ("User __dict__", lambda i: DictUser(f"Фамилия{i} Имя Отчество", f"{USER_URL}{i}")),
+        ("User __slots__", lambda i: User(f"Фамилия{i} Имя Отчество", f"{USER_URL}{i}")),
+        ("Progress __dict__", lambda i: DictProgress(fresh("5"), fresh(TYPES[i % 3]), fresh(LESSONS[i % 6]))),
+        ("Progress __slots__", lambda i: Progress(fresh("5"), fresh(TYPES[i % 3]), fresh(LESSONS[i % 6]))),
+        ("Progress __slots__ + intern", lambda i: Progress(sys.intern(fresh("5")), sys.intern(fresh(TYPES[i % 3])),
+                                                           sys.intern(fresh(LESSONS[i % 6])))),
+    )
+    print(f"{'model':<30}{'bytes/object':>14}")
+    for name, factory in cases:
+        print(f"{name:<30}{measure(factory, count):>14.1f}")
+
+
+if __name__ == '__main__':
+    main(*[int(n) for n in sys.argv[1:2]])
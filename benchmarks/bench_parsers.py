@@ -0,0 +1,54 @@
+"""
+Сравнение скорости бэкендов парсеров на сохранённых страницах.
+
+Страницы выгружаются скриптом tests/download_html.py в текущую директорию,
+по умолчанию используются обезличенные страницы из benchmarks/fixtures.
+Usage:
+    python benchmarks/bench_parsers.py [директория со страницами] [число повторов]
+"""
+import sys
+from pathlib import Path
+from timeit import timeit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dnevnikru_aio.parsers import get_parsers  # noqa: E402
+
+FIXTURES = str(Path(__file__).resolve().parent / "fixtures")
+
+# страница -> вид парсера
+PAGES = {
+    "diary.html": "diary",
+    "diary.html (homeworks)": "homeworks",
+    "bday_calendar.html": "calendar",
+    "school.html": "users",
+    "class_users.html": "users",
+    "bday_near.html": "users",
+}
+BACKENDS = ("bs4", "lxml")
+
+
+def build(backend: str, kind: str, page: str):
+    if kind == "homeworks":
+        # секции дневника ленивые: разбирается только домашнее задание
+        return getattr(get_parsers(backend), "diary")(page).create_model.homeworks
+    parser = getattr(get_parsers(backend), kind)(page)
+    if kind == "diary":
+        diary = parser.create_model
+        return [getattr(diary, name) for name in diary.__dataclass_fields__]
+    return parser.create_model()
+
+
+def main(directory: str = FIXTURES, number: int = 20):
+    print(f"{'page':<24}" + "".join(f"{b + ' ms':>12}" for b in BACKENDS) + f"{'speedup':>10}")
+    for file, kind in PAGES.items():
+        path = Path(directory) / file.split()[0]
+        if not path.exists():
+            continue
+        page = path.read_text()
+        results = [timeit(lambda: build(b, kind, page), number=number) / number * 1000 for b in BACKENDS]
+        print(f"{file:<24}" + "".join(f"{r:>12.2f}" for r in results) + f"{results[0] / results[1]:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *[int(n) for n in sys.argv[2:3]])
@@ -0,0 +1,62 @@
+"""
+Разбор страниц BeautifulSoup целиком и только нужных поддеревьев (SoupStrainer): время и пик памяти.
+
+Страницы выгружаются скриптом tests/download_html.py в текущую директорию,
+по умолчанию используются обезличенные страницы из benchmarks/fixtures.
+Usage:
+    python benchmarks/bench_strainer.py [директория со страницами] [число повторов]
+"""
+import sys
+import tracemalloc
+from pathlib import Path
+from timeit import timeit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dnevnikru_aio.parsers import ParserBirthdayCalendar, ParserDiary, ParserUsers  # noqa: E402
+
+FIXTURES = str(Path(__file__).resolve().parent / "fixtures")
+
+PAGES = {
+    "diary.html": ParserDiary,
+    "bday_calendar.html": ParserBirthdayCalendar,
+    "school.html": ParserUsers,
+    "class_users.html": ParserUsers,
+    "bday_near.html": ParserUsers,
+}
+
+
+def build(parser_cls: type, page: str, strain: bool):
+    parser = parser_cls(page, strain=strain)
+    if parser_cls is ParserDiary:
+        diary = parser.create_model
+        return [getattr(diary, name) for name in diary.__dataclass_fields__]
+    return parser.create_model()
+
+
+def peak(parser_cls: type, page: str, strain: bool) -> int:
+    tracemalloc.start()
+    build(parser_cls, page, strain)
+    _, peak_size = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak_size
+
+
+def main(directory: str = FIXTURES, number: int = 20):
+    print(f"{'page':<20}{'full ms':>10}{'strain ms':>11}{'speedup':>9}{'full KiB':>11}{'strain KiB':>12}")
+    for file, parser_cls in PAGES.items():
+        path = Path(directory) / file
+        if not path.exists():
+            continue
+        page = path.read_text()
+        # модели совпадают в обоих режимах
+        assert build(parser_cls, page, False) == build(parser_cls, page, True)
+        full, strained = (timeit(lambda: build(parser_cls, page, s), number=number) / number * 1000
+                          for s in (False, True))
+        full_mem, strained_mem = (peak(parser_cls, page, s) / 1024 for s in (False, True))
+        print(f"{file:<20}{full:>10.2f}{strained:>11.2f}{full / strained:>8.1f}x"
+              f"{full_mem:>11.0f}{strained_mem:>12.0f}")
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *[int(n) for n in sys.argv[2:3]])
@@ -0,0 +1,127 @@
+"""
+Бенчмарк парсеров без сети: сохранённые страницы из benchmarks/fixtures и синтетические страницы
+people grid на N строк и дневники на M уроков из benchmarks/pages.py.
+
+Для каждого бэкенда и парсера выводит страниц/с, строк/с (пользователи, дни календаря, строки секций дневника)
+и пиковую память разбора одной страницы (tracemalloc: только объекты Python, память libxml2 не учитывается).
+С --json результаты сохраняются для сравнения между версиями.
+
+Usage:
+    python benchmarks/bench_suite.py [--backend bs4 lxml] [--rows 100 1000 10000] [--lessons 6 30 100]
+                                     [--time 0.5] [--json results.json]
+"""
+import argparse
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, List, NamedTuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from dnevnikru_aio.parsers import get_parsers, parse_page  # noqa: E402
+from dnevnikru_aio.types import Diary, Users, YearBirthday  # noqa: E402
+from pages import FIXTURES, diary_page, users_page  # noqa: E402
+
+# сохранённая страница -> вид парсера
+FIXTURE_KINDS = {
+    "diary.html": "diary",
+    "bday_calendar.html": "calendar",
+    "school.html": "users",
+    "class_users.html": "users",
+    "bday_near.html": "users",
+}
+
+
+class Case(NamedTuple):
+    name: str
+    kind: str
+    page: bytes
+
+
+class Result(NamedTuple):
+    case: str
+    backend: str
+    size_kib: float
+    pages_per_s: float
+    rows_per_s: float
+    peak_kib: float
+
+
+def rows(model) -> int:
+    """Число строк в модели"""
+    if isinstance(model, Users):
+        return len(model.items)
+    if isinstance(model, YearBirthday):
+        return len(model.days)
+    if isinstance(model, Diary):
+        # секции дневника ленивые, обращение к атрибутам разбирает их все
+        return sum(len(getattr(model, name)) for name in model.__dataclass_fields__ if name != "info")
+    raise TypeError(type(model))
+
+
+def parse(backend: str, kind: str, page: bytes) -> int:
+    return rows(parse_page(getattr(get_parsers(backend), kind), page, "utf-8"))
+
+
+def throughput(func: Callable[[], int], min_time: float) -> tuple:
+    """Повторяет func не меньше min_time секунд: (страниц/с, строк/с)"""
+    count, total_rows, start = 0, 0, perf_counter()
+    while True:
+        total_rows += func()
+        count += 1
+        elapsed = perf_counter() - start
+        if elapsed >= min_time:
+            return count / elapsed, total_rows / elapsed
+
+
+def peak_memory(func: Callable[[], int]) -> float:
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def cases(row_counts: List[int], lesson_counts: List[int]) -> List[Case]:
+    result = [Case(file, kind, (FIXTURES / file).read_bytes()) for file, kind in FIXTURE_KINDS.items()
+              if (FIXTURES / file).exists()]
+    result += [Case(f"users x{n}", "users", users_page(n).encode()) for n in row_counts]
+    result += [Case(f"diary x{m}", "diary", diary_page(m).encode()) for m in lesson_counts]
+    return result
+
+
+def run(backends: List[str], row_counts: List[int], lesson_counts: List[int], min_time: float) -> List[Result]:
+    results = []
+    print(f"{'case':<20}{'backend':<9}{'KiB':>8}{'pages/s':>10}{'rows/s':>12}{'peak KiB':>10}")
+    for case in cases(row_counts, lesson_counts):
+        for backend in backends:
+            func = lambda: parse(backend, case.kind, case.page)  # noqa: E731
+            pages_per_s, rows_per_s = throughput(func, min_time)
+            result = Result(case.name, backend, len(case.page) / 1024, pages_per_s, rows_per_s, peak_memory(func))
+            results.append(result)
+            print(f"{result.case:<20}{result.backend:<9}{result.size_kib:>8.0f}{result.pages_per_s:>10.1f}"
+                  f"{result.rows_per_s:>12.0f}{result.peak_kib:>10.0f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", nargs="+", default=["bs4", "lxml"])
+    parser.add_argument("--rows", nargs="+", type=int, default=[100, 1000, 10000],
+                        help="число строк синтетических страниц people grid")
+    parser.add_argument("--lessons", nargs="+", type=int, default=[6, 30, 100],
+                        help="число уроков синтетических страниц дневника")
+    parser.add_argument("--time", type=float, default=0.5, help="минимальное время замера одного случая, с")
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    args = parser.parse_args()
+    results = run(args.backend, args.rows, args.lessons, args.time)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([r._asdict() for r in results], f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Генератор синтетических страниц дневник.ру для бенчмарков без сети.
+
+Разметка повторяет блоки, которые ищут парсеры (div.current-progress-*, table.people.grid, table.calendar),
+данные обезличены. С chrome=True страница обрамляется шапкой, меню, скриптами и подвалом
+примерно того же объёма, что и на настоящем сайте.
+
+Обновить сохранённые страницы в benchmarks/fixtures:
+    python benchmarks/pages.py
+"""
+import sys
+from pathlib import Path
+from typing import Optional, Sequence
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+LESSONS = ["Алгебра", "Геометрия", "Физика", "Химия", "История", "Литература", "Англ. язык", "Биология"]
+WORKS = ["Ответ на уроке", "Самостоятельная работа", "Контрольная работа", "Домашняя работа"]
+DAYS = ["понедельник", "вторник", "среда", "четверг", "пятница", "суббота", "воскресенье"]
+MONTHS = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь", "Июль", "Август",
+          "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"]
+SURNAMES = ["Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Васильев", "Соколов"]
+NAMES = ["Иван", "Пётр", "Алексей", "Мария", "Анна", "Елена", "Дмитрий", "Ольга"]
+
+INFO = "Иванов Иван, Школа №1, 9А, 2021 / 2022, с 13.09 по 19.09"
+
+
+def chrome_header(items: int = 120) -> str:
+    menu = "".join(f'<li class="menu__item"><a class="menu__link" href="https://dnevnik.ru/section{i}">'
+                   f'Раздел {i}</a><span class="menu__badge">{i}</span></li>' for i in range(items))
+    scripts = "".join(f'<script type="text/javascript">window.__config{i} = {{"module": "m{i}", '
+                      f'"enabled": true, "items": [1, 2, 3]}};</script>' for i in range(items // 4))
+    return (f'<div class="header"><a class="header__logo" href="https://dnevnik.ru/">Дневник</a>'
+            f'<ul class="menu">{menu}</ul></div>{scripts}')
+
+
+def chrome_footer(items: int = 60) -> str:
+    links = "".join(f'<a class="footer__link" href="https://dnevnik.ru/help/{i}">Помощь {i}</a>' for i in range(items))
+    return f'<div class="footer">{links}<p class="footer__copyright">© Дневник.ру</p></div>'
+
+
+def wrap(body: str, chrome: bool = True) -> str:
+    head = '<head><meta charset="utf-8"><title>Дневник.ру</title></head>'
+    if chrome:
+        body = chrome_header() + body + chrome_footer()
+    return f"<!DOCTYPE html><html>{head}<body>{body}</body></html>"
+
+
+def full_name(i: int) -> str:
+    return f"{SURNAMES[i % len(SURNAMES)]}{i} {NAMES[i % len(NAMES)]} Отчество"
+
+
+def user_group(i: int) -> str:
+    """Группа пользователя школы: каждый десятый - учитель"""
+    return "teachers" if i % 10 == 0 else "students"
+
+
+def school_class(i: int) -> str:
+    return f"{i % 11 + 1}{'АБВ'[i % 3]}"
+
+
+def users_page(rows: int, found: int = None, start: int = 0, chrome: bool = True,
+               ids: Optional[Sequence[int]] = None) -> str:
+    """Страница people grid (школа, класс, именинники) с rows строками
+
+    :param found: число в p.found, по умолчанию rows
+    :param start: номер первого пользователя, для страниц пагинации
+    :param ids: номера пользователей страницы вместо rows подряд начиная со start
+    """
+    ids = range(start, start + rows) if ids is None else ids
+    found = len(ids) if found is None else found
+    body = "".join(
+        f'<tr><td class="tdPhoto"><img src="https://static.dnevnik.ru/u{i}.png"/></td>'
+        f'<td class="tdName"><a class="u" href="https://dnevnik.ru/user/user.aspx?user={i}">{full_name(i)}</a>'
+        f'<p class="small">Ученик, {school_class(i)}</p></td><td class="tdButtons">'
+        f'<a href="https://dnevnik.ru/messenger/{i}">Написать</a></td></tr>'
+        for i in ids)
+    counter = f'<p class="found">Найдено: {found}</p>' if found else ""
+    return wrap(f'<div class="content">{counter}<table class="people grid">{body}</table>'
+                f'<div class="pager"><a href="?page=2">2</a></div></div>', chrome)
+
+
+def diary_page(lessons: int = 6, chrome: bool = True) -> str:
+    """Страница дневника за неделю: lessons строк в каждой секции и уроков в каждом учебном дне"""
+    def item(*cells: str) -> str:
+        return f'<li class="current-progress-list__item">{"".join(cells)}</li>'
+
+    def paragraph(text: str) -> str:
+        return f'<p class="paragraph paragraph_no-margin paragraph_inline">{text}</p>'
+
+    themes = "".join(item(f"<b>{LESSONS[i % 8]}</b>", f"<p>Тема урока {i}</p>") for i in range(lessons))
+    attendance = "".join(item(f"<b>{13 + i}.09</b>", "<b>Н</b>") for i in range(min(lessons, 3)))
+    marks = "".join(item(f"<b>{5 - i % 3}</b>", f"<b>{LESSONS[i % 8]}</b>", paragraph(WORKS[i % 4]))
+                    for i in range(lessons))
+    schedule = "".join(
+        f'<li class="current-progress-schedule__item"><div class="current-progress-schedule__day-title">{day}</div>'
+        + "<ul>" + ("".join(f'<li class="current-progress-lessons__item">{LESSONS[(d + j) % 8]}</li>'
+                            for j in range(lessons)) if d < 5 else "") + "</ul></li>"
+        for d, day in enumerate(DAYS))
+    homeworks = "".join(item(f"<b>{LESSONS[i % 8]}</b>", paragraph(f"Упр. {i}, стр. {i * 3}")) for i in range(lessons))
+    return wrap(f'<div class="content"><h5 class="h5 h5_bold">{INFO}</h5>'
+                f'<div class="current-progress-themes"><ul>{themes}</ul></div>'
+                f'<div class="current-progress-attendance"><ul>{attendance}</ul></div>'
+                f'<div class="current-progress-marks"><ul>{marks}</ul></div>'
+                f'<div class="current-progress-schedule"><ul>{schedule}</ul></div>'
+                f'<div class="current-progress-homeworks"><ul>{homeworks}</ul></div></div>', chrome)
+
+
+def calendar_page(chrome: bool = True) -> str:
+    """Календарь именинников школы на год"""
+    tables = []
+    for m, month in enumerate(MONTHS, 1):
+        cells = "".join(
+            f'<td><a href="https://schools.dnevnik.ru/birthdays.aspx?school=1&amp;day={d}&amp;month={m}" '
+            f'title="{"В этот день нет дней рождения" if d % 5 == 0 else f"Дней рождения: {d % 4 + 1}"}">{d}</a></td>'
+            for d in range(1, 29))
+        tables.append(f'<table class="calendar"><caption>{month}</caption><tr>{cells}</tr></table>')
+    return wrap(f'<div class="content">{"".join(tables)}</div>', chrome)
+
+
+def userfeed_page(profile_id: str = "1000000000000000001", class_id: str = "2000000000000000002",
+                  chrome: bool = True) -> str:
+    """Лента пользователя с id профиля и класса"""
+    return wrap(f'<div class="content"><a href="https://schools.dnevnik.ru/class.aspx?class={class_id}">9А</a>'
+                f'<script>window.__user = {{"personId":"{profile_id}","roles":["EduStudent"]}};</script></div>',
+                chrome)
+
+
+# сохранённые страницы: имена как у tests/download_html.py
+FIXTURE_PAGES = {
+    "userfeed.html": lambda: userfeed_page(),
+    "diary.html": lambda: diary_page(8),
+    "bday_calendar.html": lambda: calendar_page(),
+    "school.html": lambda: users_page(200, found=1200),
+    "bday_near.html": lambda: users_page(15),
+    "class_users.html": lambda: users_page(30),
+}
+
+
+def save_fixtures(directory: Path = FIXTURES):
+    directory.mkdir(exist_ok=True)
+    for file, factory in FIXTURE_PAGES.items():
+        (directory / file).write_text(factory(), encoding="utf-8")
+
+
+if __name__ == '__main__':
+    save_fixtures(*[Path(p) for p in sys.argv[1:2]])
@@ -0,0 +1,357 @@
+"""
+Локальная заглушка дневник.ру на aiohttp для нагрузочных тестов без обращения к настоящему сайту.
+
+Отдаёт страницы из benchmarks/pages.py по путям AUTH_URI, USER_URI, SCHOOL_URI, BIRTHDAY_URI, CLASS_URI
+и WEEK_DIARY_URI. Задержка ответа, доля ответов 429/5xx и размер школы настраиваются через StubConfig.
+Клиент направляется на заглушку параметром base_url:
+
+    async with StubServer(StubConfig(school_size=5000, error_rate=0.05)) as stub:
+        async with Dnevnik(login, password, base_url=stub.url) as d:
+            await d.auth()
+
+Отдельный запуск:
+    python benchmarks/stub_server.py [--port 8080] [--school-size 1000] [--latency 0.05] [--error-rate 0.05]
+"""
+import argparse
+import asyncio
+import random
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from hashlib import sha1
+from pathlib import Path
+from typing import Optional, Union
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from pages import (calendar_page, diary_page, full_name, school_class, user_group,  # noqa: E402
+                   userfeed_page, users_page)
+
+AUTH_COOKIE = "DnevnikAuth_a"
+
+
+@dataclass()
+class StubConfig:
+    """Настройки заглушки
+
+    latency: задержка каждого ответа в секундах
+
+
+    jitter: случайная добавка к задержке, от 0 до jitter секунд
+
+
+    error_rate: доля запросов, на которые отвечает ошибкой (кроме входа)
+
+
+    error_statuses: статусы ошибок, выбираются случайно. Для 429 отправляется Retry-After
+
+
+    retry_after: значение заголовка Retry-After: число секунд или HTTP дата
+
+
+    error_body_size: размер тела ответов с ошибкой в байтах
+
+
+    school_size: число пользователей школы (school.aspx). Список фильтруется параметрами group, class и search:
+    каждый десятый пользователь - учитель (группы "teachers" и "staff"), остальные - ученики
+
+
+    school_replaced: число пользователей из середины списка школы, заменённых новыми в конце списка:
+    счётчик найденных и первая страница не меняются, меняются средние и последняя страницы
+
+
+    class_size: число учеников класса (class.aspx)
+
+
+    birthdays_near: число именинников на ближайшую неделю (birthdays.aspx)
+
+
+    per_page: пользователей на странице списка
+
+
+    lessons: уроков в дневнике за неделю
+
+
+    diary_errors: статус ответа дневника по дате недели из адреса, например {"20.09.2021": 404}
+
+
+    session_requests: через сколько запросов сессия истекает и запрос перенаправляется на вход, 0 - никогда
+
+
+    login_redirect: неавторизованный запрос перенаправляется на /login. Если False - страница входа
+    отдаётся сразу со статусом 200 по запрошенному адресу
+
+
+    reject_logins: отклонять вход: форма входа отдаётся снова, без cookies сессии
+
+
+    etag: отдавать страницы с ETag (хэш тела). На запрос с совпадающим If-None-Match - 304 без тела
+
+
+    seed: seed генератора случайных ошибок и задержек
+    """
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_statuses: tuple = (429, 500, 502, 503)
+    retry_after: Union[int, str] = 0
+    error_body_size: int = 0
+    school_size: int = 1000
+    school_replaced: int = 0
+    class_size: int = 30
+    birthdays_near: int = 15
+    per_page: int = 30
+    lessons: int = 8
+    diary_errors: dict = field(default_factory=dict)
+    session_requests: int = 0
+    login_redirect: bool = True
+    reject_logins: bool = False
+    etag: bool = False
+    seed: Optional[int] = None
+
+
+@dataclass()
+class StubStats:
+    """Счётчики заглушки: запросы по путям, ответы по статусам, число попыток входа и успешных входов"""
+    requests: Counter = field(default_factory=Counter)
+    statuses: Counter = field(default_factory=Counter)
+    login_attempts: int = 0
+    logins: int = 0
+
+
+class StubServer:
+    """Заглушка дневник.ру: aiohttp приложение на 127.0.0.1
+
+    :param config: настройки заглушки
+    :param host: адрес
+    :param port: порт, 0 - любой свободный
+    """
+    SCHOOL_ID = "1000000000000000003"
+
+    def __init__(self, config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or StubConfig()
+        self.stats = StubStats()
+        self.host = host
+        self.port = port
+        self._random = random.Random(self.config.seed)
+        self._sessions = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        # aiohttp.CookieJar не сохраняет cookies для IP адресов, поэтому клиенту отдаётся имя localhost
+        host = "localhost" if self.host == "127.0.0.1" else self.host
+        return f"http://{host}:{self.port}"
+
+    def make_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_post("/login", self.login)
+        app.router.add_get("/login", self.login_page)
+        app.router.add_get("/userfeed", self.userfeed)
+        app.router.add_get("/school.aspx", self.school)
+        app.router.add_get("/class.aspx", self.class_members)
+        app.router.add_get("/birthdays.aspx", self.birthdays)
+        app.router.add_get("/currentprogress/result/{profile}/{school}/{year}/{period}", self.diary)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        config = self.config
+        self.stats.requests[request.path.split("/")[1] or "/"] += 1
+        delay = config.latency + (self._random.uniform(0, config.jitter) if config.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if request.path != "/login" and config.error_rate and self._random.random() < config.error_rate:
+            status = self._random.choice(config.error_statuses)
+            headers = {"Retry-After": str(config.retry_after)} if status == 429 else {}
+            resp = web.Response(status=status, headers=headers, body=b"x" * config.error_body_size)
+        elif request.path != "/login" and not self._authorized(request):
+            if config.login_redirect:
+                resp = web.Response(status=302, headers={"Location": "/login"})
+            else:
+                resp = await self.login_page(request)
+        else:
+            resp = await handler(request)
+            if config.etag and resp.status == 200 and isinstance(resp.body, bytes):
+                resp = _conditional(request, resp)
+        self.stats.statuses[resp.status] += 1
+        return resp
+
+    def _authorized(self, request: web.Request) -> bool:
+        """Проверка cookie сессии. После session_requests запросов сессия истекает"""
+        token = request.cookies.get(AUTH_COOKIE)
+        if token not in self._sessions:
+            return False
+        self._sessions[token] += 1
+        limit = self.config.session_requests
+        if limit and self._sessions[token] > limit:
+            del self._sessions[token]
+            return False
+        return True
+
+    @staticmethod
+    def _html(page: bytes) -> web.Response:
+        return web.Response(body=page, content_type="text/html", charset="utf-8")
+
+    def _with_school(self, resp: web.Response) -> web.Response:
+        resp.set_cookie("t0", self.SCHOOL_ID)
+        return resp
+
+    async def login(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        self.stats.login_attempts += 1
+        if not data.get("login") or not data.get("password") or self.config.reject_logins:
+            return await self.login_page(request)
+        self.stats.logins += 1
+        token = f"{data['login']}-{self.stats.logins}"
+        self._sessions[token] = 0
+        resp = self._with_school(self._html(_userfeed()))
+        resp.set_cookie(AUTH_COOKIE, token)
+        return resp
+
+    async def login_page(self, request: web.Request) -> web.Response:
+        return self._html(b"<html><body><form method='post'><input name='login'/>"
+                          b"<input type='password' name='password'/></form></body></html>")
+
+    async def userfeed(self, request: web.Request) -> web.Response:
+        return self._with_school(self._html(_userfeed()))
+
+    def _users(self, request: web.Request, total: int) -> web.Response:
+        per_page = self.config.per_page
+        page = int(request.query.get("page", 1))
+        start = (page - 1) * per_page
+        if start >= total:
+            return self._html(_users_page(0, 0, 0))
+        return self._html(_users_page(min(per_page, total - start), total, start))
+
+    async def school(self, request: web.Request) -> web.Response:
+        query = request.query
+        group, school_group, search = query.get("group", "all"), query.get("class", ""), query.get("search", "")
+        if group == "all" and not school_group and not search:
+            if self.config.school_replaced:
+                return self._replaced(request)
+            return self._users(request, self.config.school_size)
+        ids = _school_ids(self.config.school_size, group, school_group, search.lower())
+        per_page = self.config.per_page
+        start = (int(query.get("page", 1)) - 1) * per_page
+        if start >= len(ids):
+            return self._html(_users_page(0, 0, 0))
+        return self._html(_filtered_page(ids[start:start + per_page], len(ids)))
+
+    def _replaced(self, request: web.Request) -> web.Response:
+        size, replaced, per_page = self.config.school_size, self.config.school_replaced, self.config.per_page
+        middle = size // 2
+        ids = tuple(range(middle)) + tuple(range(middle + replaced, size)) + tuple(range(size, size + replaced))
+        start = (int(request.query.get("page", 1)) - 1) * per_page
+        if start >= size:
+            return self._html(_users_page(0, 0, 0))
+        return self._html(_filtered_page(ids[start:start + per_page], size))
+
+    async def class_members(self, request: web.Request) -> web.Response:
+        return self._users(request, self.config.class_size)
+
+    async def birthdays(self, request: web.Request) -> web.Response:
+        if request.query.get("view") == "calendar":
+            return self._html(_calendar())
+        return self._users(request, self.config.birthdays_near)
+
+    async def diary(self, request: web.Request) -> web.Response:
+        status = self.config.diary_errors.get(request.match_info["period"])
+        if status:
+            return web.Response(status=status)
+        return self._html(_diary(self.config.lessons))
+
+
+def _conditional(request: web.Request, resp: web.Response) -> web.Response:
+    """ETag по телу ответа и 304 на совпадающий If-None-Match"""
+    etag = f'"{sha1(resp.body).hexdigest()[:16]}"'
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers={"ETag": etag})
+    resp.headers["ETag"] = etag
+    return resp
+
+
+# страницы строятся один раз, чтобы генерация не нагружала процесс бенчмарка
+@lru_cache(maxsize=None)
+def _userfeed() -> bytes:
+    return userfeed_page().encode()
+
+
+@lru_cache(maxsize=4096)
+def _users_page(rows: int, found: int, start: int) -> bytes:
+    return users_page(rows, found=found, start=start).encode()
+
+
+@lru_cache(maxsize=4096)
+def _filtered_page(ids: tuple, found: int) -> bytes:
+    return users_page(len(ids), found=found, ids=ids).encode()
+
+
+@lru_cache(maxsize=256)
+def _school_ids(size: int, group: str, school_group: str, search: str) -> tuple:
+    """Номера пользователей школы, подходящих под фильтры поиска"""
+    groups = {"students": ("students",), "teachers": ("teachers",), "staff": ("teachers",)}
+    allowed = groups.get(group, ()) if group != "all" else ("students", "teachers")
+    return tuple(i for i in range(size)
+                 if user_group(i) in allowed and (not school_group or school_class(i) == school_group)
+                 and (not search or search in full_name(i).lower()))
+
+
+@lru_cache(maxsize=None)
+def _calendar() -> bytes:
+    return calendar_page().encode()
+
+
+@lru_cache(maxsize=None)
+def _diary(lessons: int) -> bytes:
+    return diary_page(lessons).encode()
+
+
+async def serve(config: StubConfig, host: str, port: int):
+    async with StubServer(config, host, port) as stub:
+        print(f"stub server on {stub.url}, Ctrl+C to stop")
+        await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--school-size", type=int, default=1000)
+    parser.add_argument("--session-requests", type=int, default=0)
+    args = parser.parse_args()
+    config = StubConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        school_size=args.school_size, session_requests=args.session_requests)
+    try:
+        asyncio.run(serve(config, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,6 @@
 from dnevnikru_aio.dnevnik import Dnevnik
 from dnevnikru_aio.dnevnik import __version__
+from dnevnikru_aio.limiter import RateLimiter, TokenBucket
+from dnevnikru_aio.metrics import Metrics
+from dnevnikru_aio.pool import DnevnikPool
+from dnevnikru_aio.tracing import Tracer
@@ -0,0 +1,150 @@
+"""
+Сохранение состояния авторизации (cookies и id школы, класса и профиля) между запусками.
+
+При старте состояние загружается из хранилища, проверяется одним запросом и повторная авторизация
+выполняется только если сессия истекла. Для шифрования файла нужна библиотека cryptography:
+
+    pip install cryptography
+"""
+import json
+import os
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from time import time
+from typing import Dict, List, Optional
+
+
+@dataclass()
+class AuthState:
+    """Снимок авторизации аккаунта
+
+    login: логин
+
+
+    cookies: cookies сессии, включая DnevnikAuth_a и t0: список словарей name, value, domain, path
+
+
+    school_id: id школы
+
+
+    class_id: id класса
+
+
+    profile_id: id профиля
+
+
+    created_at: время создания снимка (unix time)
+    """
+    login: str
+    cookies: List[Dict[str, str]]
+    school_id: str
+    class_id: str
+    profile_id: str
+    created_at: float = field(default_factory=time)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AuthState":
+        data = dict(data)
+        if isinstance(data["cookies"], dict):
+            # старый формат снимка {name: value} без домена и пути
+            data["cookies"] = [{"name": name, "value": value, "domain": "", "path": "/"}
+                               for name, value in data["cookies"].items()]
+        return cls(**data)
+
+
+class AuthStore(ABC):
+    """Базовый класс хранилища снимков авторизации. Для своего хранилища переопределите load, save и delete"""
+    @abstractmethod
+    def load(self, login: str) -> Optional[AuthState]:
+        """Снимок авторизации логина или None"""
+
+    @abstractmethod
+    def save(self, state: AuthState):
+        """Сохранить снимок, заменив прежний снимок того же логина"""
+
+    @abstractmethod
+    def delete(self, login: str):
+        """Удалить снимок логина, если он есть"""
+
+
+class MemoryAuthStore(AuthStore):
+    """Хранилище в памяти процесса"""
+    def __init__(self):
+        self._states: Dict[str, AuthState] = {}
+
+    def load(self, login: str) -> Optional[AuthState]:
+        return self._states.get(login)
+
+    def save(self, state: AuthState):
+        self._states[state.login] = state
+
+    def delete(self, login: str):
+        self._states.pop(login, None)
+
+
+class FileAuthStore(AuthStore):
+    """Хранилище в локальном JSON файле. Если передан key, файл шифруется (Fernet из cryptography)
+
+    :param path: путь к файлу
+    :param key: ключ шифрования Fernet, можно получить через FileAuthStore.generate_key()
+
+    :example:
+    >>> store = FileAuthStore("auth.bin", key=os.environ["AUTH_KEY"])
+    >>> async with Dnevnik(login, password) as d:
+    ...     await d.auth(store=store)  # авторизация только если сохранённая сессия истекла
+    """
+    def __init__(self, path: str, key: Optional[bytes] = None):
+        self.path = path
+        self._fernet = None
+        if key is not None:
+            self._fernet = self._fernet_class()(key)
+
+    @staticmethod
+    def _fernet_class():
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError:
+            raise ImportError("Need install cryptography lib for encrypted auth store.\n"
+                              "Usage:\n\tpip install cryptography")
+        return Fernet
+
+    @classmethod
+    def generate_key(cls) -> bytes:
+        """Новый ключ шифрования"""
+        return cls._fernet_class().generate_key()
+
+    def _read(self) -> Dict[str, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if self._fernet is not None:
+            data = self._fernet.decrypt(data)
+        return json.loads(data.decode("utf-8"))
+
+    def _write(self, states: Dict[str, dict]):
+        data = json.dumps(states, ensure_ascii=False).encode("utf-8")
+        if self._fernet is not None:
+            data = self._fernet.encrypt(data)
+        tmp = self.path + ".tmp"
+        # файл содержит cookies сессий, доступ только владельцу
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+    def load(self, login: str) -> Optional[AuthState]:
+        state = self._read().get(login)
+        return AuthState.from_dict(state) if state else None
+
+    def save(self, state: AuthState):
+        states = self._read()
+        states[state.login] = state.to_dict()
+        self._write(states)
+
+    def delete(self, login: str):
+        states = self._read()
+        if states.pop(login, None) is not None:
+            self._write(states)
@@ -0,0 +1,144 @@
+"""
+Кэш ответов GET запросов с ревалидацией по ETag/Last-Modified.
+
+Ключ кэша - (аккаунт, url, параметры), поэтому один кэш можно разделять между клиентами разных аккаунтов.
+Вместе с телом ответа хранятся уже разобранные модели, поэтому при попадании не выполняется ни запрос,
+ни разбор страницы. При попадании возвращается тот же объект модели, что и в прошлый раз.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Any, Dict, Optional, Tuple
+
+
+@dataclass()
+class CacheEntry:
+    """Запись кэша
+
+    body: тело ответа (bytes без декодирования)
+
+
+    encoding: кодировка тела из Content-Type
+
+
+    etag: значение заголовка ETag
+
+
+    last_modified: значение заголовка Last-Modified
+
+
+    expires: время устаревания записи по time.monotonic()
+
+
+    models: разобранные модели по классу парсера
+    """
+    body: bytes
+    encoding: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    expires: float = 0.0
+    models: Dict[type, Any] = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+    @property
+    def fresh(self) -> bool:
+        return monotonic() < self.expires
+
+    def validators(self) -> Dict[str, str]:
+        """Заголовки условного запроса"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+@dataclass()
+class CacheStats:
+    """Счётчики кэша
+
+    hits: ответы из кэша без запроса
+
+
+    revalidated: записи, подтверждённые ответом 304
+
+
+    misses: загрузки страницы целиком
+
+
+    evictions: записи, вытесненные по размеру
+    """
+    hits: int = 0
+    revalidated: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class ResponseCache:
+    """LRU кэш ответов с ограничением по суммарному размеру тел ответов
+
+    :param max_size: максимальный суммарный размер тел ответов в байтах
+    :param ttl: время жизни записей в секундах по эндпоинтам, дополняет DEFAULT_TTL. 0 - не кэшировать
+    :param default_ttl: время жизни для эндпоинтов, которых нет в ttl
+
+    :example:
+    >>> cache = ResponseCache(ttl={"diary": 60})
+    >>> async with Dnevnik(login, password, cache=cache) as d:
+    ...     await d.auth()
+    ...     await d.get_diary("13.09.2021")  # запрос
+    ...     await d.get_diary("13.09.2021")  # из кэша
+    """
+    DEFAULT_TTL = {
+        "calendar": 3600.0,
+        "class_users": 600.0,
+        "users": 300.0,
+        "birthdays_near": 300.0,
+        "diary": 300.0,
+    }
+
+    def __init__(self, max_size: int = 32 * 1024 * 1024, ttl: Optional[Dict[str, float]] = None,
+                 default_ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = dict(self.DEFAULT_TTL, **(ttl or {}))
+        self.default_ttl = default_ttl
+        self.size = 0
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[Tuple, CacheEntry]" = OrderedDict()
+
+    @staticmethod
+    def make_key(scope: str, uri: str, params: Optional[dict] = None) -> Tuple:
+        return scope, uri, tuple(sorted((params or {}).items()))
+
+    def ttl_for(self, endpoint: str) -> float:
+        return self.ttl.get(endpoint, self.default_ttl)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Tuple, entry: CacheEntry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= old.size
+        if entry.size > self.max_size:
+            return
+        self._entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_size:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+            self.stats.evictions += 1
+
+    def invalidate(self, scope: Optional[str] = None):
+        """Удалить все записи или только записи аккаунта scope"""
+        for key in [k for k in self._entries if scope is None or k[0] == scope]:
+            self.size -= self._entries.pop(key).size
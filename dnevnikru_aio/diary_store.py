@@ -0,0 +1,90 @@
+"""
+Постоянное хранилище разобранных дневников по неделям в локальном файле SQLite.
+
+Запись определяется профилем, школой и ISO неделей, поэтому любые даты одной недели
+(например "12.09.2021" и "14.09.2021") попадают в одну запись. Прошедшие недели почти не меняются
+и хранятся долго, текущая и будущие - недолго.
+Файл хранилища содержит pickle моделей, открывайте только свои файлы.
+"""
+import pickle
+import sqlite3
+from datetime import date
+from time import time
+from typing import Optional
+
+from .types import Diary
+from .utils import parse_period, week_key, week_start
+
+
+class DiaryStore:
+    """Хранилище дневников, переживает перезапуск процесса
+
+    :param path: путь к файлу базы SQLite
+    :param past_ttl: время жизни прошедших недель в секундах. По умолчанию 30 дней
+    :param current_ttl: время жизни текущей и будущих недель в секундах. По умолчанию 15 минут
+
+    :example:
+    >>> store = DiaryStore("diaries.sqlite3")
+    >>> async with Dnevnik(login, password, diary_store=store) as d:
+    ...     await d.auth()
+    ...     await d.get_diary("13.09.2021")  # запрос к dnevnik.ru
+    ...     await d.get_diary("15.09.2021")  # та же неделя, из хранилища
+    """
+    def __init__(self, path: str = "diaries.sqlite3", past_ttl: float = 30 * 24 * 3600,
+                 current_ttl: float = 15 * 60):
+        self.path = path
+        self.past_ttl = past_ttl
+        self.current_ttl = current_ttl
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS diaries (
+                                profile_id TEXT NOT NULL,
+                                school_id TEXT NOT NULL,
+                                iso_year INTEGER NOT NULL,
+                                iso_week INTEGER NOT NULL,
+                                fetched_at REAL NOT NULL,
+                                expires_at REAL NOT NULL,
+                                diary BLOB NOT NULL,
+                                PRIMARY KEY (profile_id, school_id, iso_year, iso_week))""")
+        self._db.commit()
+
+    def ttl_for(self, period: str) -> float:
+        """Время жизни записи недели: прошедшие недели хранятся дольше"""
+        if week_start(parse_period(period)) < week_start(date.today()):
+            return self.past_ttl
+        return self.current_ttl
+
+    def get(self, profile_id: str, school_id: str, period: str) -> Optional[Diary]:
+        """Дневник недели, в которую входит period, или None, если записи нет или она устарела"""
+        year, week = week_key(period)
+        row = self._db.execute("SELECT diary, expires_at FROM diaries WHERE profile_id = ? AND school_id = ? "
+                               "AND iso_year = ? AND iso_week = ?", (profile_id, school_id, year, week)).fetchone()
+        if row is None or row[1] < time():
+            return None
+        return pickle.loads(row[0])
+
+    def put(self, profile_id: str, school_id: str, period: str, diary: Diary):
+        """Сохранить дневник недели, в которую входит period"""
+        year, week = week_key(period)
+        now = time()
+        self._db.execute("INSERT OR REPLACE INTO diaries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (profile_id, school_id, year, week, now, now + self.ttl_for(period),
+                          pickle.dumps(diary, pickle.HIGHEST_PROTOCOL)))
+        self._db.commit()
+
+    def delete_expired(self) -> int:
+        """Удалить устаревшие записи
+
+        :return: число удалённых записей
+        """
+        cursor = self._db.execute("DELETE FROM diaries WHERE expires_at < ?", (time(),))
+        self._db.commit()
+        return cursor.rowcount
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,244 @@
+"""
+Локальный справочник пользователей школы в файле SQLite.
+
+Справочник заполняется DiaryAPI.sync_directory обходом списков школы: всего списка, списков групп
+("students", "teachers", ...) и классов. Каждый список (scope) хранится постранично: для списка запоминается
+счётчик p.found, для страницы - хэш набора её пользователей. При повторной синхронизации список, у которого
+не изменились счётчик, первая и последняя страницы, не обходится, а из обойденных заново записываются только
+страницы с изменившимся хэшем. Изменения только в средних страницах при том же счётчике (например, один
+пользователь ушёл, другой пришёл) так не обнаруживаются - они попадают в справочник при полном обходе,
+который выполняется не реже раза в max_age секунд (параметр sync_directory).
+
+Поиск по частям имени, группе и классу выполняется по индексам базы без запросов к dnevnik.ru.
+Группы и классы, которые не синхронизировались, в поиске не находятся.
+"""
+import re
+import sqlite3
+from dataclasses import dataclass
+from hashlib import sha1
+from time import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .types import User
+
+# группы search_people, кроме "all"
+DIRECTORY_GROUPS = ("students", "staff", "administrators", "teachers", "management", "director")
+
+_WORD = re.compile(r"\w+")
+# больше любого символа в сравнении строк SQLite (BINARY, UTF-8)
+_PREFIX_END = "\U0010ffff"
+
+
+@dataclass()
+class DirectorySyncStats:
+    """Итоги синхронизации справочника
+
+    scopes: число синхронизированных списков (вся школа, группы, классы)
+
+
+    unchanged: число списков, пропущенных без обхода: совпали счётчик найденных, первая и последняя страницы
+
+
+    pages_fetched: число загруженных страниц
+
+
+    pages_changed: число страниц, записанных в справочник
+
+
+    users: число пользователей в справочнике после синхронизации
+    """
+    scopes: int = 0
+    unchanged: int = 0
+    pages_fetched: int = 0
+    pages_changed: int = 0
+    users: int = 0
+
+
+def scope_name(group: str = "all", school_class: str = "") -> str:
+    """Имя списка в справочнике: "all", "group:<группа>" или "class:<класс>" """
+    if school_class:
+        return f"class:{school_class}"
+    if group and group != "all":
+        return f"group:{group}"
+    return "all"
+
+
+def normalize_name(text: str) -> List[str]:
+    """Части имени в нижнем регистре, ё заменяется на е"""
+    return _WORD.findall(text.lower().replace("ё", "е"))
+
+
+def page_hash(users: Iterable[User]) -> str:
+    """Хэш набора пользователей страницы, не зависит от порядка строк и разметки страницы"""
+    lines = sorted(f"{user.url}\t{user.full_name}" for user in users)
+    return sha1("\n".join(lines).encode()).hexdigest()
+
+
+def _user_key(user: User) -> str:
+    # у незарегистрированных пользователей нет ссылки на профиль
+    return user.url or f"name:{user.full_name}"
+
+
+class DirectoryStore:
+    """Справочник пользователей школ, переживает перезапуск процесса
+
+    :param path: путь к файлу базы SQLite
+
+    :example:
+    >>> store = DirectoryStore("directory.sqlite3")
+    >>> async with Dnevnik(login, password, directory_store=store) as d:
+    ...     await d.auth()
+    ...     await d.sync_directory(classes=["5А"])
+    ...     users = d.find_people(name="Иван", group="students")
+    """
+    def __init__(self, path: str = "directory.sqlite3"):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                school_id TEXT NOT NULL,
+                key TEXT NOT NULL,
+                full_name TEXT NOT NULL,
+                url TEXT NOT NULL,
+                PRIMARY KEY (school_id, key)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS name_parts (
+                school_id TEXT NOT NULL,
+                part TEXT NOT NULL,
+                key TEXT NOT NULL,
+                PRIMARY KEY (school_id, part, key)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS entries (
+                school_id TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                PRIMARY KEY (school_id, scope, page, key)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS entries_key ON entries (school_id, scope, key);
+            CREATE TABLE IF NOT EXISTS pages (
+                school_id TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (school_id, scope, page)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS scopes (
+                school_id TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                found INTEGER NOT NULL,
+                synced_at REAL NOT NULL,
+                crawled_at REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (school_id, scope)) WITHOUT ROWID;
+        """)
+        # базы, созданные до появления crawled_at
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(scopes)")]
+        if "crawled_at" not in columns:
+            self._db.execute("ALTER TABLE scopes ADD COLUMN crawled_at REAL NOT NULL DEFAULT 0")
+        self._db.commit()
+
+    def scope_state(self, school_id: str, scope: str) -> Tuple[Optional[int], Dict[int, str], float]:
+        """Счётчик найденных, хэши страниц списка с прошлой синхронизации и время последнего полного обхода.
+        (None, {}, 0), если список не синхронизировался
+        """
+        row = self._db.execute("SELECT found, crawled_at FROM scopes WHERE school_id = ? AND scope = ?",
+                               (school_id, scope)).fetchone()
+        if row is None:
+            return None, {}, 0
+        hashes = dict(self._db.execute("SELECT page, hash FROM pages WHERE school_id = ? AND scope = ?",
+                                       (school_id, scope)))
+        return row[0], hashes, row[1]
+
+    def synced_at(self, school_id: str, scope: str = "all") -> Optional[float]:
+        """Время последней синхронизации списка (unix time) или None"""
+        row = self._db.execute("SELECT synced_at FROM scopes WHERE school_id = ? AND scope = ?",
+                               (school_id, scope)).fetchone()
+        return row[0] if row is not None else None
+
+    def save_scope(self, school_id: str, scope: str, found: int, pages: int,
+                   changed: Optional[Dict[int, List[User]]] = None, crawled: bool = True):
+        """Записать результат синхронизации списка одной транзакцией
+
+        :param found: счётчик найденных пользователей
+        :param pages: число страниц списка, страницы с большими номерами удаляются
+        :param changed: пользователи изменившихся страниц по номеру страницы
+        :param crawled: список обойден целиком. Если False, время последнего полного обхода не меняется
+        """
+        changed = changed or {}
+        now = time()
+        with self._db:
+            for page, users in changed.items():
+                self._db.execute("DELETE FROM entries WHERE school_id = ? AND scope = ? AND page = ?",
+                                 (school_id, scope, page))
+                for user in users:
+                    self._put_user(school_id, user)
+                self._db.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?)",
+                                     ((school_id, scope, page, _user_key(user)) for user in users))
+                self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                                 (school_id, scope, page, page_hash(users)))
+            removed = self._db.execute("DELETE FROM entries WHERE school_id = ? AND scope = ? AND page > ?",
+                                       (school_id, scope, pages)).rowcount
+            self._db.execute("DELETE FROM pages WHERE school_id = ? AND scope = ? AND page > ?",
+                             (school_id, scope, pages))
+            crawled_at = now
+            if not crawled:
+                row = self._db.execute("SELECT crawled_at FROM scopes WHERE school_id = ? AND scope = ?",
+                                       (school_id, scope)).fetchone()
+                crawled_at = row[0] if row is not None else 0
+            self._db.execute("INSERT OR REPLACE INTO scopes (school_id, scope, found, synced_at, crawled_at) "
+                             "VALUES (?, ?, ?, ?, ?)", (school_id, scope, found, now, crawled_at))
+            if changed or removed:
+                self._delete_orphans(school_id)
+
+    def _put_user(self, school_id: str, user: User):
+        key = _user_key(user)
+        row = self._db.execute("SELECT full_name, url FROM users WHERE school_id = ? AND key = ?",
+                               (school_id, key)).fetchone()
+        if row == (user.full_name, user.url):
+            return
+        self._db.execute("INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?)",
+                         (school_id, key, user.full_name, user.url))
+        self._db.execute("DELETE FROM name_parts WHERE school_id = ? AND key = ?", (school_id, key))
+        self._db.executemany("INSERT OR IGNORE INTO name_parts VALUES (?, ?, ?)",
+                             ((school_id, part, key) for part in normalize_name(user.full_name)))
+
+    def _delete_orphans(self, school_id: str):
+        """Удаление пользователей, которых нет ни в одном списке"""
+        orphans = "(SELECT key FROM users WHERE school_id = ? EXCEPT SELECT key FROM entries WHERE school_id = ?)"
+        self._db.execute(f"DELETE FROM name_parts WHERE school_id = ? AND key IN {orphans}",
+                         (school_id, school_id, school_id))
+        self._db.execute(f"DELETE FROM users WHERE school_id = ? AND key IN {orphans}",
+                         (school_id, school_id, school_id))
+
+    def find(self, school_id: str, name: str = "", group: str = "all", school_class: str = "",
+             limit: Optional[int] = None) -> List[User]:
+        """Поиск пользователей в справочнике
+
+        :param name: Имя/Фамилия/Отчество по отдельности или вместе, каждая часть ищется по началу слова
+        :param group: группа, "all" - без фильтра по группе
+        :param school_class: класс, как в параметре school_group search_people
+        :param limit: максимальное число результатов
+        :return: пользователи по алфавиту
+        """
+        query = "SELECT full_name, url FROM users WHERE school_id = ?"
+        args: list = [school_id]
+        for part in normalize_name(name):
+            query += " AND key IN (SELECT key FROM name_parts WHERE school_id = ? AND part >= ? AND part < ?)"
+            args += [school_id, part, part + _PREFIX_END]
+        for scope in {scope_name(group=group), scope_name(school_class=school_class)} - {"all"}:
+            query += " AND key IN (SELECT key FROM entries WHERE school_id = ? AND scope = ?)"
+            args += [school_id, scope]
+        query += " ORDER BY full_name"
+        if limit is not None:
+            query += " LIMIT ?"
+            args.append(limit)
+        return [User(full_name=full_name, url=url) for full_name, url in self._db.execute(query, args)]
+
+    def count(self, school_id: str) -> int:
+        """Число пользователей школы в справочнике"""
+        return self._db.execute("SELECT COUNT(*) FROM users WHERE school_id = ?", (school_id,)).fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
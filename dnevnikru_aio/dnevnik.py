@@ -1,14 +1,25 @@
 from datetime import date
-from typing import AsyncIterable, Optional
+from typing import AsyncIterable, Iterable, Optional
 
-from .types import Diary, YearBirthday, Users
+from .auth_store import AuthStore
+from .directory_store import DirectorySyncStats
+from .types import Diary, YearBirthday, User, Users
 from .session import DiaryAPI
 
 __version__ = "1.0"
 
 
 class Dnevnik:
-    """Высокоуровневый API для работы с dnevnik.ru"""
+    """Высокоуровневый API для работы с dnevnik.ru
+
+    Дополнительные именованные аргументы передаются в DiaryAPI, например limiter - общий
+    ограничитель частоты запросов для нескольких аккаунтов (см. dnevnikru_aio.limiter)
+    или connector_settings - настройки пула соединений (см. session.ConnectorSettings),
+    metrics - сбор метрик запросов и разбора (см. dnevnikru_aio.metrics),
+    tracer - дерево интервалов каждого вызова (см. dnevnikru_aio.tracing),
+    directory_store - локальный справочник пользователей школы (см. dnevnikru_aio.directory_store).
+    Сетевая сессия создаётся при первом запросе
+    """
     def __init__(self, login, password, **kwargs):
         self.__login = login
         self.__password = password
@@ -19,15 +30,33 @@ class Dnevnik:
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.diary_api.session.close()
+        await self.diary_api.close()
 
-    async def auth(self) -> bool:
+    async def auth(self, store: Optional[AuthStore] = None) -> bool:
         """Метод авторизации через dnevnik.ru **не через госулуги**
 
+        Если передано хранилище, сначала восстанавливается сохранённая сессия и проверяется одним запросом.
+        Логин выполняется только если сохранённой сессии нет или она истекла, новый снимок сохраняется в store
+
+        :param AuthStore store: хранилище снимков авторизации (см. dnevnikru_aio.auth_store)
         :raise: ClientConnectionError при неудачной авторизации
         :return: True если авторизация прошла успешно
+
+        :example:
+        >>> store = FileAuthStore("auth.bin", key=key)
+        >>> await Dnevnik.auth(store=store)
+        True
         """
-        return await self.diary_api.auth()
+        if store is None:
+            return await self.diary_api.auth()
+        state = store.load(self.__login)
+        if state is not None:
+            self.diary_api.import_auth(state)
+            if await self.diary_api.validate_auth():
+                return True
+        result = await self.diary_api.auth()
+        store.save(self.diary_api.export_auth())
+        return result
 
     async def get_class_users(self) -> Users:
         """Метод получения всех одноклассников из своего класса
@@ -42,7 +71,8 @@ class Dnevnik:
         return await self.diary_api.get_class_users()
 
     async def search_people(self, name: str = "", group: str = "all",
-                            school_group: str = "", max_page: Optional[int] = None) -> AsyncIterable[Users]:
+                            school_group: str = "", max_page: Optional[int] = None, concurrency: int = 1,
+                            ordered: bool = True, prefetch: int = 0) -> AsyncIterable[Users]:
         """Поиск людей из всей школы. Если дополнительные параметры не переданы, то вернёт всех пользователей.
         Если ничего не найдёт, вернёт пустой итератор
 
@@ -52,6 +82,12 @@ class Dnevnik:
         :param str group: поиск по категории. По умолчанию или при некорректном вводе устанавливается "all".
         :param str school_group: поиск по номеру класса
         :param int max_page: максимальное число итераций страниц. По умолчанию обходит все
+        :param int concurrency: число параллельно загружаемых страниц. По умолчанию 1 (последовательный обход).
+            При значении больше 1 число страниц вычисляется по счётчику найденных пользователей с первой страницы
+        :param bool ordered: при параллельной загрузке отдавать страницы по порядку. Если False - по мере загрузки
+        :param int prefetch: сколько следующих страниц загружать и разбирать в фоне, пока обрабатывается текущая.
+            По умолчанию 0 - следующая страница запрашивается только после запроса итератора.
+            При выходе из цикла фоновые загрузки отменяются
         :return: Итератор объектов Users
         :rtype: AsyncIterable[Users]
 
@@ -68,28 +104,55 @@ class Dnevnik:
         if not max_page:
             max_page = 100_000
 
-        async for users in self.diary_api.search_people(name, group, school_group, max_page):
+        async for users in self.diary_api.search_people(name, group, school_group, max_page, concurrency=concurrency,
+                                                        ordered=ordered, prefetch=prefetch):
             yield users
 
-    async def get_all_peoples(self, max_pages: Optional[int] = None) -> AsyncIterable[Users]:
+    async def stream_peoples(self, name: str = "", group: str = "all", school_group: str = "",
+                             max_page: Optional[int] = None) -> AsyncIterable[User]:
+        """Потоковый поиск людей из всей школы: пользователи отдаются по одному по мере загрузки страниц,
+        первые пользователи доступны до окончания загрузки страницы, а память не растёт с её размером.
+
+        Параметры аналогичны search_people
+
+        :return: Итератор объектов User
+        :rtype: AsyncIterable[User]
+
+        :example:
+        >>> async for user in Dnevnik.stream_peoples(group="students"):
+        ...     print(user.full_name)
+        """
+        async for user in self.diary_api.stream_peoples(name, group, school_group, max_page):
+            yield user
+
+    async def get_all_peoples(self, max_pages: Optional[int] = None, concurrency: int = 1,
+                              ordered: bool = True, prefetch: int = 0) -> AsyncIterable[Users]:
         """Wrapper метода search_people
 
         :param int max_pages: Максимально число страниц для итерации. По умолчанию обходит все.
+        :param int concurrency: число параллельно загружаемых страниц. По умолчанию 1
+        :param bool ordered: при параллельной загрузке отдавать страницы по порядку
+        :param int prefetch: число страниц, загружаемых в фоне впрок. По умолчанию 0
         :return: Возвращает итератор объектов Users
         :rtype: AsyncIterable[Users]
         """
         if not max_pages:
             max_pages = 100_000
-        async for u in self.diary_api.get_all_peoples(max_pages):
+        async for u in self.diary_api.get_all_peoples(max_pages, concurrency=concurrency, ordered=ordered,
+                                                      prefetch=prefetch):
             yield u
 
-    async def birthdays_near(self, group: str = "all", max_pages: Optional[int] = None) -> AsyncIterable[Users]:
+    async def birthdays_near(self, group: str = "all", max_pages: Optional[int] = None, concurrency: int = 1,
+                             ordered: bool = True, prefetch: int = 0) -> AsyncIterable[Users]:
         """Поиск людей, у кого в ближайшие 2 недели будет день рождения. (Дату ДР не возвращает)
 
         Доступные категории групп: "all", "students", "staff", "class"
 
         :param str group: тип поиска подгруппы людей. По умолчанию "all"
         :param int max_pages: максимальное число страниц для итерации. По умолчанию все.
+        :param int concurrency: число параллельно загружаемых страниц. По умолчанию 1
+        :param bool ordered: при параллельной загрузке отдавать страницы по порядку
+        :param int prefetch: число страниц, загружаемых в фоне впрок. По умолчанию 0
         :return: Возвращает итератор объектов Users
         :rtype: AsyncIterable[Users]
         """
@@ -99,9 +162,57 @@ class Dnevnik:
         if not max_pages:
             max_pages = 100
 
-        async for u in self.diary_api.birthdays_near(group, max_pages):
+        async for u in self.diary_api.birthdays_near(group, max_pages, concurrency=concurrency, ordered=ordered,
+                                                     prefetch=prefetch):
             yield u
 
+    async def sync_directory(self, groups: Optional[Iterable[str]] = None, classes: Iterable[str] = (),
+                             full: bool = False, concurrency: int = 1,
+                             max_age: Optional[float] = 24 * 3600) -> DirectorySyncStats:
+        """Синхронизация локального справочника пользователей школы (параметр directory_store клиента).
+        Повторная синхронизация загружает только первую и последнюю страницы неизменившихся списков
+        и записывает только изменившиеся страницы. Изменения только в средних страницах при том же числе
+        пользователей так не видны и попадают в справочник при полном обходе списка, не реже раза в max_age секунд
+
+        :param groups: группы для поиска по группе: "students", "staff", "administrators", "teachers", "management",
+            "director". По умолчанию все
+        :param classes: классы для поиска по классу, как school_group в search_people
+        :param bool full: обойти все списки целиком
+        :param int concurrency: число параллельно загружаемых страниц
+        :param max_age: через сколько секунд после полного обхода список обходится целиком снова, None - никогда
+        :return: итоги синхронизации: число загруженных и записанных страниц, пользователей в справочнике
+        :rtype: DirectorySyncStats
+
+        :example:
+        >>> store = DirectoryStore("directory.sqlite3")
+        >>> async with Dnevnik(login, password, directory_store=store) as d:
+        ...     await d.auth()
+        ...     stats = await d.sync_directory(classes=["9А", "9Б"])
+        ...     print(stats.pages_fetched, stats.users)
+        """
+        return await self.diary_api.sync_directory(groups, classes, full=full, concurrency=concurrency,
+                                                   max_age=max_age)
+
+    def find_people(self, name: str = "", group: str = "all", school_group: str = "",
+                    limit: Optional[int] = None) -> Users:
+        """Поиск людей школы в локальном справочнике без запросов к дневник.ру. Справочник заполняется sync_directory,
+        группы и классы ищутся только среди синхронизированных. Изменения в средних страницах списка при том же
+        числе пользователей появляются в справочнике только после полного обхода (full или max_age sync_directory)
+
+        :param str name: Имя/Фамилия/Отчество по отдельности или все вместе, части ищутся по началу слова
+        :param str group: поиск по категории, как в search_people. По умолчанию или при некорректном вводе "all"
+        :param str school_group: поиск по номеру класса
+        :param int limit: максимальное число результатов
+        :return: Users object, пользователи по алфавиту
+        :rtype: Users
+
+        :example:
+        >>> users = Dnevnik.find_people(name="Иван", school_group="9А")
+        >>> for user in users:
+        ...     print(user.full_name)
+        """
+        return self.diary_api.find_people(name, group, school_group, limit)
+
     async def calendar_birthdays(self) -> YearBirthday:
         """Возвращает весь календарь с числом именинников за каждый день
 
@@ -133,6 +244,26 @@ class Dnevnik:
         """
         return await self.diary_api.get_diary(period)
 
+    async def get_diaries(self, start: str, end: str, concurrency: int = 4,
+                          ordered: bool = True) -> AsyncIterable[Diary]:
+        """Получение дневников за все недели диапазона дат
+
+        Диапазон разбивается на недели, недели загружаются параллельно. Недели без данных (каникулы) пропускаются
+
+        :param str start: начальная дата в формате "%d.%m.%Y"
+        :param str end: конечная дата в формате "%d.%m.%Y" включительно
+        :param int concurrency: число одновременно загружаемых недель. По умолчанию 4
+        :param bool ordered: отдавать дневники по порядку недель. Если False - по мере загрузки
+        :return: Итератор объектов Diary
+        :rtype: AsyncIterable[Diary]
+
+        :example:
+        >>> async for diary in Dnevnik.get_diaries("01.09.2077", "31.10.2077"):
+        ...     print(diary.info.date, len(diary.progress))
+        """
+        async for diary in self.diary_api.get_diaries(start, end, concurrency=concurrency, ordered=ordered):
+            yield diary
+
     async def close(self):
         """Закрытие сессии"""
         await self.diary_api.close()
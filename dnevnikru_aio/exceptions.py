@@ -1,3 +1,4 @@
+from aiohttp import ClientConnectionError
 
 
 class DnevnikException(Exception):
@@ -6,3 +7,16 @@ class DnevnikException(Exception):
 
 class PageNotFound(DnevnikException):
     pass
+
+
+class StatusCodeError(DnevnikException, ClientConnectionError):
+    """Сервер вернул неуспешный статус код. Наследует ClientConnectionError для совместимости"""
+    def __init__(self, status: int, url: str = ""):
+        self.status = status
+        self.url = url
+        super().__init__(f"Response return {status} code")
+
+
+class AuthExpired(DnevnikException):
+    """Сессия истекла, и повторная авторизация не удалась"""
+    pass
@@ -0,0 +1,103 @@
+"""
+Ограничители частоты запросов.
+
+Один объект ограничителя можно передать в несколько Session/DiaryAPI/Dnevnik,
+тогда общая нагрузка на dnevnik.ru не превысит заданную.
+"""
+import asyncio
+from time import monotonic
+from typing import Dict, List, Optional
+
+
+class TokenBucket:
+    """Токен-бакет: в среднем rate запросов в секунду, но не более burst подряд без ожидания
+
+    :example:
+    >>> bucket = TokenBucket(rate=2, burst=1)
+    >>> waited = await bucket.acquire()
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, host: str = "", account: str = "") -> float:
+        """Дождаться свободного токена. Ожидающие обслуживаются в порядке очереди
+
+        :param host: не используется, для совместимости с RateLimiter
+        :param account: не используется, для совместимости с RateLimiter
+        :return: время ожидания в секундах, включая ожидание в очереди
+        """
+        start = monotonic()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return monotonic() - start
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class RateLimiter:
+    """Составной ограничитель: общий лимит, лимит на хост и лимит на аккаунт.
+
+    Любой из лимитов можно не задавать (None). Бакеты для хостов и аккаунтов создаются по мере обращения.
+
+    :param rate: общий лимит запросов в секунду
+    :param burst: размер пачки для общего лимита
+    :param per_host: лимит запросов в секунду на каждый хост
+    :param per_host_burst: размер пачки для лимита на хост
+    :param per_account: лимит запросов в секунду на каждый аккаунт (логин)
+    :param per_account_burst: размер пачки для лимита на аккаунт
+
+    :example:
+    >>> limiter = RateLimiter(rate=20, burst=5, per_account=2)
+    >>> async with Dnevnik(login1, password1, limiter=limiter) as d1, \\
+    ...            Dnevnik(login2, password2, limiter=limiter) as d2:
+    ...     ...
+    """
+    def __init__(self, rate: Optional[float] = None, burst: int = 1,
+                 per_host: Optional[float] = None, per_host_burst: int = 1,
+                 per_account: Optional[float] = None, per_account_burst: int = 1):
+        self._global = TokenBucket(rate, burst) if rate else None
+        self.per_host = per_host
+        self.per_host_burst = per_host_burst
+        self.per_account = per_account
+        self.per_account_burst = per_account_burst
+        self._hosts: Dict[str, TokenBucket] = {}
+        self._accounts: Dict[str, TokenBucket] = {}
+
+    def _buckets(self, host: str, account: str) -> List[TokenBucket]:
+        buckets = []
+        if self.per_account and account:
+            if account not in self._accounts:
+                self._accounts[account] = TokenBucket(self.per_account, self.per_account_burst)
+            buckets.append(self._accounts[account])
+        if self.per_host and host:
+            if host not in self._hosts:
+                self._hosts[host] = TokenBucket(self.per_host, self.per_host_burst)
+            buckets.append(self._hosts[host])
+        if self._global:
+            buckets.append(self._global)
+        return buckets
+
+    async def acquire(self, host: str = "", account: str = "") -> float:
+        """Дождаться разрешения на запрос по всем подходящим лимитам
+
+        :param host: хост запроса
+        :param account: логин аккаунта, от имени которого идёт запрос
+        :return: суммарное время ожидания в секундах
+        """
+        start = monotonic()
+        for bucket in self._buckets(host, account):
+            await bucket.acquire()
+        return monotonic() - start
@@ -0,0 +1,215 @@
+"""
+Метрики запросов и разбора страниц.
+
+Счётчики и гистограммы с меткой эндпоинта (diary, users, calendar, auth, ...):
+
+    dns_seconds, connect_seconds: разрешение имени и установка соединения (только для новых соединений)
+    ttfb_seconds: от отправки запроса до получения заголовков ответа
+    body_seconds, response_bytes: чтение тела ответа
+    limiter_wait_seconds: ожидание ограничителя частоты перед попыткой
+    parse_seconds: разбор страницы в модель
+    requests_total, attempts_total, retries_total, failures_total: вызовы, попытки, повторы и ошибки запросов
+    responses_total{status}: ответы по статус коду
+    connections_reused_total: попытки, отправленные через уже открытое соединение
+    cache_total{result}: обращения к кэшу ответов: hit, revalidated (ответ 304) или miss
+    coalesced_total: запросы, присоединившиеся к уже выполняющемуся такому же запросу
+
+Сетевые события берутся из aiohttp.TraceConfig, который добавляется в ClientSession только при включённых метриках,
+поэтому без metrics=... клиент работает как раньше.
+
+:example:
+>>> metrics = Metrics()
+>>> metrics.add_callback(lambda name, value, labels: print(name, value, labels))
+>>> async with Dnevnik(login, password, metrics=metrics) as d:
+...     await d.auth()
+...     await d.get_diary("13.09.2021")
+>>> print(metrics.prometheus())
+"""
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import TraceConfig
+
+# границы гистограмм в секундах и байтах
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+Labels = Tuple[Tuple[str, str], ...]
+Callback = Callable[[str, float, Dict[str, str]], None]
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами, как histogram в Prometheus
+
+    :param buckets: верхние границы корзин по возрастанию
+    """
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = TIME_BUCKETS):
+        self.buckets = tuple(buckets)
+        # последняя корзина - значения больше всех границ (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float("inf")
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(граница, число значений не больше границы), последняя граница - inf"""
+        result, total = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """Сбор метрик клиента. Один объект можно передать в несколько клиентов или в DnevnikPool
+
+    :param prefix: префикс имён метрик в выводе prometheus()
+    """
+    BUCKETS = {"response_bytes": SIZE_BUCKETS}
+
+    def __init__(self, prefix: str = "dnevnik"):
+        self.prefix = prefix
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._callbacks: List[Callback] = []
+
+    def add_callback(self, callback: Callback):
+        """Вызывать callback(name, value, labels) на каждое изменение метрики"""
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback: Callback):
+        self._callbacks.remove(callback)
+
+    def _notify(self, name: str, value: float, labels: Dict[str, str]):
+        for callback in self._callbacks:
+            callback(name, value, labels)
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+        if self._callbacks:
+            self._notify(name, value, labels)
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.BUCKETS.get(name, TIME_BUCKETS))
+        histogram.observe(value)
+        if self._callbacks:
+            self._notify(name, value, labels)
+
+    def counter(self, name: str, **labels: str) -> float:
+        """Значение счётчика с точным набором меток"""
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def histogram(self, name: str, **labels: str) -> Optional[Histogram]:
+        """Гистограмма с точным набором меток"""
+        return self.histograms.get((name, tuple(sorted(labels.items()))))
+
+    def reset(self):
+        self.counters.clear()
+        self.histograms.clear()
+
+    def trace_config(self) -> TraceConfig:
+        """TraceConfig для aiohttp.ClientSession: DNS, соединение, время до заголовков ответа.
+
+        Эндпоинт запроса передаётся в trace_request_ctx={"endpoint": ...}
+        """
+        trace = TraceConfig()
+        trace.on_request_start.append(self._on_request_start)
+        trace.on_dns_resolvehost_start.append(self._on_dns_start)
+        trace.on_dns_resolvehost_end.append(self._on_dns_end)
+        trace.on_connection_create_start.append(self._on_connect_start)
+        trace.on_connection_create_end.append(self._on_connect_end)
+        trace.on_connection_reuseconn.append(self._on_connection_reuse)
+        trace.on_request_end.append(self._on_request_end)
+        return trace
+
+    @staticmethod
+    def _endpoint(ctx) -> str:
+        request_ctx = ctx.trace_request_ctx
+        return request_ctx.get("endpoint", "other") if isinstance(request_ctx, dict) else "other"
+
+    async def _on_request_start(self, session, ctx, params):
+        ctx.start = perf_counter()
+
+    async def _on_dns_start(self, session, ctx, params):
+        ctx.dns_start = perf_counter()
+
+    async def _on_dns_end(self, session, ctx, params):
+        self.observe("dns_seconds", perf_counter() - ctx.dns_start, endpoint=self._endpoint(ctx))
+
+    async def _on_connect_start(self, session, ctx, params):
+        ctx.connect_start = perf_counter()
+
+    async def _on_connect_end(self, session, ctx, params):
+        self.observe("connect_seconds", perf_counter() - ctx.connect_start, endpoint=self._endpoint(ctx))
+
+    async def _on_connection_reuse(self, session, ctx, params):
+        self.inc("connections_reused_total", endpoint=self._endpoint(ctx))
+
+    async def _on_request_end(self, session, ctx, params):
+        endpoint = self._endpoint(ctx)
+        self.observe("ttfb_seconds", perf_counter() - ctx.start, endpoint=endpoint)
+        self.inc("responses_total", endpoint=endpoint, status=str(params.response.status))
+
+    def prometheus(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            full = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {full} counter")
+            for (counter_name, labels), value in sorted(self.counters.items()):
+                if counter_name == name:
+                    lines.append(f"{full}{_format_labels(labels)} {_format_value(value)}")
+        for name in sorted({name for name, _ in self.histograms}):
+            full = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {full} histogram")
+            for (histogram_name, labels), histogram in sorted(self.histograms.items(), key=lambda i: i[0]):
+                if histogram_name != name:
+                    continue
+                for bound, count in histogram.cumulative():
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    lines.append(f"{full}_bucket{_format_labels(labels + (('le', le),))} {count}")
+                lines.append(f"{full}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                lines.append(f"{full}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{_escape(str(v))}"' for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
@@ -1,23 +1,63 @@
 import re
+from sys import intern
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer, Tag
 
 from .types import *
 
-from typing import Tuple
+from typing import Iterator, List, NamedTuple, Optional, Tuple, Union
+
+
+def _class_strainer(names: Tuple[str, ...], *classes: str) -> SoupStrainer:
+    """SoupStrainer для тегов names, у которых есть хотя бы один из css классов classes.
+
+    Строится только дерево найденных элементов, остальная страница (шапка, меню, скрипты) пропускается
+    """
+    classes = frozenset(classes)
+
+    def has_class(value) -> bool:
+        if not value:
+            return False
+        return not classes.isdisjoint(value.split() if isinstance(value, str) else value)
+
+    return SoupStrainer(list(names), class_=has_class)
+
+
+def _soup(page: Union[str, bytes], strainer: SoupStrainer = None, encoding: Optional[str] = None) -> BeautifulSoup:
+    """Дерево страницы. bytes передаются в lxml без декодирования в str, encoding - кодировка из Content-Type"""
+    if isinstance(page, bytes):
+        return BeautifulSoup(page, "lxml", parse_only=strainer, from_encoding=encoding)
+    return BeautifulSoup(page, "lxml", parse_only=strainer)
 
 
 class Parser:
-    """Статичный класс парсера"""
+    """Статичный класс парсера. Страница может быть str или bytes, поиск останавливается на первом совпадении"""
+    GROUP_ID = r"https://schools\.dnevnik\.ru/class.aspx\?class=(\d+)"
+    PROFILE_ID = r'"personId":"(\d+)"'
+    # скомпилированные выражения для str и bytes страниц
+    _PATTERNS = {
+        (name, type_): re.compile(pattern if type_ is str else pattern.encode())
+        for name, pattern in (("group", GROUP_ID), ("profile", PROFILE_ID)) for type_ in (str, bytes)
+    }
+
+    @classmethod
+    def _search(cls, name: str, page: Union[str, bytes]) -> str:
+        match = cls._PATTERNS[name, type(page)].search(page)
+        if match is None:
+            # как и раньше при пустом результате findall(...)[0]
+            raise IndexError(f"{name} id not found")
+        value = match.group(1)
+        return value.decode("ascii") if isinstance(value, bytes) else value
+
     @staticmethod
-    def parse_group_id(page: str) -> str:
+    def parse_group_id(page: Union[str, bytes]) -> str:
         """Возвращает id класса, в котором находится авторизованный пользователь"""
-        return re.findall(r"https://schools\.dnevnik\.ru/class.aspx\?class=(\d+)", page)[0]
+        return Parser._search("group", page)
 
     @staticmethod
-    def parse_profile_id(page: str) -> str:
+    def parse_profile_id(page: Union[str, bytes]) -> str:
         """Возвращает id профиля"""
-        return re.findall(r'"personId":"(\d+)"', page)[0]
+        return Parser._search("profile", page)
 
 
 class ParserDiary:
@@ -46,138 +86,139 @@ class ParserDiary:
     # пустой паттерн
     PATTERN_EMPTY = dict(name="div", class_="progress__empty-block")
 
-    def __init__(self, page: str):
-        self.soup = BeautifulSoup(page, "lxml")
-
-    @property
-    def parse_info(self) -> Tuple[str, str, str, str, str]:
-        """Основная информация авторизованного пользователя: ФИО, номер класса, школа, год
-
-        :return: name, school_name, class_name, year, date
-        :rtype: Tuple[str, str, str, str, str]
+    # css класс корня секции -> имя секции, корни ищутся за один обход страницы
+    SECTIONS = {
+        "current-progress-themes": "themes",
+        "current-progress-attendance": "attendances",
+        "current-progress-marks": "progress",
+        "current-progress-schedule": "schedules",
+        "current-progress-homeworks": "homeworks",
+    }
+    STATS_CLASSES = {"h5", "h5_bold"}
+    # разбираются только заголовок и секции дневника
+    STRAINER = _class_strainer(("div", "h5"), "h5_bold", *SECTIONS)
+
+    def __init__(self, page: Union[str, bytes], strain: bool = True, encoding: Optional[str] = None):
         """
-        name, school_name, class_name, year, date = self.soup.find(**self.PATTERN_STATS).get_text(strip=True).split(",")
-        return name, school_name, class_name, year, date
-
-    @property
-    def parse_themes(self) -> Tuple[str, str]:
-        """Темы занятий/учебный план
-
-        :return: theme_name, theme_value
-        :rtype: Tuple[str, str]
+        :param page: страница дневника, str или bytes тела ответа
+        :param strain: строить дерево только для нужных секций (STRAINER). False - вся страница
+        :param encoding: кодировка bytes страницы
         """
-        themes = self.soup.find(**self.PATTERN_THEME).find_all(**self.LINES)
-        for line in themes:
-            name = line.find(**self.NAME).get_text(strip=True)
-            val = line.find(**self.VAL).get_text(strip=True)
-            yield name, val
+        self.soup = _soup(page, self.STRAINER if strain else None, encoding)
+        self._roots = None
 
     @property
-    def parse_attendance(self) -> Tuple[str, list]:
-        """Посещаемость
+    def roots(self) -> dict:
+        """Корни секций страницы: {"info": h5, "themes": div, ...}. Ищутся один раз при первом обращении"""
+        if self._roots is None:
+            roots = {}
+            for element in self.soup.descendants:
+                if not isinstance(element, Tag) or element.name not in ("div", "h5"):
+                    continue
+                classes = element.get("class") or ()
+                if element.name == "h5":
+                    if "info" not in roots and self.STATS_CLASSES.issubset(classes):
+                        roots["info"] = element
+                else:
+                    for class_ in classes:
+                        name = self.SECTIONS.get(class_)
+                        if name is not None and name not in roots:
+                            roots[name] = element
+                if len(roots) == len(self.SECTIONS) + 1:
+                    break
+            self._roots = roots
+        return self._roots
+
+    def _lines(self, section: str, pattern: dict = None) -> list:
+        """Строки секции. Если секции нет на странице, пустой список"""
+        root = self.roots.get(section)
+        return root.find_all(**(pattern or self.LINES)) if root is not None else []
+
+    def info(self) -> Info:
+        """Основная информация авторизованного пользователя: ФИО, номер класса, школа, год"""
+        return Info(*self.roots["info"].get_text(strip=True).split(","))
+
+    def themes(self) -> List[Theme]:
+        """Темы занятий/учебный план"""
+        return [Theme(name=intern(line.find(**self.NAME).get_text(strip=True)),
+                      theme=line.find(**self.VAL).get_text(strip=True))
+                for line in self._lines("themes")]
+
+    def attendances(self) -> List[Attendance]:
+        """Посещаемость. Если пропусков нет, возвращает одну пустую запись"""
+        attendances = []
+        for line in self._lines("attendances"):
+            name, val = line.find_all(**self.NAME)
+            attendances.append(Attendance(intern(name.get_text()), intern(val.get_text())))
+        return attendances or [Attendance("", [])]
 
-        :return: lesson_name, value
-        :rtype: Tuple[str, list]
-        """
-        attendance = self.soup.find(**self.PATTERN_ATTENDANCE).find_all(**self.LINES)
-        if attendance:
-            for line in attendance:
-                names = line.find_all(**self.NAME)
-                name, val = [n.get_text() for n in names]
-                yield name, val
-        else:
-            yield "", []
+    def progress(self) -> List[Progress]:
+        """Прогресс/ успеваемость"""
+        progress = []
+        for line in self._lines("progress"):
+            grade, lesson = line.find_all(**self.NAME)
+            progress.append(Progress(intern(grade.get_text()), intern(line.find(**self.VAL_2).get_text()),
+                                     intern(lesson.get_text())))
+        return progress
+
+    def schedules(self) -> List[Schedule]:
+        """Расписание занятий"""
+        schedules = []
+        for line in self._lines("schedules", self.SCHEDULE_LINE):
+            lessons = line.find_all(**self.LESSONS)
+            if lessons:
+                lessons = tuple([intern(lesson.get_text(strip=True)) for lesson in lessons])
+            schedules.append(Schedule(intern(line.find(**self.DAY).get_text(strip=True)), lessons))
+        return schedules
+
+    def homeworks(self) -> List[Homework]:
+        """Домашние задания"""
+        return [Homework(intern(line.find(**self.NAME).get_text()), line.find(**self.VAL_2).get_text())
+                for line in self._lines("homeworks")]
 
     @property
-    def parse_progress(self) -> Tuple[str, str, str]:
-        """Прогресс/ успеваемость
+    def parse_info(self) -> Tuple[str, str, str, str, str]:
+        """name, school_name, class_name, year, date. Оставлено для совместимости, используйте info()"""
+        info = self.info()
+        return info.name, info.school_name, info.class_name, info.year, info.date
 
-        :return: lesson_name, type_work, value
-        :rtype: Tuple[str, str, str]
-        """
-        progress = self.soup.find(**self.PATTERN_PROGRESS).find_all(**self.LINES)
-        for line in progress:
-            names = line.find_all(**self.NAME)
-            name, val = [n.get_text() for n in names]
-            type_ = line.find(**self.VAL_2).get_text()
-            yield name, type_, val
+    @property
+    def parse_themes(self) -> Iterator[Tuple[str, str]]:
+        """theme_name, theme_value. Оставлено для совместимости, используйте themes()"""
+        return ((t.name, t.theme) for t in self.themes())
 
     @property
-    def parse_schedule(self) -> Tuple[str, tuple]:
-        """Расписание занятий
+    def parse_attendance(self) -> Iterator[Tuple[str, list]]:
+        """lesson_name, value. Оставлено для совместимости, используйте attendances()"""
+        return ((a.date, a.stats) for a in self.attendances())
 
-        :return: day, lessons
-        :rtype: Tuple[str, tuple]
-        """
-        schedule = self.soup.find(**self.PATTERN_SCHEDULE).find_all(**self.SCHEDULE_LINE)
-        if schedule:
-            for line in schedule:
-                day = line.find(**self.DAY)
-                lessons = line.find_all(**self.LESSONS)
-                if lessons:
-                    lessons = tuple([lesson.get_text(strip=True) for lesson in lessons])
-                day = day.get_text(strip=True)
-                yield day, lessons
-        else:
-            yield []
+    @property
+    def parse_progress(self) -> Iterator[Tuple[str, str, str]]:
+        """grade, type_work, lesson_name. Оставлено для совместимости, используйте progress()"""
+        return ((p.grade, p.type, p.lesson) for p in self.progress())
 
     @property
-    def parse_homework(self) -> Tuple[str, str]:
-        """Домашние задания
+    def parse_schedule(self) -> Iterator[Tuple[str, tuple]]:
+        """day, lessons. Оставлено для совместимости, используйте schedules()"""
+        return ((sc.day, sc.items) for sc in self.schedules())
 
-        :return: lesson_name, lesson_homework
-        :rtype: Tuple[str, str]
-        """
-        homework = self.soup.find(**self.PATTERN_HOMEWORK).find_all(**self.LINES)
-        if homework:
-            for line in homework:
-                lesson_name = line.find(**self.NAME).get_text()
-                lesson_homework = line.find(**self.VAL_2).get_text()
-                yield lesson_name, lesson_homework
-        else:
-            yield []
+    @property
+    def parse_homework(self) -> Iterator[Tuple[str, str]]:
+        """lesson_name, lesson_homework. Оставлено для совместимости, используйте homeworks()"""
+        return ((hw.lesson, hw.homework) for hw in self.homeworks())
 
     def __is_empty(self, soup_: BeautifulSoup) -> bool:
         """возвращает False, если вернёт пустой элемент списка"""
         return False if soup_.find(**self.PATTERN_EMPTY) else True
 
     def _create_struct(self) -> Diary:
-        """Метод запуска парсеров и создания структуры дневника
+        """Метод создания структуры дневника. info разбирается сразу (заодно проверяется, что это страница дневника),
+        остальные секции - при первом обращении к атрибуту Diary
 
         :return: объект дневника
         :rtype: Diary
         """
-        info = Info(*self.parse_info)
-        themes = []
-        attendances = []
-        progress = []
-        homeworks = []
-        schedules = []
-
-        for name, val in self.parse_themes:
-            t = Theme(name=name, theme=val)
-            themes.append(t)
-
-        for name, vals in self.parse_attendance:
-            a = Attendance(name, vals)
-            attendances.append(a)
-
-        for ball, type_, lesson in self.parse_progress:
-            p = Progress(ball, type_, lesson)
-            progress.append(p)
-
-        for day_name, lessons in self.parse_schedule:
-            sc = Schedule(day_name, lessons)
-            schedules.append(sc)
-
-        for name, work in self.parse_homework:
-            hw = Homework(name, work)
-            homeworks.append(hw)
-
-        return Diary(info=info, themes=themes,
-                     attendances=attendances, progress=progress,
-                     schedules=schedules, homeworks=homeworks
-                     )
+        return Diary.lazy({name: getattr(self, name) for name in self.SECTIONS.values()}, info=self.info())
 
     @property
     def create_model(self) -> Diary:
@@ -195,39 +236,30 @@ class ParserBirthdayCalendar:
     PATTERN_MONTH = {"name": "caption"}
     # ссылка + число именинников
     PATTERN_COUNT = {"name": "a"}
+    STRAINER = _class_strainer(("table",), "calendar")
 
-    def __init__(self, page: str):
-        self.soup = BeautifulSoup(page, "lxml")
+    def __init__(self, page: Union[str, bytes], strain: bool = True, encoding: Optional[str] = None):
+        self.soup = _soup(page, self.STRAINER if strain else None, encoding)
 
-    def parse(self) -> dict:
-        """Метод запуска поиска дней
-        :return:
-        :rtype: dict
+    def parse(self) -> YearBirthday:
+        """Метод запуска поиска дней. Объекты Day создаются сразу при обходе календаря
+
+        :return: календарь именинников
+        :rtype: YearBirthday
         """
-        calendar_rows = self.soup.find_all(**self.PATTERN_CALENDAR)
-        days = dict()
-        for cal_row in calendar_rows:
-            month = cal_row.find(**self.PATTERN_MONTH).get_text(strip=True)  # месяц
-            rows = cal_row.find_all(**self.PATTERN_COUNT)  # строка с ссылкой и числом именинников
-            days[month] = []
-            for row in rows:
-                day = row.get_text(strip=True)
+        days = []
+        for cal_row in self.soup.find_all(**self.PATTERN_CALENDAR):
+            month = intern(cal_row.find(**self.PATTERN_MONTH).get_text(strip=True))  # месяц
+            # строка с ссылкой и числом именинников
+            for row in cal_row.find_all(**self.PATTERN_COUNT):
+                title = row["title"]
                 # число именинников
-                count = row["title"].split(": ")[1] if "В этот день нет дней рождения" not in row["title"] else 0
-                # ссылка
-                url = row["href"]
-                birthday = dict(count=int(count), day=int(day), url=url)
-                days[month].append(birthday)
-        return days
+                count = title.split(": ")[1] if "В этот день нет дней рождения" not in title else 0
+                days.append(Day(count=int(count), day=int(row.get_text(strip=True)), url=row["href"], month=month))
+        return YearBirthday(days=days)
 
     def create_model(self) -> YearBirthday:
-        calendar_ = self.parse()
-        days_models = []
-        for month, days in calendar_.items():
-            for day in days:
-                d = Day(count=day["count"], day=day["day"], url=day["url"], month=month)
-                days_models.append(d)
-        return YearBirthday(days=days_models)
+        return self.parse()
 
 
 class ParserUsers:
@@ -240,34 +272,81 @@ class ParserUsers:
     PATTERN_USER = {"class_": "u"}
     # количество всех найденных пользователей
     PATTERN_COUNT = {"name": "p", "class_": "found"}
+    DIGITS = re.compile(r"(\d+)")
+    # таблица пользователей и счётчик найденных
+    STRAINER = _class_strainer(("table", "p"), "grid", "found")
 
-    # парсер числа именниников
-
-    def __init__(self, page: str):
-        self.soup = BeautifulSoup(page, "lxml")
+    def __init__(self, page: Union[str, bytes], strain: bool = True, encoding: Optional[str] = None):
+        self.soup = _soup(page, self.STRAINER if strain else None, encoding)
 
-    def parse(self):
+    def count(self) -> int:
+        """Число найденных пользователей из p.found. 0, если счётчика нет на странице"""
         count = self.soup.find(**self.PATTERN_COUNT)
-        count = re.findall(r"(\d+)", count.get_text(strip=True)) if count else None
-        if count:
-            count = int(count[0])
-            users = dict(count=int(count), users=[])
-            rows = self.soup.find(**self.PATTERN_TABLE).find_all(**self.PATTERN_ROW)
-            for row in rows:
-                row = row.find(**self.PATTERN_USER)
-                name = row.get_text(strip=True)
-                url = row.get("href", "")
-                users["users"].append(dict(name=name, url=url))
-            return users
-        else:
-            return []
-
-    def create_model(self):
-        users = self.parse()
-        users_list = []
-        if users:
-            for user in users["users"]:
-                users_list.append(User(full_name=user["name"], url=user["url"]))
-            return Users(items=users_list, count=users["count"])
-        else:
+        count = self.DIGITS.search(count.get_text(strip=True)) if count else None
+        return int(count.group(1)) if count else 0
+
+    def iter_users(self) -> Iterator[User]:
+        """Итератор пользователей страницы без создания списка"""
+        table = self.soup.find(**self.PATTERN_TABLE)
+        if table is None:
+            return
+        for row in table.find_all(**self.PATTERN_ROW):
+            row = row.find(**self.PATTERN_USER)
+            yield User(full_name=row.get_text(strip=True), url=row.get("href", ""))
+
+    def parse(self) -> Users:
+        """Разбор страницы сразу в объект Users"""
+        count = self.count()
+        if not count:
             return Users(items=[], count=0)
+        return Users(items=list(self.iter_users()), count=count)
+
+    def create_model(self) -> Users:
+        return self.parse()
+
+
+class ParserBackend(NamedTuple):
+    """Набор классов парсеров одного бэкенда"""
+    diary: type
+    users: type
+    calendar: type
+
+
+def get_parsers(backend: str = "bs4") -> ParserBackend:
+    """Возвращает классы парсеров выбранного бэкенда
+
+    :param backend: "bs4" - BeautifulSoup (по умолчанию), "lxml" - lxml.html с XPath (быстрее)
+    """
+    if backend == "bs4":
+        return ParserBackend(diary=ParserDiary, users=ParserUsers, calendar=ParserBirthdayCalendar)
+    if backend == "lxml":
+        from .parsers_lxml import LxmlParserDiary, LxmlParserUsers, LxmlParserBirthdayCalendar
+        return ParserBackend(diary=LxmlParserDiary, users=LxmlParserUsers, calendar=LxmlParserBirthdayCalendar)
+    raise ValueError(f"Unknown parser backend: {backend!r}. Available: 'bs4', 'lxml'")
+
+
+def parse_page(parser_cls: type, page: Union[str, bytes], encoding: Optional[str] = None, lazy: bool = True):
+    """Создание модели страницы парсером parser_cls.
+
+    Функция уровня модуля, поэтому её можно передавать в ProcessPoolExecutor
+
+    :param page: str или bytes тела ответа
+    :param encoding: кодировка bytes страницы
+    :param lazy: оставить секции дневника ленивыми. False - разобрать всё сразу, например в потоке executor,
+        чтобы разбор секций не происходил позже в event loop
+    """
+    model = build_model(parser_cls(page, encoding=encoding))
+    return model if lazy else load_model(model)
+
+
+def load_model(model):
+    """Полностью разобранная модель: ленивые секции Diary разбираются, парсер и дерево страницы освобождаются"""
+    load = getattr(model, "load", None)
+    return load() if load is not None else model
+
+
+def build_model(parser):
+    """Создание модели уже разобранной страницы: create_model у парсеров бывает свойством или методом"""
+    if isinstance(getattr(type(parser), "create_model"), property):
+        return parser.create_model
+    return parser.create_model()
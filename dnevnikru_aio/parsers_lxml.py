@@ -0,0 +1,280 @@
+"""
+Парсеры на lxml.html с заранее скомпилированными XPath выражениями.
+
+Возвращают те же модели, что и парсеры из parsers.py на BeautifulSoup, но работают в несколько раз быстрее.
+Выбор бэкенда для DiaryAPI: DiaryAPI(login, password, parser_backend="lxml")
+"""
+import re
+from sys import intern
+from functools import lru_cache
+from typing import Iterator, List, Optional, Union
+
+from lxml import etree, html
+
+from .types import *
+
+
+def _has_class(*names: str) -> str:
+    """XPath условие наличия всех css классов у элемента"""
+    return " and ".join(f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')" for name in names)
+
+
+def _xpath(expr: str) -> etree.XPath:
+    return etree.XPath(expr, smart_strings=False)
+
+
+# все текстовые узлы потомков, как BeautifulSoup.get_text (без script и style)
+_TEXT = _xpath("descendant::text()[not(parent::script or parent::style)]")
+
+
+def get_text(element, strip: bool = False) -> str:
+    """Аналог Tag.get_text из BeautifulSoup"""
+    strings = _TEXT(element)
+    if strip:
+        return "".join(s.strip() for s in strings)
+    return "".join(strings)
+
+
+def _first(xpath: etree.XPath, element):
+    found = xpath(element)
+    return found[0] if found else None
+
+
+@lru_cache(maxsize=None)
+def _html_parser(encoding: str) -> html.HTMLParser:
+    return html.HTMLParser(encoding=encoding)
+
+
+def _document(page: Union[str, bytes], encoding: Optional[str] = None):
+    """Дерево страницы. bytes разбираются lxml напрямую в кодировке encoding, без копии страницы в str"""
+    if isinstance(page, bytes) and encoding:
+        return html.document_fromstring(page, parser=_html_parser(encoding.lower()))
+    return html.document_fromstring(page)
+
+
+class LxmlParserDiary:
+    """Модель парсера для объекта Diary по эндпоинту https://dnevnik.ru/currentprogress/result
+    """
+    # css класс корня секции -> имя секции, корни ищутся за один обход страницы
+    SECTIONS = {
+        "current-progress-themes": "themes",
+        "current-progress-attendance": "attendances",
+        "current-progress-marks": "progress",
+        "current-progress-schedule": "schedules",
+        "current-progress-homeworks": "homeworks",
+    }
+    STATS_CLASSES = {"h5", "h5_bold"}
+
+    LINES = _xpath(f".//li[{_has_class('current-progress-list__item')}]")
+    NAMES = _xpath(".//b")
+    VAL = _xpath("(.//p)[1]")
+    VAL_2 = _xpath(f"(.//p[{_has_class('paragraph', 'paragraph_no-margin', 'paragraph_inline')}])[1]")
+    SCHEDULE_LINE = _xpath(f".//li[{_has_class('current-progress-schedule__item')}]")
+    DAY = _xpath(f"(.//div[{_has_class('current-progress-schedule__day-title')}])[1]")
+    LESSONS = _xpath(f".//li[{_has_class('current-progress-lessons__item')}]")
+
+    def __init__(self, page: Union[str, bytes], encoding: Optional[str] = None):
+        self.root = _document(page, encoding)
+        self._roots = None
+
+    @property
+    def roots(self) -> dict:
+        """Корни секций страницы: {"info": h5, "themes": div, ...}. Ищутся один раз при первом обращении"""
+        if self._roots is None:
+            roots = {}
+            for element in self.root.iter("div", "h5"):
+                classes = element.get("class", "").split()
+                if element.tag == "h5":
+                    if "info" not in roots and self.STATS_CLASSES.issubset(classes):
+                        roots["info"] = element
+                else:
+                    for class_ in classes:
+                        name = self.SECTIONS.get(class_)
+                        if name is not None and name not in roots:
+                            roots[name] = element
+                if len(roots) == len(self.SECTIONS) + 1:
+                    break
+            self._roots = roots
+        return self._roots
+
+    def _lines(self, section: str, xpath: etree.XPath = None) -> List:
+        """Строки секции. Если секции нет на странице, пустой список"""
+        root = self.roots.get(section)
+        return (xpath or self.LINES)(root) if root is not None else []
+
+    def info(self) -> Info:
+        """Основная информация авторизованного пользователя: ФИО, номер класса, школа, год"""
+        return Info(*get_text(self.roots["info"], strip=True).split(","))
+
+    def themes(self) -> List[Theme]:
+        """Темы занятий/учебный план"""
+        return [Theme(name=intern(get_text(self.NAMES(line)[0], strip=True)),
+                      theme=get_text(self.VAL(line)[0], strip=True))
+                for line in self._lines("themes")]
+
+    def attendances(self) -> List[Attendance]:
+        """Посещаемость. Если пропусков нет, возвращает одну пустую запись"""
+        attendances = []
+        for line in self._lines("attendances"):
+            name, val = self.NAMES(line)
+            attendances.append(Attendance(intern(get_text(name)), intern(get_text(val))))
+        return attendances or [Attendance("", [])]
+
+    def progress(self) -> List[Progress]:
+        """Прогресс/ успеваемость"""
+        progress = []
+        for line in self._lines("progress"):
+            grade, lesson = self.NAMES(line)
+            progress.append(Progress(intern(get_text(grade)), intern(get_text(self.VAL_2(line)[0])),
+                                     intern(get_text(lesson))))
+        return progress
+
+    def schedules(self) -> List[Schedule]:
+        """Расписание занятий"""
+        schedules = []
+        for line in self._lines("schedules", self.SCHEDULE_LINE):
+            lessons = self.LESSONS(line)
+            if lessons:
+                lessons = tuple([intern(get_text(lesson, strip=True)) for lesson in lessons])
+            schedules.append(Schedule(intern(get_text(self.DAY(line)[0], strip=True)), lessons))
+        return schedules
+
+    def homeworks(self) -> List[Homework]:
+        """Домашние задания"""
+        return [Homework(intern(get_text(self.NAMES(line)[0])), get_text(self.VAL_2(line)[0]))
+                for line in self._lines("homeworks")]
+
+    @property
+    def create_model(self) -> Diary:
+        """Создание объекта дневника. info разбирается сразу, остальные секции - при первом обращении"""
+        return Diary.lazy({name: getattr(self, name) for name in self.SECTIONS.values()}, info=self.info())
+
+
+class LxmlParserBirthdayCalendar:
+    """Парсер календаря для объекта YearBirthday через
+    эндпоинт https://schools.dnevnik.ru/birthdays.aspx?school=000&view=calendar
+    """
+    CALENDAR = _xpath(f"//table[{_has_class('calendar')}]")
+    MONTH = _xpath("(.//caption)[1]")
+    COUNT = _xpath(".//a")
+
+    def __init__(self, page: Union[str, bytes], encoding: Optional[str] = None):
+        self.root = _document(page, encoding)
+
+    def parse(self) -> YearBirthday:
+        """Объекты Day создаются сразу при обходе календаря"""
+        days = []
+        for table in self.CALENDAR(self.root):
+            month = intern(get_text(self.MONTH(table)[0], strip=True))
+            for row in self.COUNT(table):
+                title = row.get("title", "")
+                count = title.split(": ")[1] if "В этот день нет дней рождения" not in title else 0
+                days.append(Day(count=int(count), day=int(get_text(row, strip=True)), url=row.get("href"),
+                                month=month))
+        return YearBirthday(days=days)
+
+    def create_model(self) -> YearBirthday:
+        return self.parse()
+
+
+class LxmlParserUsers:
+    """Парсер пользователей с различных страниц: от школы до списка именинников"""
+    TABLE = _xpath(f"(//table[{_has_class('people', 'grid')}])[1]")
+    ROW = _xpath(f".//td[{_has_class('tdName')}]")
+    USER = _xpath(f"(.//*[{_has_class('u')}])[1]")
+    COUNT = _xpath(f"(//p[{_has_class('found')}])[1]")
+    DIGITS = re.compile(r"(\d+)")
+
+    def __init__(self, page: Union[str, bytes], encoding: Optional[str] = None):
+        self.root = _document(page, encoding)
+
+    def count(self) -> int:
+        """Число найденных пользователей из p.found. 0, если счётчика нет на странице"""
+        count = _first(self.COUNT, self.root)
+        count = self.DIGITS.search(get_text(count, strip=True)) if count is not None else None
+        return int(count.group(1)) if count else 0
+
+    def iter_users(self) -> Iterator[User]:
+        """Итератор пользователей страницы без создания списка"""
+        table = _first(self.TABLE, self.root)
+        if table is None:
+            return
+        for row in self.ROW(table):
+            row = self.USER(row)[0]
+            yield User(full_name=get_text(row, strip=True), url=row.get("href", ""))
+
+    def parse(self) -> Users:
+        """Разбор страницы сразу в объект Users"""
+        count = self.count()
+        if not count:
+            return Users(items=[], count=0)
+        return Users(items=list(self.iter_users()), count=count)
+
+    def create_model(self) -> Users:
+        return self.parse()
+
+
+class LxmlUsersStream:
+    """Потоковый парсер страниц пользователей.
+
+    Страница подаётся частями через feed, пользователи отдаются по мере закрытия строк таблицы td.tdName,
+    обработанные строки удаляются из дерева, поэтому память не растёт с размером страницы.
+    Общее число найденных пользователей доступно в count после того, как парсер дошёл до p.found
+
+    :param encoding: кодировка страницы. По умолчанию определяется lxml
+
+    :example:
+    >>> stream = LxmlUsersStream()
+    >>> async for chunk in resp.content.iter_chunked(16384):
+    ...     for user in stream.feed(chunk):
+    ...         print(user.full_name)
+    >>> users = list(stream.close())
+    """
+    TABLE_CLASSES = {"people", "grid"}
+    ROW_CLASS = "tdName"
+    USER = LxmlParserUsers.USER
+    DIGITS = LxmlParserUsers.DIGITS
+
+    def __init__(self, encoding: Optional[str] = None):
+        self._parser = etree.HTMLPullParser(events=("end",), tag=("td", "tr", "p"), encoding=encoding)
+        self.count: Optional[int] = None
+
+    @staticmethod
+    def _classes(element) -> set:
+        return set(element.get("class", "").split())
+
+    def _in_table(self, element) -> bool:
+        for table in element.iterancestors("table"):
+            return self.TABLE_CLASSES <= self._classes(table)
+        return False
+
+    def _drain(self) -> Iterator[User]:
+        for _, element in self._parser.read_events():
+            if element.tag == "td":
+                if self.ROW_CLASS in self._classes(element) and self._in_table(element):
+                    user = _first(self.USER, element)
+                    if user is not None:
+                        yield User(full_name=get_text(user, strip=True), url=user.get("href", ""))
+            elif element.tag == "tr":
+                # строка обработана: освобождаем её и предыдущие строки
+                element.clear()
+                parent = element.getparent()
+                while element.getprevious() is not None:
+                    del parent[0]
+            elif self.count is None and "found" in self._classes(element):
+                count = self.DIGITS.search(get_text(element, strip=True))
+                if count:
+                    self.count = int(count.group(1))
+
+    def feed(self, data) -> Iterator[User]:
+        """Подать очередную часть страницы (bytes или str)
+
+        :return: пользователи из строк, закрытых в этой части
+        """
+        self._parser.feed(data)
+        return self._drain()
+
+    def close(self) -> Iterator[User]:
+        """Завершить разбор и вернуть оставшихся пользователей"""
+        self._parser.close()
+        return self._drain()
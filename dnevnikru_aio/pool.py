@@ -0,0 +1,206 @@
+"""
+Пул клиентов Dnevnik для множества аккаунтов.
+
+Все клиенты пула используют один TCPConnector (общий пул соединений и TLS сессий),
+но у каждого аккаунта своя cookie jar, поэтому авторизации не смешиваются.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator, Dict, Optional
+
+from aiohttp import CookieJar, TCPConnector
+
+from .auth_store import AuthStore
+from .dnevnik import Dnevnik
+from .limiter import RateLimiter
+from .session import ConnectorSettings, Session
+
+
+class DnevnikPool:
+    """Пул авторизованных клиентов по логину
+
+    :param accounts: словарь логин -> пароль
+    :param warmup_concurrency: число одновременных авторизаций при прогреве
+    :param rate: общий лимит запросов в секунду для всех аккаунтов пула. По умолчанию без общего лимита
+    :param burst: размер пачки для общего лимита
+    :param per_account: лимит запросов в секунду на аккаунт
+    :param per_account_burst: размер пачки для лимита на аккаунт
+    :param connector_settings: настройки общего коннектора. По умолчанию ConnectorSettings()
+    :param max_idle: через сколько секунд простоя клиент закрывается в close_idle
+    :param max_clients: максимальное число открытых клиентов. При превышении закрываются давно неиспользуемые,
+        кроме взятых через lease. Пока все клиенты взяты, открытых может быть больше max_clients
+    :param auth_store: хранилище снимков авторизации, позволяет не логиниться заново после перезапуска
+    :param kwargs: дополнительные аргументы для каждого Dnevnik (parser_backend, cache, ...)
+
+    :example:
+    >>> async with DnevnikPool({"login1": "pass1", "login2": "pass2"}, rate=10) as pool:
+    ...     failed = await pool.warmup()
+    ...     async with pool.lease("login1") as d:
+    ...         diary = await d.get_diary("13.09.2021")
+    """
+    def __init__(self, accounts: Optional[Dict[str, str]] = None, warmup_concurrency: int = 10,
+                 rate: Optional[float] = None, burst: int = 1,
+                 per_account: Optional[float] = 1 / Session.PER_REQUEST_SLEEP, per_account_burst: int = 1,
+                 connector_settings: Optional[ConnectorSettings] = None, max_idle: float = 600,
+                 max_clients: Optional[int] = None, auth_store: Optional[AuthStore] = None, **kwargs):
+        self._accounts: Dict[str, str] = dict(accounts or {})
+        self.warmup_concurrency = warmup_concurrency
+        self.limiter = RateLimiter(rate=rate, burst=burst, per_account=per_account,
+                                   per_account_burst=per_account_burst)
+        self.connector_settings = connector_settings or ConnectorSettings()
+        self.max_idle = max_idle
+        self.max_clients = max_clients
+        self.auth_store = auth_store
+        self._kwargs = kwargs
+        self._connector: Optional[TCPConnector] = None
+        self._clients: Dict[str, Dnevnik] = {}
+        self._last_used: Dict[str, float] = {}
+        # число активных lease по логину, такие клиенты не закрываются по простою и max_clients
+        self._active: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    @property
+    def connector(self) -> TCPConnector:
+        """Общий коннектор, создаётся при первом обращении"""
+        if self._connector is None or self._connector.closed:
+            self._connector = self.connector_settings.build()
+        return self._connector
+
+    def add(self, login: str, password: str):
+        """Добавить аккаунт в пул. Авторизация произойдёт при прогреве или первом get"""
+        self._accounts[login] = password
+
+    def __len__(self) -> int:
+        """число открытых клиентов"""
+        return len(self._clients)
+
+    def __contains__(self, login: str) -> bool:
+        return login in self._accounts
+
+    async def _open(self, login: str) -> Dnevnik:
+        client = Dnevnik(login, self._accounts[login], limiter=self.limiter, connector=self.connector,
+                         connector_owner=False, cookie_jar=CookieJar(), **self._kwargs)
+        try:
+            await client.auth(store=self.auth_store)
+        except BaseException:
+            await client.close()
+            raise
+        return client
+
+    async def _acquire(self, login: str, lease: bool) -> Dnevnik:
+        if login not in self._accounts:
+            raise KeyError(login)
+        lock = self._locks.get(login)
+        if lock is None:
+            lock = self._locks[login] = asyncio.Lock()
+        async with lock:
+            client = self._clients.get(login)
+            if client is None:
+                client = self._clients[login] = await self._open(login)
+            # счётчик увеличивается под блокировкой, чтобы клиент не закрыли до выхода из _acquire
+            if lease:
+                self._active[login] = self._active.get(login, 0) + 1
+            self._last_used[login] = monotonic()
+        try:
+            await self._enforce_max_clients(keep=login)
+        except BaseException:
+            if lease:
+                self._unlease(login)
+            raise
+        return client
+
+    def _unlease(self, login: str):
+        self._active[login] -= 1
+        if not self._active[login]:
+            del self._active[login]
+
+    async def get(self, login: str) -> Dnevnik:
+        """Авторизованный клиент аккаунта. Закрытые по простою клиенты открываются и авторизуются заново.
+
+        Клиент, полученный через get, может быть закрыт close_idle или при превышении max_clients
+        во время использования. Для долгих операций (обход списков) используйте lease
+
+        :raise: KeyError если аккаунт не добавлен в пул
+        """
+        return await self._acquire(login, lease=False)
+
+    @asynccontextmanager
+    async def lease(self, login: str) -> AsyncIterator[Dnevnik]:
+        """Клиент аккаунта на время блока: пока блок выполняется, клиент не закрывается по простою и max_clients
+
+        :raise: KeyError если аккаунт не добавлен в пул
+
+        :example:
+        >>> async with pool.lease("login1") as d:
+        ...     async for users in d.get_all_peoples():
+        ...         ...
+        """
+        client = await self._acquire(login, lease=True)
+        try:
+            yield client
+        finally:
+            self._unlease(login)
+            self._last_used[login] = monotonic()
+            await self._enforce_max_clients()
+
+    async def warmup(self) -> Dict[str, BaseException]:
+        """Авторизация всех аккаунтов, не более warmup_concurrency одновременно
+
+        :return: словарь логин -> ошибка для аккаунтов, которые не удалось авторизовать
+        """
+        semaphore = asyncio.Semaphore(self.warmup_concurrency)
+        failed = {}
+
+        async def login_one(login: str):
+            async with semaphore:
+                try:
+                    await self.get(login)
+                except Exception as e:
+                    failed[login] = e
+
+        await asyncio.gather(*[login_one(login) for login in self._accounts])
+        return failed
+
+    async def release(self, login: str):
+        """Закрыть клиент аккаунта. Аккаунт остаётся в пуле"""
+        client = self._clients.pop(login, None)
+        self._last_used.pop(login, None)
+        if client is not None:
+            await client.close()
+
+    async def close_idle(self, max_idle: Optional[float] = None) -> int:
+        """Закрыть клиенты, которые не использовались дольше max_idle секунд
+
+        :return: число закрытых клиентов
+        """
+        max_idle = self.max_idle if max_idle is None else max_idle
+        deadline = monotonic() - max_idle
+        idle = [login for login, used in self._last_used.items() if used < deadline and login not in self._active]
+        for login in idle:
+            await self.release(login)
+        return len(idle)
+
+    async def _enforce_max_clients(self, keep: Optional[str] = None):
+        if not self.max_clients or len(self._clients) <= self.max_clients:
+            return
+        by_age = sorted((used, login) for login, used in self._last_used.items()
+                        if login != keep and login not in self._active)
+        for _, login in by_age[:len(self._clients) - self.max_clients]:
+            # пока закрывался предыдущий клиент, этот могли взять через lease
+            if login not in self._active:
+                await self.release(login)
+
+    async def close(self):
+        """Закрыть все клиенты и общий коннектор"""
+        for login in list(self._clients):
+            await self.release(login)
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
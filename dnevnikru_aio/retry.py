@@ -0,0 +1,131 @@
+"""
+Политика повторных запросов.
+
+Повторяются только ошибки соединения, таймауты и статусы из RetryPolicy.retry_statuses (429 и 5xx).
+Остальные неуспешные статусы (например 404) сразу выбрасывают StatusCodeError.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, FrozenSet, Optional
+
+
+@dataclass()
+class RetryStats:
+    """Счётчики повторов для мониторинга
+
+    requests: число вызовов запроса
+
+
+    attempts: число отправленных попыток
+
+
+    retries: число повторов
+
+
+    failures: число запросов, завершившихся ошибкой
+
+
+    total_delay: суммарная задержка между повторами в секундах
+
+
+    statuses: число неуспешных ответов по статус коду
+
+
+    errors: число ошибок соединения по типу исключения
+    """
+    requests: int = 0
+    attempts: int = 0
+    retries: int = 0
+    failures: int = 0
+    total_delay: float = 0.0
+    statuses: Dict[int, int] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+
+    def record_status(self, status: int):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def record_error(self, error: BaseException):
+        name = type(error).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def record_retry(self, delay: float):
+        self.retries += 1
+        self.total_delay += delay
+
+
+@dataclass()
+class RetryPolicy:
+    """Настройки повторных запросов: экспоненциальная задержка со случайным разбросом и поддержка Retry-After
+
+    attempts: максимальное число попыток, включая первую
+
+
+    backoff: задержка перед первым повтором в секундах
+
+
+    multiplier: множитель задержки для каждого следующего повтора
+
+
+    max_backoff: максимальная задержка в секундах
+
+
+    jitter: доля случайного разброса задержки (0.5 - от 50% до 150%)
+
+
+    retry_statuses: статус коды, при которых запрос повторяется
+
+
+    respect_retry_after: учитывать заголовок Retry-After
+
+
+    max_retry_after: максимальная задержка из Retry-After в секундах
+
+
+    stats: счётчики повторов. Общий объект политики копит статистику всех сессий, которым он передан
+    """
+    attempts: int = 3
+    backoff: float = 0.5
+    multiplier: float = 2.0
+    max_backoff: float = 30.0
+    jitter: float = 0.5
+    retry_statuses: FrozenSet[int] = frozenset({429, 500, 502, 503, 504})
+    respect_retry_after: bool = True
+    max_retry_after: float = 60.0
+    stats: RetryStats = field(default_factory=RetryStats)
+
+    def is_retryable(self, status: int) -> bool:
+        return status in self.retry_statuses
+
+    @staticmethod
+    def parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """Значение заголовка Retry-After в секундах. Поддерживает число секунд и HTTP дату"""
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Задержка перед следующей попыткой
+
+        :param attempt: номер неудачной попытки, начиная с 1
+        :param retry_after: значение заголовка Retry-After, если есть
+        :return: задержка в секундах
+        """
+        if self.respect_retry_after:
+            seconds = self.parse_retry_after(retry_after)
+            if seconds is not None:
+                return min(seconds, self.max_retry_after)
+        delay = min(self.max_backoff, self.backoff * self.multiplier ** (attempt - 1))
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return delay
@@ -1,55 +1,365 @@
-from typing import Optional, AsyncIterable
-
-from aiohttp import ClientResponse, ClientSession, ClientConnectionError
+import re
+from concurrent.futures import Executor
+from http.cookies import SimpleCookie
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import partial
+from typing import Dict, Iterable, Optional, AsyncIterable, Tuple, Union
+
+from aiohttp import ClientResponse, ClientSession, ClientConnectionError, TCPConnector
+from yarl import URL
+from time import monotonic, perf_counter, time
 import asyncio
 
-from .parsers import Parser, ParserDiary, ParserBirthdayCalendar, ParserUsers
-from .types import Diary, YearBirthday, Users
+from .auth_store import AuthState
+from .cache import CacheEntry, ResponseCache
+from .diary_store import DiaryStore
+from .directory_store import DIRECTORY_GROUPS, DirectoryStore, DirectorySyncStats, page_hash, scope_name
+from .limiter import RateLimiter, TokenBucket
+from .metrics import Metrics
+from .tracing import NULL_SPAN, Tracer
+from .retry import RetryPolicy
+from .parsers import Parser, build_model, get_parsers, load_model, parse_page
+from .parsers_lxml import LxmlUsersStream
+from .types import Diary, YearBirthday, User, Users
 from .exceptions import *
+from .utils import iter_concurrent, iter_prefetch, parse_period, week_start
+
+
+def _charset(resp: ClientResponse) -> str:
+    """Кодировка тела из Content-Type. Без заголовка - utf-8, как у resp.text() по умолчанию"""
+    return resp.charset or "utf-8"
+
+
+class _Flight:
+    """Общий запрос нескольких ожидающих. Задача отменяется, только если отменены все ожидающие"""
+    __slots__ = ("task", "waiters", "cancelled")
+
+    def __init__(self, coro):
+        self.task = asyncio.ensure_future(coro)
+        self.waiters = 0
+        self.cancelled = False
+
+    @property
+    def joinable(self) -> bool:
+        """К запросу можно присоединиться: он не отменён и ещё выполняется"""
+        return not self.cancelled and not self.task.done()
+
+    async def wait(self):
+        self.waiters += 1
+        try:
+            return await asyncio.shield(self.task)
+        except asyncio.CancelledError:
+            if self.waiters == 1 and not self.task.done():
+                # задача завершится не сразу, новые ожидающие запускают свой запрос
+                self.cancelled = True
+                self.task.cancel()
+            raise
+        finally:
+            self.waiters -= 1
+
+
+@dataclass()
+class ConnectorSettings:
+    """Настройки пула соединений aiohttp.TCPConnector
+
+    limit: максимальное число соединений, 0 - без ограничений
+
+
+    limit_per_host: максимальное число соединений к одному хосту, 0 - без ограничений
+
+
+    keepalive_timeout: сколько секунд держать простаивающее соединение открытым
+
+
+    ttl_dns_cache: время жизни кэша DNS в секундах, None - бессрочно
+
+
+    use_dns_cache: кэшировать DNS ответы
+
+
+    force_close: закрывать соединение после каждого запроса (без keep-alive)
+
+
+    enable_cleanup_closed: принудительно закрывать повисшие SSL соединения
+    """
+    limit: int = 100
+    limit_per_host: int = 0
+    keepalive_timeout: float = 30.0
+    ttl_dns_cache: Optional[int] = 300
+    use_dns_cache: bool = True
+    force_close: bool = False
+    enable_cleanup_closed: bool = False
+
+    def build(self) -> TCPConnector:
+        """Создать коннектор. Вызывать внутри запущенного event loop"""
+        return TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                            keepalive_timeout=None if self.force_close else self.keepalive_timeout,
+                            ttl_dns_cache=self.ttl_dns_cache, use_dns_cache=self.use_dns_cache,
+                            force_close=self.force_close, enable_cleanup_closed=self.enable_cleanup_closed)
 
 
 class Session:
-    """Базовый класс отправки запросов"""
+    """Базовый класс отправки запросов.
+
+    aiohttp.ClientSession создаётся при первом запросе или входе в контекстный менеджер,
+    поэтому создание объекта не требует запущенного event loop и не открывает соединений
+
+    :param limiter: ограничитель частоты запросов (TokenBucket или RateLimiter), можно разделять между сессиями.
+        По умолчанию у каждой сессии свой TokenBucket на 1 / PER_REQUEST_SLEEP запросов в секунду
+    :param retry_policy: политика повторных запросов. Счётчики повторов доступны в retry_policy.stats
+    :param cache: кэш ответов GET запросов с ревалидацией по ETag/Last-Modified. По умолчанию выключен
+    :param connector_settings: настройки пула соединений. Не используются, если передан готовый connector
+    :param metrics: сбор метрик запросов и разбора страниц (dnevnikru_aio.metrics.Metrics). По умолчанию выключен
+    :param tracer: трассировка вызовов деревом интервалов (dnevnikru_aio.tracing.Tracer). По умолчанию выключена
+    :param kwargs: дополнительные аргументы aiohttp.ClientSession
+    """
     PER_REQUEST_SLEEP = 0.5
 
-    def __init__(self, **kwargs):
+    def __init__(self, limiter: Optional[Union[TokenBucket, RateLimiter]] = None,
+                 retry_policy: Optional[RetryPolicy] = None, cache: Optional[ResponseCache] = None,
+                 connector_settings: Optional[ConnectorSettings] = None, metrics: Optional[Metrics] = None,
+                 tracer: Optional[Tracer] = None, **kwargs):
+        self.limiter = limiter or TokenBucket(1 / self.PER_REQUEST_SLEEP)
+        self.metrics = metrics
+        self.tracer = tracer
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.cache = cache
+        # логин аккаунта для лимитов на аккаунт
+        self.account = ""
         if kwargs.get("headers"):
             self.headers = kwargs.pop("headers")
         else:
             self.headers = {"User-Agent": "Mozilla/5.0 (Wayland; Linux x86_64) AppleWebKit/537.36 ("
                                           "KHTML, like Gecko) Chrome/94.0.4606.72 Safari/537.36"}
-        self.session = ClientSession(headers=self.headers, **kwargs)
+        self.connector_settings = connector_settings
+        self._session_kwargs = kwargs
+        self._session: Optional[ClientSession] = None
+        self._closed = False
+        # счётчики успешных авторизаций и попыток переавторизации, нужны для однократной переавторизации
+        # при истечении сессии
+        self._auth_generation = 0
+        self._auth_attempts = 0
+
+    @property
+    def session(self) -> ClientSession:
+        """aiohttp.ClientSession, создаётся при первом обращении
+
+        :raise: RuntimeError если сессия уже закрыта
+        """
+        if self._session is None:
+            if self._closed:
+                raise RuntimeError("Session is closed")
+            kwargs = dict(self._session_kwargs)
+            if self.connector_settings is not None and "connector" not in kwargs:
+                kwargs["connector"] = self.connector_settings.build()
+            if self.metrics is not None:
+                kwargs["trace_configs"] = list(kwargs.get("trace_configs") or ()) + [self.metrics.trace_config()]
+            self._session = ClientSession(headers=self.headers, **kwargs)
+        return self._session
 
     async def __aenter__(self):
         """Открытие сессии через контекстный менеджер"""
         # await self.auth()
+        self.session
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.session.close()
-
-    async def _request(self, method, uri, **kwargs) -> ClientResponse:
-        """Wrapper отправки запроса. Делает 3 попытки подключения каждые 500мс.
-        Если вернёт статус код отличный от 200 или время подключения истечёт, то выбросит ошибку"""
-        for _ in range(3):
-            await asyncio.sleep(self.PER_REQUEST_SLEEP)
-            resp = await self.session.request(method, uri, **kwargs)
-            if resp.status == 200:
+        await self.close()
+
+    def _span(self, name: str, **attributes):
+        """Интервал трассировки, дочерний для текущего. Без tracer - пустой контекстный менеджер"""
+        if self.tracer is None:
+            return NULL_SPAN
+        return self.tracer.span(name, **attributes)
+
+    def _is_login_response(self, resp: ClientResponse) -> bool:
+        """True, если запрос перенаправлен на страницу входа. Переопределяется в наследниках"""
+        return False
+
+    def _is_login_page(self, body: bytes) -> bool:
+        """True, если тело ответа - страница входа, отданная без перенаправления. Переопределяется в наследниках"""
+        return False
+
+    async def _reauthenticate(self, generation: int, attempts: int):
+        """Повторная авторизация после истечения сессии. Переопределяется в наследниках"""
+        raise AuthExpired("Session expired")
+
+    async def _request(self, method, uri, reauth: bool = True, endpoint: str = "other", **kwargs) -> ClientResponse:
+        """Wrapper отправки запроса.
+
+        Если сервер перенаправил на страницу входа (сессия истекла), выполняет повторную авторизацию
+        и повторяет запрос один раз. При reauth=False ответ страницы входа возвращается как есть
+
+        :param endpoint: название эндпоинта для метрик и трассировки
+
+        :raise: AuthExpired если после повторной авторизации запрос снова попал на страницу входа
+        """
+        generation, attempts = self._auth_generation, self._auth_attempts
+        with self._span("request", method=method, url=uri, endpoint=endpoint, params=kwargs.get("params")):
+            resp = await self._send(method, uri, endpoint, **kwargs)
+            if not reauth or not self._is_login_response(resp):
                 return resp
-        raise ClientConnectionError(f"Response return {resp.status} code")
+            resp.release()
+            with self._span("reauth"):
+                await self._reauthenticate(generation, attempts)
+            resp = await self._send(method, uri, endpoint, **kwargs)
+            if self._is_login_response(resp):
+                resp.release()
+                raise AuthExpired("Session expired after re-authentication")
+            return resp
+
+    async def _send(self, method, uri, endpoint: str = "other", **kwargs) -> ClientResponse:
+        """Отправка запроса с повторами. Перед каждой попыткой ожидает разрешения ограничителя.
+
+        Ошибки соединения, таймауты, 429 и 5xx повторяются по retry_policy, остальные неуспешные статусы
+        сразу выбрасывают StatusCodeError. Ответы отброшенных попыток освобождаются"""
+        policy = self.retry_policy
+        stats = policy.stats
+        stats.requests += 1
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.inc("requests_total", endpoint=endpoint)
+            kwargs["trace_request_ctx"] = {"endpoint": endpoint}
+        host = URL(uri).host or ""
+        attempt = 0
+        while True:
+            attempt += 1
+            with self._span("limiter_wait"):
+                waited = await self.limiter.acquire(host, self.account)
+            stats.attempts += 1
+            if metrics is not None:
+                metrics.inc("attempts_total", endpoint=endpoint)
+                metrics.observe("limiter_wait_seconds", waited, endpoint=endpoint)
+            with self._span("attempt", attempt=attempt) as span:
+                try:
+                    resp = await self.session.request(method, uri, **kwargs)
+                except (ClientConnectionError, asyncio.TimeoutError) as e:
+                    span.set("exception", type(e).__name__)
+                    stats.record_error(e)
+                    if attempt >= policy.attempts:
+                        stats.failures += 1
+                        if metrics is not None:
+                            metrics.inc("failures_total", endpoint=endpoint)
+                        raise
+                    delay = policy.delay(attempt)
+                else:
+                    span.set("status", resp.status)
+                    # 304 приходит только на условные запросы из кэша
+                    if resp.status == 200 or resp.status == 304:
+                        return resp
+                    retry_after = resp.headers.get("Retry-After")
+                    resp.release()
+                    stats.record_status(resp.status)
+                    if not policy.is_retryable(resp.status) or attempt >= policy.attempts:
+                        stats.failures += 1
+                        if metrics is not None:
+                            metrics.inc("failures_total", endpoint=endpoint)
+                        raise StatusCodeError(resp.status, uri)
+                    delay = policy.delay(attempt, retry_after)
+            stats.record_retry(delay)
+            if metrics is not None:
+                metrics.inc("retries_total", endpoint=endpoint)
+            with self._span("retry_sleep", delay=delay):
+                await asyncio.sleep(delay)
 
     async def request_get(self, uri, **kwargs):
         return await self._request("GET", uri, **kwargs)
 
+    async def _read(self, resp: ClientResponse, endpoint: str = "other") -> bytes:
+        """Тело ответа. При включённых метриках учитывает время чтения и размер"""
+        if self.metrics is None and self.tracer is None:
+            return await resp.read()
+        with self._span("read", endpoint=endpoint) as span:
+            start = perf_counter()
+            body = await resp.read()
+            span.set("bytes", len(body))
+        if self.metrics is not None:
+            self.metrics.observe("body_seconds", perf_counter() - start, endpoint=endpoint)
+            self.metrics.observe("response_bytes", len(body), endpoint=endpoint)
+        return body
+
+    async def request_get_body(self, uri: str, endpoint: str = "other", **kwargs) -> Tuple[ClientResponse, bytes]:
+        """GET запрос с чтением тела. Кроме перенаправления на вход (см. _request) истечением сессии считается
+        и страница входа, отданная без перенаправления: проверяется по содержимому после чтения тела.
+        Тогда выполняется повторная авторизация и запрос повторяется один раз. Тело ответа 304 пустое
+
+        :raise: AuthExpired если после повторной авторизации снова пришла страница входа
+        """
+        generation, attempts = self._auth_generation, self._auth_attempts
+        resp = await self.request_get(uri, endpoint=endpoint, **kwargs)
+        if resp.status == 304:
+            return resp, b""
+        body = await self._read(resp, endpoint)
+        if not self._is_login_page(body):
+            return resp, body
+        with self._span("reauth", detected="content"):
+            await self._reauthenticate(generation, attempts)
+        resp = await self.request_get(uri, endpoint=endpoint, **kwargs)
+        if resp.status == 304:
+            return resp, b""
+        body = await self._read(resp, endpoint)
+        if self._is_login_page(body):
+            raise AuthExpired("Session expired after re-authentication")
+        return resp, body
+
+    async def request_get_cached(self, endpoint: str, uri: str, params: Optional[dict] = None) -> CacheEntry:
+        """GET запрос через кэш ответов. Требует включённого cache.
+
+        Свежая запись возвращается без запроса, устаревшая ревалидируется условным запросом
+        с If-None-Match/If-Modified-Since, если сервер прислал ETag или Last-Modified
+
+        :param endpoint: название эндпоинта для выбора времени жизни записи
+        """
+        cache = self.cache
+        key = cache.make_key(self.account, uri, params)
+        entry = cache.get(key)
+        if entry is not None and entry.fresh:
+            cache.stats.hits += 1
+            if self.metrics is not None:
+                self.metrics.inc("cache_total", endpoint=endpoint, result="hit")
+            return entry
+        validators = entry.validators() if entry is not None else {}
+        resp, body = await self.request_get_body(uri, params=params, headers=validators, endpoint=endpoint)
+        ttl = cache.ttl_for(endpoint)
+        if resp.status == 304 and entry is not None:
+            resp.release()
+            cache.stats.revalidated += 1
+            if self.metrics is not None:
+                self.metrics.inc("cache_total", endpoint=endpoint, result="revalidated")
+            entry.expires = monotonic() + ttl
+            return entry
+        cache.stats.misses += 1
+        if self.metrics is not None:
+            self.metrics.inc("cache_total", endpoint=endpoint, result="miss")
+        entry = CacheEntry(body=body, encoding=_charset(resp), etag=resp.headers.get("ETag"),
+                           last_modified=resp.headers.get("Last-Modified"), expires=monotonic() + ttl)
+        if ttl > 0:
+            cache.put(key, entry)
+        return entry
+
     async def request_post(self, uri, **kwargs):
         return await self._request("POST", uri, **kwargs)
 
     async def close(self):
-        await self.session.close()
+        self._closed = True
+        if self._session is not None:
+            await self._session.close()
 
 
 class DiaryAPI(Session):
-    """Класс взаимодействия с дневник.ру"""
+    """Класс взаимодействия с дневник.ру
+
+    :param parser_backend: бэкенд парсеров страниц: "bs4" (по умолчанию) или "lxml"
+    :param parse_executor: ThreadPoolExecutor или ProcessPoolExecutor для разбора страниц вне event loop.
+        По умолчанию страницы разбираются в текущем потоке
+    :param parse_inline_limit: страницы короче этого числа байт всегда разбираются в текущем потоке
+    :param diary_store: постоянное хранилище дневников по неделям для get_diary
+    :param base_url: адрес, на который переносятся все *_URI (схема, хост и порт), пути сохраняются.
+        Например, локальный сервер-заглушка benchmarks/stub_server.py для нагрузочных тестов
+    :param coalesce: объединять одновременные одинаковые запросы страниц в один запрос и один разбор
+    :param directory_store: локальный справочник пользователей школы для sync_directory и find_people
+    """
     BASE_URI = "https://schools.dnevnik.ru/"
     USER_URI = "https://dnevnik.ru/userfeed"
     AUTH_URI = "https://login.dnevnik.ru/login"
@@ -60,15 +370,43 @@ class DiaryAPI(Session):
     SCHOOL_URI = BASE_URI + "school.aspx"
     EXCEL_SCHEDULES_URI = BASE_URI + "excel.ashx"
     WEEK_DIARY_URI = "https://dnevnik.ru/currentprogress/result/"
+    # поле пароля формы входа
+    LOGIN_FORM = re.compile(rb"""<input[^>]*name=["']?password\b""", re.IGNORECASE)
 
-    def __init__(self, login, password, **kwargs):
+    def __init__(self, login, password, parser_backend: str = "bs4",
+                 parse_executor: Optional[Executor] = None, parse_inline_limit: int = 50_000,
+                 diary_store: Optional[DiaryStore] = None, base_url: Optional[str] = None, coalesce: bool = True,
+                 directory_store: Optional[DirectoryStore] = None, **kwargs):
         super().__init__(**kwargs)
+        if base_url is not None:
+            self._rebase(base_url)
+        self.parsers = get_parsers(parser_backend)
+        self.parse_executor = parse_executor
+        self.parse_inline_limit = parse_inline_limit
+        self.diary_store = diary_store
+        self.coalesce = coalesce
+        self.directory_store = directory_store
+        # выполняющиеся запросы страниц: (url, параметры, парсер) -> _Flight
+        self._inflight: Dict[tuple, _Flight] = {}
         self.__login = login
         self.__password = password
+        self.account = login
+        self._auth_lock = asyncio.Lock()
+        # ошибка последней неудачной переавторизации: (номер попытки, исключение)
+        self._auth_error: Optional[Tuple[int, Exception]] = None
         self._school_id = ""
         self._class_id = ""
         self._profile_id = ""
 
+    def _rebase(self, base_url: str):
+        """Перенос всех *_URI объекта на base_url"""
+        base = URL(base_url)
+        for name in dir(type(self)):
+            if name.endswith("_URI"):
+                uri = URL(getattr(self, name)).with_scheme(base.scheme).with_host(base.host)
+                uri = uri.with_port(base.explicit_port)
+                setattr(self, name, str(uri))
+
     def __get_school_id(self, resp: ClientResponse):
         if resp.cookies.get("t0"):
             self._school_id = resp.cookies.get("t0").value
@@ -76,12 +414,12 @@ class DiaryAPI(Session):
         raise ClientConnectionError("Auth error")
 
     @staticmethod
-    def __get_class_id(html: str) -> str:
+    def __get_class_id(html: Union[str, bytes]) -> str:
         """получение id класса, в котором находится авторизованный пользователь"""
         return Parser.parse_group_id(html)
 
     @staticmethod
-    def __get_profile_id(html: str) -> str:
+    def __get_profile_id(html: Union[str, bytes]) -> str:
         """Полученить id профиля"""
         return Parser.parse_profile_id(html)
 
@@ -97,32 +435,325 @@ class DiaryAPI(Session):
     def get_class_id(self) -> str:
         return self._class_id
 
+    async def _parse(self, parser_cls: type, page: bytes, encoding: Optional[str] = None, endpoint: str = "other",
+                     lazy: bool = True):
+        """Разбор страницы в модель: в текущем потоке или в parse_executor для больших страниц.
+        Тело ответа передаётся парсеру в bytes вместе с кодировкой, без декодирования в str.
+
+        Ленивыми остаются только секции дневников, разобранных в текущем потоке и без кэша (lazy=True):
+        ленивый дневник держит дерево страницы, а его разбор при обращении к секции идёт в event loop"""
+        if self.metrics is None:
+            return await self._parse_page(parser_cls, page, encoding, lazy)
+        start = perf_counter()
+        model = await self._parse_page(parser_cls, page, encoding, lazy)
+        self.metrics.observe("parse_seconds", perf_counter() - start, endpoint=endpoint)
+        return model
+
+    async def _parse_page(self, parser_cls: type, page: bytes, encoding: Optional[str] = None, lazy: bool = True):
+        inline = self.parse_executor is None or len(page) < self.parse_inline_limit
+        if self.tracer is not None and inline:
+            # построение дерева страницы и создание модели - отдельные интервалы
+            with self._span("parse", parser=parser_cls.__name__, bytes=len(page)):
+                parser = parser_cls(page, encoding=encoding)
+            with self._span("build", parser=parser_cls.__name__):
+                model = build_model(parser)
+                return model if lazy else load_model(model)
+        if inline:
+            return parse_page(parser_cls, page, encoding, lazy)
+        loop = asyncio.get_running_loop()
+        with self._span("parse", parser=parser_cls.__name__, bytes=len(page), executor=True):
+            # модель разбирается в executor полностью
+            return await loop.run_in_executor(self.parse_executor, parse_page, parser_cls, page, encoding, False)
+
+    async def _get_model(self, endpoint: str, uri: str, parser_cls: type, params: Optional[dict] = None):
+        """Загрузка страницы и разбор в модель. При включённом кэше модель берётся из записи кэша.
+
+        Одновременные одинаковые запросы (тот же URL, параметры и парсер) объединяются в один запрос и один разбор,
+        все ожидающие получают один и тот же объект модели или одну и ту же ошибку.
+        Отмена одного ожидающего не отменяет общий запрос, пока его ждут другие
+        """
+        with self._span(endpoint, params=params) as span:
+            if not self.coalesce:
+                return await self._fetch_model(endpoint, uri, parser_cls, params)
+            key = (uri, tuple(sorted(params.items())) if params else (), parser_cls)
+            flight = self._inflight.get(key)
+            if flight is not None and not flight.joinable:
+                flight = None
+            span.set("coalesced", flight is not None)
+            if flight is None:
+                flight = self._inflight[key] = _Flight(self._fetch_model(endpoint, uri, parser_cls, params))
+                flight.task.add_done_callback(partial(self._flight_done, key, flight))
+            elif self.metrics is not None:
+                self.metrics.inc("coalesced_total", endpoint=endpoint)
+            return await flight.wait()
+
+    def _flight_done(self, key: tuple, flight: "_Flight", task: asyncio.Task):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        if not task.cancelled():
+            # ошибка получена ожидающими или никому не нужна, если все ожидающие отменены
+            task.exception()
+
+    async def _fetch_model(self, endpoint: str, uri: str, parser_cls: type, params: Optional[dict] = None):
+        with self._span("fetch", endpoint=endpoint) as span:
+            if self.cache is None:
+                resp, body = await self.request_get_body(uri, params=params, endpoint=endpoint)
+                return await self._parse(parser_cls, body, _charset(resp), endpoint)
+            entry = await self.request_get_cached(endpoint, uri, params)
+            model = entry.models.get(parser_cls)
+            span.set("cached_model", model is not None)
+            if model is None:
+                # в кэше только полностью разобранные модели: размер записи учитывает лишь тело ответа
+                model = entry.models[parser_cls] = await self._parse(parser_cls, entry.body, entry.encoding, endpoint,
+                                                                     lazy=False)
+            return model
+
     async def parse_ids(self):
         """парсер нужных id для дальнейших запросов"""
-        resp = await self.request_get(self.USER_URI)
+        resp = await self.request_get(self.USER_URI, reauth=False, endpoint="userfeed")
         self.__get_school_id(resp)
-        resp = await resp.text()
+        resp = await self._read(resp, "userfeed")
         self._class_id = self.__get_class_id(resp)
         self._profile_id = self.__get_profile_id(resp)
 
+    def _is_login_response(self, resp: ClientResponse) -> bool:
+        """True, если запрос перенаправлен на страницу входа (сессия не авторизована)"""
+        login_url = URL(self.AUTH_URI)
+        return resp.url.host == login_url.host and resp.url.path.rstrip("/") == login_url.path.rstrip("/")
+
+    def _is_login_page(self, body: bytes) -> bool:
+        """True, если вместо запрошенной страницы отдана форма входа: поля пароля нет на страницах данных"""
+        return self.LOGIN_FORM.search(body) is not None
+
+    def export_auth(self) -> AuthState:
+        """Снимок текущей авторизации: cookies сессии и id школы, класса и профиля"""
+        cookies = [dict(name=morsel.key, value=morsel.value, domain=morsel["domain"], path=morsel["path"] or "/")
+                   for morsel in self.session.cookie_jar]
+        return AuthState(login=self.__login, cookies=cookies, school_id=self._school_id,
+                         class_id=self._class_id, profile_id=self._profile_id)
+
+    def import_auth(self, state: AuthState):
+        """Восстановить авторизацию из снимка без запроса к серверу.
+        Cookies восстанавливаются для своих доменов и путей, чтобы не отправляться на все хосты
+        """
+        jar = self.session.cookie_jar
+        for cookie in state.cookies:
+            morsel = SimpleCookie()
+            morsel[cookie["name"]] = cookie["value"]
+            morsel[cookie["name"]]["path"] = cookie["path"]
+            if not cookie["domain"]:
+                # снимок старого формата без домена
+                jar.update_cookies(morsel)
+                continue
+            morsel[cookie["name"]]["domain"] = cookie["domain"]
+            jar.update_cookies(morsel, response_url=URL(f"https://{cookie['domain']}"))
+        self._school_id = state.school_id
+        self._class_id = state.class_id
+        self._profile_id = state.profile_id
+        self._auth_generation += 1
+
+    async def validate_auth(self) -> bool:
+        """Проверка авторизации одним запросом к ленте пользователя
+
+        :return: False, если сессия истекла и сервер перенаправил на страницу входа
+        """
+        try:
+            resp = await self.request_get(self.USER_URI, reauth=False, endpoint="userfeed")
+        except StatusCodeError:
+            return False
+        if self._is_login_response(resp):
+            resp.release()
+            return False
+        try:
+            self.__get_profile_id(await self._read(resp, "userfeed"))
+        except IndexError:
+            return False
+        return True
+
+    async def _reauthenticate(self, generation: int, attempts: int):
+        """Однократная переавторизация при истечении сессии.
+
+        Сколько бы запросов ни обнаружили истечение одновременно, auth() выполнится один раз:
+        остальные дождутся блокировки и увидят, что поколение авторизации уже сменилось.
+        Ошибку неудачной попытки получают только запросы, отправленные до её начала.
+        Запрос, отправленный после неудачи, начинает новую попытку
+
+        :param generation: поколение авторизации, с которым был отправлен запрос
+        :param attempts: число попыток переавторизации на момент отправки запроса
+        """
+        async with self._auth_lock:
+            if generation != self._auth_generation:
+                return
+            if self._auth_error is not None and self._auth_error[0] > attempts:
+                raise AuthExpired("Re-authentication failed") from self._auth_error[1]
+            self._auth_attempts += 1
+            try:
+                await self.auth()
+            except Exception as e:
+                self._auth_error = (self._auth_attempts, e)
+                raise AuthExpired("Re-authentication failed") from e
+            self._auth_error = None
+
     async def auth(self):
-        resp = await self.request_post(self.AUTH_URI, data={"login": self.__login, "password": self.__password})
-        if self.__get_school_id(resp):
-            resp = await resp.text()
-            self._class_id = self.__get_class_id(resp)
-            self._profile_id = self.__get_profile_id(resp)
-            return True
-        return False
+        with self._span("auth", login=self.__login):
+            resp = await self.request_post(self.AUTH_URI, data={"login": self.__login, "password": self.__password},
+                                           reauth=False, endpoint="auth")
+            if self.__get_school_id(resp):
+                resp = await self._read(resp, "auth")
+                self._class_id = self.__get_class_id(resp)
+                self._profile_id = self.__get_profile_id(resp)
+                self._auth_generation += 1
+                return True
+            return False
 
     async def get_class_users(self) -> Users:
         """возвращает список одноклассников с ФИО и ссылкой на профиль (если он зарегистрирован в дневник.ру)"""
-        resp = await self._request("GET", self.CLASS_URI, params={"class": self._class_id, "view": "members"})
-        resp = await resp.text()
-        users = ParserUsers(resp).create_model()
+        users = await self._get_model("class_users", self.CLASS_URI, self.parsers.users,
+                                      params={"class": self._class_id, "view": "members"})
         return users
 
+    async def _get_users_page(self, uri: str, params: dict, page: int) -> Users:
+        """Загрузка одной страницы со списком пользователей"""
+        params = dict(params, page=str(page))
+        endpoint = "birthdays_near" if uri == self.BIRTHDAY_URI else "users"
+        return await self._get_model(endpoint, uri, self.parsers.users, params=params)
+
+    async def _iter_users_pages(self, uri: str, params: dict, max_pages: int, concurrency: int = 1,
+                                ordered: bool = True, prefetch: int = 0) -> AsyncIterable[Users]:
+        """Обход постраничного списка пользователей.
+
+        При concurrency <= 1 страницы запрашиваются последовательно до первой пустой.
+        Иначе по счётчику p.found с первой страницы вычисляется точное число страниц и остальные
+        загружаются параллельно, не более concurrency запросов одновременно.
+        Пользователи, попавшие на несколько страниц из-за сдвига списка, отбрасываются по ссылке на профиль
+
+        :param concurrency: число одновременных запросов
+        :param ordered: отдавать страницы по порядку. Если False - по мере загрузки
+        :param prefetch: сколько следующих страниц загружать и разбирать в фоне, пока потребитель
+            обрабатывает текущую. 0 - следующая страница запрашивается только когда её попросят
+        """
+        if prefetch > 0:
+            pages = self._iter_users_pages(uri, params, max_pages, concurrency, ordered)
+            async for users in iter_prefetch(pages, prefetch):
+                yield users
+            return
+
+        seen = set()
+
+        def unique(users: Users) -> Users:
+            items = []
+            for user in users.items:
+                if user.url:
+                    if user.url in seen:
+                        continue
+                    seen.add(user.url)
+                items.append(user)
+            return Users(count=users.count, items=items)
+
+        if concurrency <= 1:
+            for i in range(1, max_pages + 1):
+                users = await self._get_users_page(uri, params, i)
+                if users.count == 0:
+                    break
+                users = unique(users)
+                if users.items:
+                    yield users
+            return
+
+        first = await self._get_users_page(uri, params, 1)
+        if first.count == 0 or not first.items:
+            return
+        per_page = len(first.items)
+        pages = min(-(-first.count // per_page), max_pages)
+        yield unique(first)
+        factories = (partial(self._get_users_page, uri, params, i) for i in range(2, pages + 1))
+        async for users in iter_concurrent(factories, limit=concurrency, ordered=ordered):
+            users = unique(users)
+            if users.items:
+                yield users
+
+    def _people_params(self, name: str = "", group: str = "all", school_group: str = "") -> dict:
+        """Параметры поиска людей школы. Некорректная группа заменяется на "all" """
+        available_groups = ["all", "students", "staff", "administrators", "teachers", "management", "director"]
+        if group not in available_groups:
+            group = "all"
+        params = dict(school=self._school_id, view="members", group=group, school_group=group, search=name)
+        params["class"] = school_group
+        return params
+
+    async def stream_users(self, uri: str, params: Optional[dict] = None,
+                           chunk_size: int = 16384) -> AsyncIterable[User]:
+        """Потоковая загрузка одной страницы пользователей: User отдаются по мере загрузки и разбора строк,
+        не дожидаясь конца страницы. Страница целиком в памяти не хранится. Кэш ответов не используется.
+        Страница входа, отданная без перенаправления, обрабатывается как в request_get_body
+
+        :param chunk_size: размер части тела ответа, подаваемой парсеру, в байтах
+        :raise: AuthExpired если после повторной авторизации снова пришла страница входа
+        """
+        async for _, user in self._stream_users(uri, params, chunk_size):
+            yield user
+
+    async def _stream_users(self, uri: str, params: Optional[dict],
+                            chunk_size: int) -> AsyncIterable[Tuple[Optional[int], User]]:
+        """Потоковая загрузка страницы пользователей: пары (счётчик p.found или None, User).
+
+        Пока на странице не найдено ни строк, ни счётчика, начало тела сохраняется. Если страница без них
+        оказалась формой входа, выполняется повторная авторизация и страница загружается ещё раз:
+        пользователей из неё к этому моменту не отдано
+        """
+        for retry in (False, True):
+            generation, attempts = self._auth_generation, self._auth_attempts
+            resp = await self.request_get(uri, params=params, endpoint="users_stream")
+            size = 0
+            head: Optional[bytearray] = bytearray()
+            try:
+                stream = LxmlUsersStream(encoding=_charset(resp))
+                async for chunk in resp.content.iter_chunked(chunk_size):
+                    size += len(chunk)
+                    if head is not None:
+                        head += chunk
+                    for user in stream.feed(chunk):
+                        head = None
+                        yield stream.count, user
+                    if stream.count is not None:
+                        head = None
+                for user in stream.close():
+                    head = None
+                    yield stream.count, user
+            finally:
+                resp.release()
+                if self.metrics is not None:
+                    self.metrics.observe("response_bytes", size, endpoint="users_stream")
+            if head is None or not self._is_login_page(bytes(head)):
+                return
+            if retry:
+                raise AuthExpired("Session expired after re-authentication")
+            with self._span("reauth", detected="content"):
+                await self._reauthenticate(generation, attempts)
+
+    async def stream_peoples(self, name: str = "", group: str = "all", school_group: str = "",
+                             max_page: Optional[int] = None, chunk_size: int = 16384) -> AsyncIterable[User]:
+        """Потоковый вариант search_people: возвращает итератор User, страницы разбираются по частям
+        по мере загрузки, поэтому память не зависит от размера страниц.
+        Страницы запрашиваются до первой пустой или пока не отдано столько пользователей, сколько в p.found.
+        Параметры поиска аналогичны search_people
+        """
+        if not max_page:
+            max_page = 100_000
+        params = self._people_params(name, group, school_group)
+        total = 0
+        for i in range(1, max_page + 1):
+            count, users = None, 0
+            async for count, user in self._stream_users(self.SCHOOL_URI, dict(params, page=str(i)), chunk_size):
+                users += 1
+                yield user
+            total += users
+            if not users or count is not None and total >= count:
+                break
+
     async def search_people(self, name: str = "", group: str = "all",
-                            school_group="", max_page: Optional[int] = None) -> AsyncIterable[Users]:
+                            school_group="", max_page: Optional[int] = None, concurrency: int = 1,
+                            ordered: bool = True, prefetch: int = 0) -> AsyncIterable[Users]:
         """
         Поиск по параметрам. Если ничего не передано, вернёт всех пользователей.
         Если ничего не найдёт, вернёт пустой итератор
@@ -131,58 +762,149 @@ class DiaryAPI(Session):
         доступные категории групп: "all", "students", "staff", "administrators", "teachers", "management", "director"
         :param school_group: поиск по номеру класса
         :param max_page: максимальное число итераций. По умолчанию по всем страницам
+        :param concurrency: число параллельных запросов страниц. По умолчанию 1 (последовательно)
+        :param ordered: при параллельной загрузке отдавать страницы по порядку
+        :param prefetch: число страниц, загружаемых в фоне впрок. По умолчанию 0
         :return user: - Возвращает итератор
         """
-        available_groups = ["all", "students", "staff", "administrators", "teachers", "management", "director"]
-        if group not in available_groups:
-            group = "all"
         if not max_page:
             max_page = 100_000
-        params = dict(school=self._school_id, view="members", group=group, school_group=group, search=name)
-        params["class"] = school_group
+        params = self._people_params(name, group, school_group)
 
-        for i in range(1, max_page + 1):
-            params["page"] = str(i)
-            resp = await self._request("GET", self.SCHOOL_URI, params=params)
-            resp = await resp.text()
-            users = ParserUsers(resp).create_model()
-            if users.count == 0:
-                break
+        async for users in self._iter_users_pages(self.SCHOOL_URI, params, max_page, concurrency, ordered,
+                                                  prefetch):
             yield users
 
-    async def get_all_peoples(self, max_pages: Optional[int] = None) -> AsyncIterable[Users]:
+    async def get_all_peoples(self, max_pages: Optional[int] = None, concurrency: int = 1,
+                              ordered: bool = True, prefetch: int = 0) -> AsyncIterable[Users]:
         """Получить всех школьников и сотрудников школы
-        Возвращает итератор объектов словарей вида {"name": "Ivan", "uri": "url"}"""
+        Возвращает итератор объектов Users
+
+        :param concurrency: число параллельных запросов страниц. По умолчанию 1 (последовательно)
+        :param ordered: при параллельной загрузке отдавать страницы по порядку
+        :param prefetch: число страниц, загружаемых в фоне впрок. По умолчанию 0
+        """
         if not max_pages:
             max_pages = 100_000
-        for i in range(1, max_pages + 1):
-            resp = await self.request_get(self.SCHOOL_URI, params={"school": self._school_id, "view": "members",
-                                                                   "page": str(i)})
-            resp = await resp.text()
-            users = ParserUsers(resp).create_model()
-            if users.count == 0:
-                break
+        params = {"school": self._school_id, "view": "members"}
+        async for users in self._iter_users_pages(self.SCHOOL_URI, params, max_pages, concurrency, ordered,
+                                                  prefetch):
             yield users
 
-    async def birthdays_near(self, group="all", max_pages: Optional[int] = None) -> AsyncIterable[Users]:
+    async def birthdays_near(self, group="all", max_pages: Optional[int] = None, concurrency: int = 1,
+                             ordered: bool = True, prefetch: int = 0) -> AsyncIterable[Users]:
         """Возвращает итератор людей (без даты), у кого будет сегодня и в ближайшую неделю день рождения
         :param group: тип поиска подгруппы людей. По умолчанию "all" доступные группы:
         "all", "students", "staff", "class"
+        :param concurrency: число параллельных запросов страниц. По умолчанию 1 (последовательно)
+        :param ordered: при параллельной загрузке отдавать страницы по порядку
+        :param prefetch: число страниц, загружаемых в фоне впрок. По умолчанию 0
         """
         available_groups = ["all", "students", "staff", "class"]
         if group not in available_groups:
             group = "all"
         if not max_pages:
             max_pages = 100
-        for i in range(1, max_pages + 1):
-            resp = await self.request_get(self.BIRTHDAY_URI, params={"school": self._school_id, "group": group,
-                                                                     "page": str(i)})
-            resp = await resp.text()
-            users = ParserUsers(resp).create_model()
-            if users.count == 0:
-                break
+        params = {"school": self._school_id, "group": group}
+        async for users in self._iter_users_pages(self.BIRTHDAY_URI, params, max_pages, concurrency, ordered,
+                                                  prefetch):
             yield users
 
+    async def _fetch_users_page(self, params: dict, page: int) -> Users:
+        """Загрузка страницы списка школы всегда с сайта, мимо кэша ответов и объединения запросов:
+        синхронизация справочника сравнивает с сохранёнными хэшами только свежие страницы"""
+        params = dict(params, page=str(page))
+        resp, body = await self.request_get_body(self.SCHOOL_URI, params=params, endpoint="users")
+        return await self._parse(self.parsers.users, body, _charset(resp), "users")
+
+    async def _sync_scope(self, store: DirectoryStore, scope: str, params: dict, full: bool,
+                          max_age: Optional[float], concurrency: int, stats: DirectorySyncStats):
+        """Синхронизация одного списка справочника: обход страниц и запись изменившихся"""
+        found, hashes, crawled_at = store.scope_state(self._school_id, scope)
+        first = await self._fetch_users_page(params, 1)
+        stats.pages_fetched += 1
+        if first.count == 0 or not first.items:
+            store.save_scope(self._school_id, scope, 0, 0)
+            return
+        pages = -(-first.count // len(first.items))
+        results = {1: first}
+        stale = max_age is not None and time() - crawled_at > max_age
+        if not full and not stale and first.count == found and hashes.get(1) == page_hash(first.items):
+            if pages > 1:
+                results[pages] = await self._fetch_users_page(params, pages)
+                stats.pages_fetched += 1
+            if hashes.get(pages) == page_hash(results[pages].items):
+                stats.unchanged += 1
+                store.save_scope(self._school_id, scope, found, len(hashes), crawled=False)
+                return
+
+        async def fetch(page: int) -> Tuple[int, Users]:
+            return page, await self._fetch_users_page(params, page)
+
+        factories = (partial(fetch, i) for i in range(2, pages + 1) if i not in results)
+        async for page, users in iter_concurrent(factories, limit=concurrency, ordered=False):
+            results[page] = users
+            stats.pages_fetched += 1
+        changed = {page: users.items for page, users in results.items() if hashes.get(page) != page_hash(users.items)}
+        stats.pages_changed += len(changed)
+        store.save_scope(self._school_id, scope, first.count, pages, changed)
+
+    async def sync_directory(self, groups: Optional[Iterable[str]] = None, classes: Iterable[str] = (),
+                             full: bool = False, concurrency: int = 1,
+                             max_age: Optional[float] = 24 * 3600) -> DirectorySyncStats:
+        """Синхронизация локального справочника directory_store со списками школы.
+
+        Обходится весь список школы, списки групп groups и классов classes. Список, у которого с прошлой
+        синхронизации не изменились счётчик найденных, первая и последняя страницы, не обходится (2 запроса).
+        Из обойденных списков в базу записываются только страницы с изменившимся набором пользователей.
+
+        Изменения только в средних страницах при том же счётчике (один пользователь ушёл, другой пришёл)
+        по первой и последней страницам не видны: такие списки обновляются полным обходом, который выполняется,
+        если с прошлого полного обхода списка прошло больше max_age секунд
+
+        :param groups: группы для поиска по группе. По умолчанию все группы search_people
+        :param classes: классы для поиска по классу, значения как в параметре school_group search_people
+        :param full: обойти все списки целиком, даже если счётчик, первая и последняя страницы не изменились
+        :param concurrency: число параллельно загружаемых страниц
+        :param max_age: через сколько секунд после полного обхода список обходится целиком снова,
+            None - только при изменении счётчика, первой или последней страницы
+        :return: итоги синхронизации
+        """
+        store = self.directory_store
+        if store is None:
+            raise ValueError("directory_store is not set")
+        groups = DIRECTORY_GROUPS if groups is None else tuple(groups)
+        unknown = set(groups) - set(DIRECTORY_GROUPS)
+        if unknown:
+            raise ValueError(f"Unknown groups: {sorted(unknown)}. Available: {DIRECTORY_GROUPS}")
+        scopes = [("all", self._people_params())]
+        scopes += [(scope_name(group=group), self._people_params(group=group)) for group in groups]
+        scopes += [(scope_name(school_class=c), self._people_params(school_group=c)) for c in classes]
+        stats = DirectorySyncStats()
+        with self._span("sync_directory", scopes=len(scopes)) as span:
+            for scope, params in scopes:
+                await self._sync_scope(store, scope, params, full, max_age, concurrency, stats)
+                stats.scopes += 1
+            stats.users = store.count(self._school_id)
+            span.set("pages_fetched", stats.pages_fetched)
+            span.set("pages_changed", stats.pages_changed)
+        return stats
+
+    def find_people(self, name: str = "", group: str = "all", school_group: str = "",
+                    limit: Optional[int] = None) -> Users:
+        """Поиск людей школы в локальном справочнике directory_store без запросов к dnevnik.ru.
+        Параметры аналогичны search_people, некорректная группа заменяется на "all".
+        Справочник заполняется sync_directory и отражает списки на момент синхронизации: изменения
+        в средних страницах списка при том же числе пользователей появляются только после полного обхода
+        (параметры full и max_age sync_directory)
+        """
+        if self.directory_store is None:
+            raise ValueError("directory_store is not set")
+        if group not in DIRECTORY_GROUPS:
+            group = "all"
+        items = self.directory_store.find(self._school_id, name, group, school_group, limit)
+        return Users(count=len(items), items=items)
+
     async def calendar_birthdays(self) -> YearBirthday:
         """Возвращает объект YearBirthday вида:
 
@@ -195,9 +917,8 @@ class DiaryAPI(Session):
             month: str
             url: str
         """
-        resp = await self.request_get(self.BIRTHDAY_URI, params={"school": self._school_id, "view": "calendar"})
-        resp = await resp.text()
-        p = ParserBirthdayCalendar(resp).create_model()
+        p = await self._get_model("calendar", self.BIRTHDAY_URI, self.parsers.calendar,
+                                  params={"school": self._school_id, "view": "calendar"})
         return p
 
     async def get_diary(self, period: str) -> Diary:
@@ -211,14 +932,47 @@ class DiaryAPI(Session):
             homeworks: List[Homework]
 
 
-        Дату указывать в формате %d.%m.%Y. По умолчанию устанавливается сегодняшняя дата
+        Дату указывать в формате %d.%m.%Y. По умолчанию устанавливается сегодняшняя дата.
+        При включённом diary_store неделя сначала ищется в хранилище
         """
-        year = period.split(".")[-1]
-        url = f"{self.WEEK_DIARY_URI}{self._profile_id}/{self._school_id}/{year}/{period}"
-        try:
-            resp = await self.request_get(url)
-            resp = await resp.text()
-            model = ParserDiary(resp).create_model
+        with self._span("get_diary", period=period) as span:
+            if self.diary_store is not None:
+                model = self.diary_store.get(self._profile_id, self._school_id, period)
+                span.set("store_hit", model is not None)
+                if model is not None:
+                    return model
+            year = period.split(".")[-1]
+            url = f"{self.WEEK_DIARY_URI}{self._profile_id}/{self._school_id}/{year}/{period}"
+            try:
+                model = await self._get_model("diary", url, self.parsers.diary)
+            except StatusCodeError as e:
+                if 400 <= e.status < 500:
+                    raise PageNotFound(f"Page return {e.status}. Check period input") from e
+                raise
+            if self.diary_store is not None:
+                self.diary_store.put(self._profile_id, self._school_id, period, model)
             return model
-        except ClientConnectionError:
-            raise PageNotFound("Page return 404. Check period input")
+
+    async def _get_diary_or_none(self, period: str) -> Optional[Diary]:
+        try:
+            return await self.get_diary(period)
+        except PageNotFound:
+            return None
+
+    async def get_diaries(self, start: str, end: str, concurrency: int = 4,
+                          ordered: bool = True) -> AsyncIterable[Diary]:
+        """Дневники за все недели диапазона дат. Недели загружаются параллельно.
+        Недели без данных (каникулы, PageNotFound) пропускаются
+
+        :param start: начальная дата в формате %d.%m.%Y
+        :param end: конечная дата в формате %d.%m.%Y включительно
+        :param concurrency: число одновременно загружаемых недель
+        :param ordered: отдавать дневники по порядку недель. Если False - по мере загрузки
+        """
+        first, last = week_start(parse_period(start)), week_start(parse_period(end))
+        weeks = [(first + timedelta(weeks=i)).strftime("%d.%m.%Y") for i in range((last - first).days // 7 + 1)]
+        factories = (partial(self._get_diary_or_none, period) for period in weeks)
+        async for diary in iter_concurrent(factories, limit=concurrency, ordered=ordered):
+            if diary is not None:
+                # дневники диапазона обычно хранят, ленивые секции держали бы дерево каждой страницы
+                yield diary.load()
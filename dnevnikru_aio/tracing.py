@@ -0,0 +1,214 @@
+"""
+Трассировка вызовов: дерево интервалов (span) каждого вызова API.
+
+Например get_diary:
+
+    get_diary
+        diary
+            fetch (endpoint=diary)
+                request (endpoint=diary)
+                    limiter_wait
+                    attempt (status=503)
+                    retry_sleep
+                    limiter_wait
+                    attempt (status=200)
+                read
+                parse
+                build
+
+Законченные интервалы передаются в sink: JsonLinesSink пишет их в файл по одному JSON на строку
+(по start, duration и parent_id строится waterfall), MemorySink хранит в памяти для тестов.
+Родительский интервал определяется через contextvars, поэтому параллельные запросы не перемешиваются.
+
+:example:
+>>> tracer = Tracer(JsonLinesSink("spans.jsonl"))
+>>> async with Dnevnik(login, password, tracer=tracer) as d:
+...     await d.auth()
+...     await d.get_diary("13.09.2021")
+>>> tracer.close()
+"""
+import json
+import os
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from threading import Lock
+from time import perf_counter, time
+from typing import Any, Dict, List, Optional
+
+
+@dataclass()
+class Span:
+    """Интервал трассировки
+
+    name: название операции
+
+
+    trace_id: id дерева, общий для всех интервалов одного вызова
+
+
+    span_id: id интервала
+
+
+    parent_id: id родительского интервала, None у корня
+
+
+    start: время начала (unix time)
+
+
+    duration: длительность в секундах
+
+
+    attributes: атрибуты операции: эндпоинт, номер попытки, статус ответа, ...
+
+
+    error: тип исключения, если операция завершилась ошибкой
+    """
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start: float = 0.0
+    duration: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class SpanSink(ABC):
+    """Приёмник законченных интервалов. Для своего приёмника переопределите emit и при необходимости close"""
+    @abstractmethod
+    def emit(self, span: Span):
+        """Принять законченный интервал"""
+
+    def close(self):
+        pass
+
+
+class MemorySink(SpanSink):
+    """Интервалы в памяти процесса, для тестов"""
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def emit(self, span: Span):
+        self.spans.append(span)
+
+    def clear(self):
+        self.spans.clear()
+
+    def find(self, name: str) -> List[Span]:
+        """Интервалы с названием name"""
+        return [span for span in self.spans if span.name == name]
+
+    def children(self, span: Span) -> List[Span]:
+        """Дочерние интервалы по времени начала"""
+        return sorted((s for s in self.spans if s.parent_id == span.span_id), key=lambda s: s.start)
+
+
+class JsonLinesSink(SpanSink):
+    """Интервалы в файл, по одному JSON объекту на строку. Файл открывается на дозапись при первом интервале
+
+    :param path: путь к файлу
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        # интервалы могут приходить из потоков parse_executor
+        self._lock = Lock()
+
+    def emit(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _new_id() -> str:
+    return os.urandom(8).hex()
+
+
+class _ActiveSpan:
+    """Контекстный менеджер открытого интервала"""
+    __slots__ = ("tracer", "span", "_start", "_token")
+
+    def __init__(self, tracer: "Tracer", span: Span):
+        self.tracer = tracer
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self.span.start = time()
+        self._start = perf_counter()
+        self._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.span.duration = perf_counter() - self._start
+        if exc_type is not None:
+            self.span.error = exc_type.__name__
+        _current_span.reset(self._token)
+        self.tracer.sink.emit(self.span)
+
+
+class _NullSpan:
+    """Интервал выключенной трассировки: ничего не записывает"""
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def set(self, key: str, value: Any):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("dnevnik_span", default=None)
+
+
+class Tracer:
+    """Создание интервалов трассировки
+
+    :param sink: приёмник законченных интервалов
+    """
+    def __init__(self, sink: SpanSink):
+        self.sink = sink
+
+    @staticmethod
+    def current() -> Optional[Span]:
+        """Открытый интервал текущей задачи"""
+        return _current_span.get()
+
+    def span(self, name: str, **attributes) -> _ActiveSpan:
+        """Новый интервал, дочерний для открытого в текущей задаче
+
+        :example:
+        >>> with tracer.span("parse", endpoint="diary") as span:
+        ...     span.set("size", len(page))
+        """
+        parent = _current_span.get()
+        span = Span(name=name, trace_id=parent.trace_id if parent is not None else _new_id(), span_id=_new_id(),
+                    parent_id=parent.span_id if parent is not None else None, attributes=attributes)
+        return _ActiveSpan(self, span)
+
+    def close(self):
+        self.sink.close()
@@ -20,6 +20,7 @@ class Day:
 
     month_int: int - номер месяца
     """
+    __slots__ = ("count", "day", "month", "url")
     __MONTH = {
         "Январь": 1,
         "Февраль": 2,
@@ -50,6 +51,7 @@ class YearBirthday:
 
     days: List[Day] - список объектов Day
     """
+    __slots__ = ("days",)
     days: List[Day]
 
     def __iter__(self) -> Iterable[Day]:
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List, Tuple, Iterable
+from typing import Callable, Dict, List, Tuple
 
 """Модель взаимодействия с дневником
 Diary:
@@ -29,6 +29,7 @@ class Info:
 
     date: дата дневника
     """
+    __slots__ = ("name", "school_name", "class_name", "year", "date")
     name: str
     school_name: str
     class_name: str
@@ -48,6 +49,7 @@ class Homework:
 
     homework: домашнее задание
     """
+    __slots__ = ("lesson", "homework")
     lesson: str
     homework: str
 
@@ -63,6 +65,7 @@ class Schedule:
 
     items: кортеж уроков
     """
+    __slots__ = ("day", "items")
     day: str
     items: Tuple[str]
 
@@ -85,6 +88,7 @@ class Progress:
 
     lesson: название урока
     """
+    __slots__ = ("grade", "type", "lesson")
     grade: int
     type: str
     lesson: str
@@ -102,6 +106,7 @@ class Attendance:
 
     stats: список пропусков/посещений
     """
+    __slots__ = ("date", "stats")
     date: str
     stats: List[str]
 
@@ -118,6 +123,7 @@ class Theme:
 
     theme: тема урока
     """
+    __slots__ = ("name", "theme")
     name: str
     theme: str
 
@@ -145,7 +151,13 @@ class Diary:
 
 
     homeworks: List[Homework] - список домашних заданий
+
+
+    Парсеры создают дневник через Diary.lazy: секции разбираются при первом обращении
+    к атрибуту и запоминаются. Пока разобраны не все секции, дневник держит парсер и дерево страницы.
+    load() и pickle разбирают все секции сразу и освобождают страницу
     """
+    __slots__ = ("info", "themes", "attendances", "progress", "schedules", "homeworks", "_loaders")
     info: Info
     themes: List[Theme]
     attendances: List[Attendance]
@@ -153,6 +165,32 @@ class Diary:
     schedules: List[Schedule]
     homeworks: List[Homework]
 
+    @classmethod
+    def lazy(cls, loaders: Dict[str, Callable[[], object]], **sections) -> "Diary":
+        """Дневник с ленивыми секциями
+
+        :param loaders: имя секции -> функция её разбора без аргументов
+        :param sections: уже готовые секции
+        """
+        diary = cls.__new__(cls)
+        for name, value in sections.items():
+            setattr(diary, name, value)
+        diary._loaders = dict(loaders)
+        return diary
+
+    def load(self) -> "Diary":
+        """Разобрать все ленивые секции и освободить парсер страницы
+
+        :return: этот же дневник
+        """
+        for name in self.__dataclass_fields__:
+            getattr(self, name)
+        return self
+
+    def __getstate__(self):
+        # разбираем все секции, функции разбора (и страница вместе с ними) не сериализуются
+        return None, {name: getattr(self, name) for name in self.__dataclass_fields__}
+
     def __str__(self):
         themes = "\n".join([_.__str__() for _ in self.themes])
         attendances = "\n".join([_.__str__() for _ in self.attendances])
@@ -180,3 +218,39 @@ Schedules:
 Homeworks:
 {"_"*30}
 {homeworks}"""
+
+
+class _LazySection:
+    """Дескриптор секции Diary поверх слота: при пустом слоте вызывает функцию разбора и запоминает результат"""
+    def __init__(self, name: str, slot):
+        self.name = name
+        self.slot = slot
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        try:
+            return self.slot.__get__(instance, owner)
+        except AttributeError:
+            loaders = getattr(instance, "_loaders", None)
+            if not loaders or self.name not in loaders:
+                raise
+        # функция разбора удаляется только после успеха: ошибка разбора повторится при следующем обращении
+        value = loaders[self.name]()
+        del loaders[self.name]
+        self.slot.__set__(instance, value)
+        if not loaders:
+            # все секции разобраны, страница больше не нужна
+            instance._loaders = None
+        return value
+
+    def __set__(self, instance, value):
+        self.slot.__set__(instance, value)
+
+    def __delete__(self, instance):
+        self.slot.__delete__(instance)
+
+
+for _name in Diary.__dataclass_fields__:
+    setattr(Diary, _name, _LazySection(_name, Diary.__dict__[_name]))
+del _name
@@ -12,6 +12,7 @@ class User:
     url - ссылка на профиль (если пользователь зарегистрирован)
 
     """
+    __slots__ = ("full_name", "url")
     full_name: str
     url: str
 
@@ -26,6 +27,7 @@ class Users:
     items - список объектов User
 
     """
+    __slots__ = ("count", "items")
     count: int
     items: List[User]
 
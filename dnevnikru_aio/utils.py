@@ -1,4 +1,10 @@
+import asyncio
+from collections import deque
 from datetime import date, timedelta
+from time import monotonic
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
 
 
 class Date:
@@ -41,3 +47,190 @@ class Date:
         :return: текущий месяц
         """
         return date.today().month
+
+
+def parse_period(period: str) -> date:
+    """Дата из строки формата %d.%m.%Y"""
+    day, month, year = period.split(".")
+    return date(int(year), int(month), int(day))
+
+
+def week_key(period: str) -> Tuple[int, int]:
+    """ISO год и номер недели даты формата "%d.%m.%Y". Все даты одной недели дают один ключ"""
+    year, week, _ = parse_period(period).isocalendar()
+    return year, week
+
+
+def week_start(day: date) -> date:
+    """Понедельник недели, в которую входит дата"""
+    return day - timedelta(days=day.weekday())
+
+
+async def iter_concurrent(factories: Iterable[Callable[[], Awaitable[T]]],
+                          limit: int = 4, ordered: bool = True) -> AsyncIterator[T]:
+    """Запускает корутины из фабрик конкурентно, не более limit одновременно
+
+    :param factories: итератор функций без аргументов, возвращающих awaitable
+    :param limit: максимальное число одновременно выполняемых задач
+    :param ordered: если True, результаты отдаются в порядке фабрик, иначе по мере готовности
+    :return: асинхронный итератор результатов
+    """
+    limit = max(1, limit)
+    factories = iter(factories)
+    if ordered:
+        pending = deque()
+    else:
+        pending = set()
+
+    def schedule() -> bool:
+        try:
+            factory = next(factories)
+        except StopIteration:
+            return False
+        task = asyncio.ensure_future(factory())
+        if ordered:
+            pending.append(task)
+        else:
+            pending.add(task)
+        return True
+
+    # завершённые задачи, результаты которых ещё не отданы (только ordered=False)
+    ready = deque()
+    try:
+        while len(pending) < limit and schedule():
+            pass
+        while pending or ready:
+            if ordered:
+                result = await pending.popleft()
+                schedule()
+                yield result
+            else:
+                if not ready:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        pending.discard(task)
+                        schedule()
+                    ready.extend(done)
+                yield ready.popleft().result()
+    finally:
+        for task in [*pending, *ready]:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # иначе asyncio сообщит "Task exception was never retrieved"
+                task.exception()
+
+
+async def iter_prefetch(source: AsyncIterator[T], depth: int) -> AsyncIterator[T]:
+    """Забегает вперёд по асинхронному итератору: фоновая задача получает следующие depth элементов
+    в ограниченную очередь, пока потребитель обрабатывает текущий.
+
+    Исключение источника передаётся потребителю после уже полученных элементов.
+    При выходе из цикла (break, исключение, aclose) фоновая задача отменяется, а источник закрывается
+
+    :param source: асинхронный итератор
+    :param depth: размер очереди. 0 - без забегания вперёд
+    :return: асинхронный итератор тех же элементов в том же порядке
+    """
+    if depth <= 0:
+        async for item in source:
+            yield item
+        return
+
+    queue = asyncio.Queue(maxsize=depth)
+    end = object()
+    closing = False
+
+    async def produce():
+        try:
+            async for item in source:
+                await queue.put((item, None))
+        except BaseException as e:
+            if closing:
+                raise
+            # любая ошибка источника, в том числе CancelledError, передаётся потребителю,
+            # иначе потребитель навсегда остался бы в queue.get()
+            await queue.put((end, e))
+        else:
+            await queue.put((end, None))
+
+    task = asyncio.ensure_future(produce())
+    try:
+        while True:
+            item, error = await queue.get()
+            if error is not None:
+                raise error
+            if item is end:
+                return
+            yield item
+    finally:
+        closing = True
+        task.cancel()
+        # asyncio.wait не пробрасывает CancelledError задачи, в отличие от await task
+        await asyncio.wait([task])
+        aclose = getattr(source, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class LoopLagMonitor:
+    """Измерение задержки event loop: насколько позже запланированного просыпается фоновая задача.
+
+    :param interval: период замеров в секундах
+
+    :example:
+    >>> async with LoopLagMonitor() as lag:
+    ...     await d.get_diary("13.09.2021")
+    >>> print(lag.max_lag, lag.mean_lag)
+    """
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+        self._due = 0.0
+
+    async def _run(self):
+        while True:
+            self._due = monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, monotonic() - self._due))
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task:
+            # замер, который не успел выполниться из-за блокировки loop
+            overdue = monotonic() - self._due
+            if self._due and overdue > 0:
+                self.samples.append(overdue)
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    @property
+    def max_lag(self) -> float:
+        """максимальная задержка в секундах"""
+        return max(self.samples, default=0.0)
+
+    @property
+    def mean_lag(self) -> float:
+        """средняя задержка в секундах"""
+        return sum(self.samples) / len(self.samples) if self.samples else 0.0
+
+    def percentile(self, q: float) -> float:
+        """задержка q-перцентиля (0..100) в секундах"""
+        if not self.samples:
+            return 0.0
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
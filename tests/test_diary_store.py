@@ -0,0 +1,86 @@
+import sys
+import tempfile
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from dnevnikru_aio import Dnevnik, TokenBucket  # noqa: E402
+from dnevnikru_aio.diary_store import DiaryStore  # noqa: E402
+from dnevnikru_aio.parsers import ParserDiary, parse_page  # noqa: E402
+from pages import FIXTURES  # noqa: E402
+from stub_server import StubConfig, StubServer  # noqa: E402
+
+"""
+Тесты хранилища дневников по неделям
+"""
+
+DIARY = parse_page(ParserDiary, (FIXTURES / "diary.html").read_bytes(), "utf-8", False)
+
+
+def period(day: date) -> str:
+    return day.strftime("%d.%m.%Y")
+
+
+class TestDiaryStore(unittest.TestCase):
+    def setUp(self):
+        self.store = DiaryStore(":memory:")
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_week_key(self):
+        # понедельник 13.09.2021 - воскресенье 19.09.2021
+        self.store.put("p", "s", "15.09.2021", DIARY)
+        for day in ("13.09.2021", "19.09.2021"):
+            self.assertEqual(self.store.get("p", "s", day), DIARY)
+        self.assertIsNone(self.store.get("p", "s", "12.09.2021"))
+        self.assertIsNone(self.store.get("p", "s", "20.09.2021"))
+        # запись принадлежит профилю и школе
+        self.assertIsNone(self.store.get("other", "s", "15.09.2021"))
+        self.assertIsNone(self.store.get("p", "other", "15.09.2021"))
+
+    def test_ttl_tiers(self):
+        today = date.today()
+        self.assertEqual(self.store.ttl_for(period(today - timedelta(days=7))), self.store.past_ttl)
+        self.assertEqual(self.store.ttl_for(period(today)), self.store.current_ttl)
+        self.assertEqual(self.store.ttl_for(period(today + timedelta(days=7))), self.store.current_ttl)
+
+    def test_expired(self):
+        today = date.today()
+        past, current = period(today - timedelta(days=7)), period(today)
+        with DiaryStore(":memory:", past_ttl=3600, current_ttl=-1) as store:
+            store.put("p", "s", past, DIARY)
+            store.put("p", "s", current, DIARY)
+            self.assertEqual(store.get("p", "s", past), DIARY)
+            self.assertIsNone(store.get("p", "s", current))
+            self.assertEqual(store.delete_expired(), 1)
+            self.assertEqual(store.get("p", "s", past), DIARY)
+
+    def test_persists_after_reopen(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/diaries.sqlite3"
+            with DiaryStore(path) as store:
+                store.put("p", "s", "13.09.2021", DIARY)
+            with DiaryStore(path) as store:
+                self.assertEqual(store.get("p", "s", "17.09.2021"), DIARY)
+
+
+class TestClientDiaryStore(unittest.IsolatedAsyncioTestCase):
+    async def test_same_week_from_store(self):
+        async with StubServer(StubConfig()) as stub:
+            with DiaryStore(":memory:") as store:
+                async with Dnevnik("user", "password", base_url=stub.url, limiter=TokenBucket(1000),
+                                   diary_store=store) as d:
+                    await d.auth()
+                    first = await d.get_diary("13.09.2021")
+                    second = await d.get_diary("16.09.2021")
+                    await d.get_diary("20.09.2021")
+                self.assertEqual(second, first)
+                self.assertEqual(stub.stats.requests["currentprogress"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
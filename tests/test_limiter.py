@@ -0,0 +1,78 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+from time import monotonic
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dnevnikru_aio.limiter import RateLimiter, TokenBucket  # noqa: E402
+
+"""
+Тесты ограничителей частоты запросов
+"""
+
+# допуск на неточность таймеров event loop
+EPS = 0.03
+
+
+class TestTokenBucket(unittest.IsolatedAsyncioTestCase):
+    async def test_burst(self):
+        bucket = TokenBucket(rate=10, burst=3)
+        waits = [await bucket.acquire() for _ in range(4)]
+        for waited in waits[:3]:
+            self.assertLess(waited, EPS)
+        self.assertAlmostEqual(waits[3], 0.1, delta=EPS)
+
+    async def test_refill(self):
+        bucket = TokenBucket(rate=20, burst=2)
+        await bucket.acquire()
+        await bucket.acquire()
+        await asyncio.sleep(0.2)
+        # за паузу накопилось не больше burst токенов
+        self.assertLess(await bucket.acquire(), EPS)
+        self.assertLess(await bucket.acquire(), EPS)
+        self.assertAlmostEqual(await bucket.acquire(), 0.05, delta=EPS)
+
+    async def test_concurrent_fifo(self):
+        bucket = TokenBucket(rate=20)
+        order = []
+        start = monotonic()
+
+        async def acquire(i: int) -> float:
+            waited = await bucket.acquire()
+            order.append(i)
+            return waited
+
+        waits = await asyncio.gather(*[acquire(i) for i in range(10)])
+        self.assertEqual(order, list(range(10)))
+        # время ожидания включает очередь на блокировке
+        for i, waited in enumerate(waits):
+            self.assertAlmostEqual(waited, i * 0.05, delta=EPS)
+        self.assertAlmostEqual(monotonic() - start, 0.45, delta=EPS * 2)
+
+    def test_rate_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_per_account(self):
+        limiter = RateLimiter(per_account=10)
+        self.assertLess(await limiter.acquire(account="a"), EPS)
+        self.assertLess(await limiter.acquire(account="b"), EPS)
+        self.assertAlmostEqual(await limiter.acquire(account="a"), 0.1, delta=EPS)
+
+    async def test_global_and_host(self):
+        limiter = RateLimiter(rate=10, burst=2, per_host=5)
+        self.assertLess(await limiter.acquire(host="x"), EPS)
+        # общий лимит ещё позволяет, лимит хоста - нет
+        self.assertAlmostEqual(await limiter.acquire(host="x"), 0.2, delta=EPS)
+        self.assertLess(await limiter.acquire(host="y"), EPS)
+
+    async def test_no_limits(self):
+        self.assertLess(await RateLimiter().acquire(host="x", account="a"), EPS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from dnevnikru_aio import Dnevnik, TokenBucket  # noqa: E402
+from dnevnikru_aio.cache import ResponseCache  # noqa: E402
+from dnevnikru_aio.exceptions import StatusCodeError  # noqa: E402
+from dnevnikru_aio.metrics import Histogram, Metrics  # noqa: E402
+from dnevnikru_aio.retry import RetryPolicy  # noqa: E402
+from stub_server import StubConfig, StubServer  # noqa: E402
+
+"""
+Тесты метрик: гистограммы, формат Prometheus и счётчики клиента на локальной заглушке дневник.ру
+"""
+
+PERIOD = "13.09.2021"
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets(self):
+        histogram = Histogram((1, 2, 5))
+        for value in (0.5, 1, 1.5, 5, 7):
+            histogram.observe(value)
+        # значение на границе попадает в её корзину (le), больше всех границ - в +Inf
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.cumulative(), [(1, 2), (2, 3), (5, 4), (float("inf"), 5)])
+        self.assertEqual((histogram.count, histogram.sum, histogram.mean), (5, 15, 3))
+
+    def test_quantile(self):
+        histogram = Histogram((1, 2, 5))
+        self.assertEqual(histogram.quantile(0.5), 0)
+        for value in (0.5, 1.5, 1.5, 3):
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.5), 2)
+        self.assertEqual(histogram.quantile(1), 5)
+        histogram.observe(10)
+        self.assertEqual(histogram.quantile(1), float("inf"))
+
+    def test_size_buckets(self):
+        metrics = Metrics()
+        metrics.observe("response_bytes", 2000, endpoint="diary")
+        metrics.observe("parse_seconds", 0.02, endpoint="diary")
+        self.assertEqual(metrics.histogram("response_bytes", endpoint="diary").buckets[0], 1024)
+        self.assertEqual(metrics.histogram("parse_seconds", endpoint="diary").buckets[0], 0.001)
+
+
+class TestPrometheus(unittest.TestCase):
+    def test_text_format(self):
+        metrics = Metrics(prefix="test")
+        metrics.inc("requests_total", endpoint="diary")
+        metrics.inc("requests_total", 2, endpoint="users")
+        metrics.inc("responses_total", endpoint='a"b', status="200")
+        metrics.BUCKETS = {"body_seconds": (0.1, 1)}
+        metrics.observe("body_seconds", 0.5, endpoint="diary")
+        metrics.observe("body_seconds", 0.25, endpoint="diary")
+        self.assertEqual(metrics.prometheus(), "\n".join([
+            "# TYPE test_requests_total counter",
+            'test_requests_total{endpoint="diary"} 1',
+            'test_requests_total{endpoint="users"} 2',
+            "# TYPE test_responses_total counter",
+            'test_responses_total{endpoint="a\\"b",status="200"} 1',
+            "# TYPE test_body_seconds histogram",
+            'test_body_seconds_bucket{endpoint="diary",le="0.1"} 0',
+            'test_body_seconds_bucket{endpoint="diary",le="1"} 2',
+            'test_body_seconds_bucket{endpoint="diary",le="+Inf"} 2',
+            'test_body_seconds_sum{endpoint="diary"} 0.75',
+            'test_body_seconds_count{endpoint="diary"} 2',
+        ]) + "\n")
+
+    def test_callback(self):
+        metrics = Metrics()
+        events = []
+        metrics.add_callback(lambda name, value, labels: events.append((name, value, labels)))
+        metrics.inc("requests_total", endpoint="diary")
+        metrics.observe("parse_seconds", 0.5, endpoint="diary")
+        self.assertEqual(events, [("requests_total", 1, {"endpoint": "diary"}),
+                                  ("parse_seconds", 0.5, {"endpoint": "diary"})])
+
+
+class TestClientMetrics(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.stub = StubServer(StubConfig())
+        await self.stub.start()
+        self.metrics = Metrics()
+
+    async def asyncTearDown(self):
+        await self.stub.stop()
+
+    def client(self, **kwargs) -> Dnevnik:
+        return Dnevnik("user", "password", base_url=self.stub.url, limiter=TokenBucket(1000), metrics=self.metrics,
+                       **kwargs)
+
+    def counter(self, name: str, **labels) -> float:
+        return self.metrics.counter(name, **labels)
+
+    async def test_request_counters(self):
+        async with self.client() as d:
+            await d.auth()
+            await d.get_diary(PERIOD)
+        self.assertEqual(self.counter("requests_total", endpoint="diary"), 1)
+        self.assertEqual(self.counter("attempts_total", endpoint="diary"), 1)
+        self.assertEqual(self.counter("responses_total", endpoint="diary", status="200"), 1)
+        self.assertEqual(self.counter("retries_total", endpoint="diary"), 0)
+        for name in ("ttfb_seconds", "body_seconds", "response_bytes", "parse_seconds", "limiter_wait_seconds"):
+            with self.subTest(histogram=name):
+                self.assertEqual(self.metrics.histogram(name, endpoint="diary").count, 1)
+        size = self.metrics.histogram("response_bytes", endpoint="diary").sum
+        self.assertGreater(size, 1024)
+        self.assertIn('dnevnik_requests_total{endpoint="diary"} 1\n', self.metrics.prometheus())
+
+    async def test_retry_counters(self):
+        async with self.client(retry_policy=RetryPolicy(attempts=3, backoff=0.01, jitter=0)) as d:
+            await d.auth()
+            vars(self.stub.config).update(error_rate=1, error_statuses=(503,))
+            with self.assertRaises(StatusCodeError):
+                await asyncio.wait_for(d.get_diary(PERIOD), 10)
+        self.assertEqual(self.counter("requests_total", endpoint="diary"), 1)
+        self.assertEqual(self.counter("attempts_total", endpoint="diary"), 3)
+        self.assertEqual(self.counter("retries_total", endpoint="diary"), 2)
+        self.assertEqual(self.counter("failures_total", endpoint="diary"), 1)
+        self.assertEqual(self.counter("responses_total", endpoint="diary", status="503"), 3)
+
+    async def test_cache_counters(self):
+        async with self.client(cache=ResponseCache()) as d:
+            await d.auth()
+            await d.get_diary(PERIOD)
+            await d.get_diary(PERIOD)
+        self.assertEqual(self.counter("cache_total", endpoint="diary", result="miss"), 1)
+        self.assertEqual(self.counter("cache_total", endpoint="diary", result="hit"), 1)
+        self.assertEqual(self.counter("requests_total", endpoint="diary"), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import pickle
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dnevnikru_aio.parsers import build_model, get_parsers, load_model, parse_page  # noqa: E402
+from dnevnikru_aio.types import Diary  # noqa: E402
+
+"""
+Тесты парсеров на сохранённых синтетических страницах benchmarks/fixtures, без обращения к сайту.
+Обновить страницы: python benchmarks/pages.py
+"""
+
+FIXTURES = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures"
+
+# страница -> поле ParserBackend с классом парсера
+PAGES = {
+    "diary.html": "diary",
+    "bday_calendar.html": "calendar",
+    "class_users.html": "users",
+    "school.html": "users",
+    "bday_near.html": "users",
+}
+
+# секции дневника, сравниваются по отдельности для понятного сообщения об ошибке
+DIARY_SECTIONS = ("info", "themes", "attendances", "progress", "homeworks", "schedules")
+
+
+def read_page(name: str) -> bytes:
+    return (FIXTURES / name).read_bytes()
+
+
+class FixtureTestCase(unittest.TestCase):
+    def assertSameModel(self, expected, actual):
+        self.assertIs(type(actual), type(expected))
+        if hasattr(expected, "load"):
+            for section in DIARY_SECTIONS:
+                with self.subTest(section=section):
+                    self.assertTrue(getattr(expected, section))
+                    self.assertEqual(getattr(actual, section), getattr(expected, section))
+        else:
+            self.assertTrue(list(expected))
+        self.assertEqual(actual, expected)
+
+
+class TestLxmlBackend(FixtureTestCase):
+    """Модели lxml бэкенда совпадают с моделями BeautifulSoup"""
+    def test_parity(self):
+        bs4, lxml = get_parsers("bs4"), get_parsers("lxml")
+        for name, kind in PAGES.items():
+            with self.subTest(page=name):
+                page = read_page(name)
+                self.assertSameModel(parse_page(getattr(bs4, kind), page, "utf-8", False),
+                                     parse_page(getattr(lxml, kind), page, "utf-8", False))
+
+
+class TestStrainer(FixtureTestCase):
+    """Разбор только нужных поддеревьев (SoupStrainer) даёт те же модели, что и разбор всей страницы"""
+    def test_strained_equals_full(self):
+        bs4 = get_parsers("bs4")
+        for name, kind in PAGES.items():
+            with self.subTest(page=name):
+                page, parser_cls = read_page(name), getattr(bs4, kind)
+                full = load_model(build_model(parser_cls(page, strain=False, encoding="utf-8")))
+                self.assertSameModel(full, parse_page(parser_cls, page, "utf-8", False))
+
+
+class TestLazyDiary(unittest.TestCase):
+    def diary(self, backend: str = "bs4") -> Diary:
+        return parse_page(get_parsers(backend).diary, read_page("diary.html"), "utf-8")
+
+    def test_sections_on_access(self):
+        for backend in ("bs4", "lxml"):
+            with self.subTest(backend=backend):
+                diary = self.diary(backend)
+                self.assertIsInstance(diary.homeworks, list)
+                # разобрана только запрошенная секция
+                self.assertNotIn("homeworks", diary._loaders)
+                self.assertIn("themes", diary._loaders)
+                self.assertIs(diary.load(), diary)
+                self.assertIsNone(diary._loaders)
+
+    def test_pickle_loads_all_sections(self):
+        diary = self.diary()
+        restored = pickle.loads(pickle.dumps(diary))
+        self.assertIsNone(getattr(restored, "_loaders", None))
+        self.assertEqual(restored, self.diary().load())
+
+    def test_failed_section_raises_again(self):
+        calls = []
+
+        def broken():
+            calls.append(1)
+            if len(calls) == 1:
+                raise ValueError("broken page")
+            return []
+
+        diary = Diary.lazy({"themes": broken}, info=None)
+        with self.assertRaises(ValueError):
+            diary.themes
+        # функция разбора не потеряна: повторное обращение снова разбирает секцию
+        self.assertEqual(diary.themes, [])
+        self.assertEqual(len(calls), 2)
+        self.assertIsNone(diary._loaders)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from dnevnikru_aio.parsers_lxml import LxmlUsersStream  # noqa: E402
+from pages import full_name, users_page  # noqa: E402
+
+"""
+Тесты потокового парсера страниц пользователей на синтетических страницах benchmarks/pages.py
+"""
+
+
+def stream_all(page: bytes, chunk_size: int):
+    stream = LxmlUsersStream(encoding="utf-8")
+    users = []
+    for i in range(0, len(page), chunk_size):
+        users += stream.feed(page[i:i + chunk_size])
+    users += stream.close()
+    return stream, users
+
+
+class TestUsersStream(unittest.TestCase):
+    page = users_page(25, found=100, start=10).encode()
+
+    def test_chunked_feed(self):
+        _, expected = stream_all(self.page, len(self.page))
+        self.assertEqual([user.full_name for user in expected], [full_name(i) for i in range(10, 35)])
+        for chunk_size in (1, 7, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(stream_all(self.page, chunk_size)[1], expected)
+
+    def test_users_before_page_end(self):
+        stream = LxmlUsersStream(encoding="utf-8")
+        # пользователь отдаётся по закрытию td.tdName, до конца строки, таблицы и страницы
+        users = list(stream.feed(self.page[:self.page.rindex(b"</tr>")]))
+        self.assertEqual(len(users), 25)
+
+    def test_count(self):
+        self.assertEqual(stream_all(self.page, 100)[0].count, 100)
+        # без p.found счётчик неизвестен
+        stream, users = stream_all(users_page(0, found=0).encode(), 100)
+        self.assertIsNone(stream.count)
+        self.assertEqual(users, [])
+
+    def test_row_without_user(self):
+        page = users_page(2).replace('<a class="u" href="https://dnevnik.ru/user/user.aspx?user=1">', "<a>", 1)
+        users = stream_all(page.encode(), 50)[1]
+        self.assertEqual([user.full_name for user in users], [full_name(0)])
+
+    def test_rows_are_released(self):
+        stream = LxmlUsersStream(encoding="utf-8")
+        list(stream.feed(self.page))
+        root = stream._parser.close()
+        # разобранные строки удалены из дерева, осталась последняя
+        self.assertLessEqual(len(root.xpath("//table//tr")), 1)
+        self.assertFalse(root.xpath("//table//tr/*"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from dnevnikru_aio import DnevnikPool  # noqa: E402
+from stub_server import StubConfig, StubServer  # noqa: E402
+
+"""
+Тесты пула клиентов на локальной заглушке дневник.ру
+"""
+
+
+class TestPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.stub = StubServer(StubConfig(latency=0.01, school_size=300))
+        await self.stub.start()
+        accounts = {login: "password" for login in ("a", "b", "c")}
+        self.pool = DnevnikPool(accounts, per_account=None, max_clients=1, base_url=self.stub.url)
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+        await self.stub.stop()
+
+    async def test_leased_client_is_not_evicted(self):
+        async def crawl() -> int:
+            async with self.pool.lease("a") as d:
+                return sum([len(users.items) async for users in d.get_all_peoples()])
+
+        task = asyncio.ensure_future(crawl())
+        await asyncio.sleep(0.05)
+        await self.pool.get("b")
+        self.assertEqual(await task, 300)
+        # после выхода из lease лишний клиент закрывается
+        self.assertEqual(len(self.pool), 1)
+
+    async def test_parallel_get(self):
+        clients = await asyncio.gather(*[self.pool.get(login) for login in ("a", "b", "c", "a", "b")])
+        self.assertEqual([client.diary_api.account for client in clients], ["a", "b", "c", "a", "b"])
+        self.assertLessEqual(len(self.pool), 1)
+
+    async def test_failed_eviction_releases_lease(self):
+        client = await self.pool.get("a")
+
+        async def broken_close():
+            raise RuntimeError("close failed")
+
+        client.close = broken_close
+        # выход за max_clients закрывает "a", закрытие падает
+        with self.assertRaises(RuntimeError):
+            async with self.pool.lease("b"):
+                pass
+        self.assertEqual(self.pool._active, {})
+        self.pool._clients.pop("a", None)
+
+    async def test_one_lock_per_login(self):
+        await self.pool.get("a")
+        lock = self.pool._locks["a"]
+        await self.pool.get("a")
+        self.assertIs(self.pool._locks["a"], lock)
+
+    async def test_lease_unknown_login(self):
+        with self.assertRaises(KeyError):
+            async with self.pool.lease("unknown"):
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
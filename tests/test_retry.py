@@ -0,0 +1,100 @@
+import asyncio
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from dnevnikru_aio import Dnevnik, TokenBucket  # noqa: E402
+from dnevnikru_aio.exceptions import StatusCodeError  # noqa: E402
+from dnevnikru_aio.retry import RetryPolicy  # noqa: E402
+from dnevnikru_aio.session import ConnectorSettings  # noqa: E402
+from stub_server import StubConfig, StubServer  # noqa: E402
+
+"""
+Тесты политики повторов: разбор Retry-After и классификация статусов на локальной заглушке дневник.ру
+"""
+
+
+def http_date(seconds: float) -> str:
+    return format_datetime(datetime.now(timezone.utc) + timedelta(seconds=seconds), usegmt=True)
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_retry_after_seconds(self):
+        self.assertEqual(RetryPolicy().delay(1, "7"), 7)
+
+    def test_retry_after_http_date(self):
+        self.assertAlmostEqual(RetryPolicy().delay(1, http_date(30)), 30, delta=1.5)
+        self.assertEqual(RetryPolicy().delay(1, http_date(-30)), 0)
+
+    def test_retry_after_limit(self):
+        self.assertEqual(RetryPolicy(max_retry_after=5).delay(1, "120"), 5)
+
+    def test_backoff_without_retry_after(self):
+        policy = RetryPolicy(backoff=1, multiplier=2, jitter=0, max_backoff=3)
+        self.assertEqual([policy.delay(attempt, "not a date") for attempt in (1, 2, 3)], [1, 2, 3])
+        self.assertEqual(RetryPolicy(backoff=1, jitter=0, respect_retry_after=False).delay(1, "7"), 1)
+
+
+class TestStatuses(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.stub = StubServer(StubConfig(error_rate=1))
+        await self.stub.start()
+        self.policy = RetryPolicy(attempts=3, backoff=0.01, jitter=0)
+        # одно соединение: неосвобождённый ответ отброшенной попытки заблокировал бы следующую
+        self.dnevnik = Dnevnik("user", "password", base_url=self.stub.url, limiter=TokenBucket(1000),
+                               retry_policy=self.policy, connector_settings=ConnectorSettings(limit=1))
+        self.url = self.dnevnik.diary_api.USER_URI
+
+    async def asyncTearDown(self):
+        await self.dnevnik.close()
+        await self.stub.stop()
+
+    async def request(self, **config):
+        vars(self.stub.config).update(config)
+        with self.assertRaises(StatusCodeError) as cm:
+            await asyncio.wait_for(self.dnevnik.diary_api.request_get(self.url), 10)
+        return cm.exception
+
+    async def test_not_found_fails_immediately(self):
+        error = await self.request(error_statuses=(404,))
+        self.assertEqual(error.status, 404)
+        stats = self.policy.stats
+        self.assertEqual((stats.requests, stats.attempts, stats.retries, stats.failures), (1, 1, 0, 1))
+        self.assertEqual(stats.statuses, {404: 1})
+
+    async def test_server_errors_retried_up_to_attempts(self):
+        error = await self.request(error_statuses=(500, 502, 503))
+        self.assertIn(error.status, (500, 502, 503))
+        stats = self.policy.stats
+        self.assertEqual((stats.requests, stats.attempts, stats.retries, stats.failures), (1, 3, 2, 1))
+        self.assertEqual(sum(stats.statuses.values()), 3)
+        self.assertEqual(self.stub.stats.requests["userfeed"], 3)
+
+    async def test_retry_after_seconds(self):
+        await self.request(error_statuses=(429,), retry_after=1)
+        self.assertEqual(self.policy.stats.total_delay, 2)
+        self.assertEqual(self.policy.stats.statuses, {429: 3})
+
+    async def test_retry_after_http_date(self):
+        self.policy.attempts = 2
+        await self.request(error_statuses=(429,), retry_after=http_date(2))
+        # HTTP дата с точностью до секунды
+        self.assertGreater(self.policy.stats.total_delay, 0.5)
+        self.assertLessEqual(self.policy.stats.total_delay, 2)
+        self.assertEqual(self.policy.stats.retries, 1)
+
+    async def test_responses_released(self):
+        # тело больше буфера сокета: без release соединение осталось бы занятым
+        for _ in range(3):
+            await self.request(error_statuses=(503,), error_body_size=4 * 1024 * 1024)
+        self.assertEqual(self.policy.stats.attempts, 9)
+        self.assertEqual(self.policy.stats.failures, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
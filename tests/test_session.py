@@ -0,0 +1,344 @@
+import asyncio
+import sqlite3
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from dnevnikru_aio import Dnevnik, TokenBucket  # noqa: E402
+from dnevnikru_aio.auth_store import AuthState, AuthStore, MemoryAuthStore  # noqa: E402
+from dnevnikru_aio.cache import ResponseCache  # noqa: E402
+from dnevnikru_aio.directory_store import DirectoryStore  # noqa: E402
+from dnevnikru_aio.retry import RetryPolicy  # noqa: E402
+from dnevnikru_aio.exceptions import AuthExpired, PageNotFound, StatusCodeError  # noqa: E402
+from pages import full_name  # noqa: E402
+from stub_server import StubConfig, StubServer  # noqa: E402
+
+"""
+Тесты сессии на локальной заглушке дневник.ру (benchmarks/stub_server.py), без обращения к сайту
+"""
+
+PERIOD = "13.09.2021"
+
+
+class StubTestCase(unittest.IsolatedAsyncioTestCase):
+    """Заглушка и авторизованный клиент на каждый тест"""
+    config = StubConfig()
+
+    async def asyncSetUp(self):
+        self.stub = StubServer(StubConfig(**vars(self.config)))
+        await self.stub.start()
+        self.dnevnik = self.make_client()
+        await self.dnevnik.auth()
+
+    async def asyncTearDown(self):
+        await self.dnevnik.close()
+        await self.stub.stop()
+
+    def make_client(self, **kwargs) -> Dnevnik:
+        return Dnevnik("user", "password", base_url=self.stub.url, limiter=TokenBucket(1000), **kwargs)
+
+    def requests(self, path: str) -> int:
+        return self.stub.stats.requests[path]
+
+
+class TestCoalesce(StubTestCase):
+    config = StubConfig(latency=0.1)
+
+    async def test_cancel_one_waiter(self):
+        tasks = [asyncio.ensure_future(self.dnevnik.get_diary(PERIOD)) for _ in range(3)]
+        await asyncio.sleep(0.02)
+        tasks[0].cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await tasks[0]
+        first, second = await asyncio.gather(*tasks[1:])
+        self.assertIs(first, second)
+        self.assertEqual(self.requests("currentprogress"), 1)
+
+    async def test_error_reaches_every_waiter(self):
+        self.stub.config.error_rate = 1
+        self.stub.config.error_statuses = (404,)
+        results = await asyncio.gather(*[self.dnevnik.get_diary(PERIOD) for _ in range(5)], return_exceptions=True)
+        self.assertTrue(all(isinstance(r, PageNotFound) for r in results), results)
+        self.assertEqual(self.requests("currentprogress"), 1)
+
+    async def test_late_joiner_after_cancel(self):
+        task = asyncio.ensure_future(self.dnevnik.get_diary(PERIOD))
+        await asyncio.sleep(0.02)
+        task.cancel()
+        # единственный ожидающий отменил загрузку, но задача загрузки ещё не завершилась
+        await asyncio.sleep(0)
+        diary = await self.dnevnik.get_diary(PERIOD)
+        self.assertIsNotNone(diary.info)
+        self.assertTrue(task.cancelled())
+        self.assertFalse(self.dnevnik.diary_api._inflight)
+
+
+class TestAuthState(StubTestCase):
+    def jar(self, client: Dnevnik) -> list:
+        return sorted((morsel.key, morsel["domain"]) for morsel in client.diary_api.session.cookie_jar)
+
+    async def test_cookies_keep_domain(self):
+        state = AuthState.from_dict(self.dnevnik.diary_api.export_auth().to_dict())
+        self.assertTrue(all(cookie["domain"] == "localhost" for cookie in state.cookies), state.cookies)
+        async with self.make_client() as restored:
+            restored.diary_api.import_auth(state)
+            self.assertEqual(self.jar(restored), self.jar(self.dnevnik))
+            self.assertTrue(await restored.diary_api.validate_auth())
+
+    async def test_relogin_replaces_restored_cookies(self):
+        store = MemoryAuthStore()
+        store.save(self.dnevnik.diary_api.export_auth())
+        # сессия снимка истекла на сервере
+        self.stub._sessions.clear()
+        async with self.make_client() as restored:
+            await restored.auth(store=store)
+            names = [name for name, _ in self.jar(restored)]
+            self.assertEqual(len(names), len(set(names)), self.jar(restored))
+            self.assertEqual(self.stub.stats.logins, 2)
+
+    def test_old_snapshot_format(self):
+        state = AuthState.from_dict(dict(login="user", cookies={"DnevnikAuth_a": "token"}, school_id="1",
+                                         class_id="2", profile_id="3"))
+        self.assertEqual(state.cookies, [{"name": "DnevnikAuth_a", "value": "token", "domain": "", "path": "/"}])
+
+    def test_store_is_abstract(self):
+        with self.assertRaises(TypeError):
+            AuthStore()
+
+
+class TestLazyDiary(StubTestCase):
+    def assertLoaded(self, diary, loaded: bool = True):
+        # у полностью разобранного дневника не осталось функций разбора, а с ними и парсера
+        self.assertEqual(diary._loaders is None, loaded)
+
+    async def test_inline_is_lazy(self):
+        diary = await self.dnevnik.get_diary(PERIOD)
+        self.assertLoaded(diary, False)
+        self.assertTrue(diary.homeworks)
+        self.assertLoaded(diary.load())
+
+    async def test_executor_builds_whole_diary(self):
+        with ThreadPoolExecutor(1) as executor:
+            async with self.make_client(parse_executor=executor, parse_inline_limit=0) as d:
+                await d.auth()
+                self.assertLoaded(await d.get_diary(PERIOD))
+
+    async def test_cached_diary_is_loaded(self):
+        async with self.make_client(cache=ResponseCache()) as d:
+            await d.auth()
+            diary = await d.get_diary(PERIOD)
+            self.assertLoaded(diary)
+            self.assertIs(await d.get_diary(PERIOD), diary)
+
+    async def test_get_diaries_are_loaded(self):
+        diaries = [diary async for diary in self.dnevnik.get_diaries("06.09.2021", "26.09.2021")]
+        self.assertEqual(len(diaries), 3)
+        for diary in diaries:
+            self.assertLoaded(diary)
+
+
+class TestRevalidation(StubTestCase):
+    config = StubConfig(etag=True)
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.cache = ResponseCache(ttl={"diary": 0.2})
+        self.client = self.make_client(cache=self.cache)
+        await self.client.auth()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await super().asyncTearDown()
+
+    async def test_stale_entry_revalidated(self):
+        diary = await self.client.get_diary(PERIOD)
+        await asyncio.sleep(0.25)
+        # устаревшая запись подтверждена ответом 304, модель не разбирается заново
+        self.assertIs(await self.client.get_diary(PERIOD), diary)
+        self.assertEqual(self.stub.stats.statuses[304], 1)
+        self.assertEqual((self.cache.stats.misses, self.cache.stats.revalidated), (1, 1))
+        # время жизни продлено: следующий запрос без обращения к сайту
+        self.assertIs(await self.client.get_diary(PERIOD), diary)
+        self.assertEqual(self.cache.stats.hits, 1)
+        self.assertEqual(self.requests("currentprogress"), 2)
+
+    async def test_changed_page_reloaded(self):
+        diary = await self.client.get_diary(PERIOD)
+        await asyncio.sleep(0.25)
+        self.stub.config.lessons += 1
+        changed = await self.client.get_diary(PERIOD)
+        self.assertIsNot(changed, diary)
+        self.assertEqual(self.stub.stats.statuses[304], 0)
+        self.assertEqual((self.cache.stats.misses, self.cache.stats.revalidated), (2, 0))
+
+
+class TestDiaries(StubTestCase):
+    WEEKS = ("13.09.2021", "20.09.2021", "27.09.2021")
+
+    async def diaries(self, **kwargs) -> list:
+        return [diary async for diary in self.dnevnik.get_diaries(self.WEEKS[0], self.WEEKS[-1], **kwargs)]
+
+    async def test_missing_week_skipped(self):
+        self.stub.config.diary_errors = {"20.09.2021": 404}
+        for ordered in (True, False):
+            with self.subTest(ordered=ordered):
+                self.assertEqual(len(await self.diaries(ordered=ordered)), 2)
+
+    async def test_other_errors_propagate(self):
+        self.dnevnik.diary_api.retry_policy = RetryPolicy(attempts=2, backoff=0.01, jitter=0)
+        self.stub.config.diary_errors = {"20.09.2021": 404, "27.09.2021": 500}
+        with self.assertRaises(StatusCodeError) as cm:
+            await self.diaries(concurrency=1)
+        self.assertEqual(cm.exception.status, 500)
+
+
+class TestReauth(StubTestCase):
+    async def concurrent_diaries(self, n: int = 50, **config) -> list:
+        """n одновременных запросов после истечения сессии. config - настройки заглушки после входа"""
+        async with self.make_client(coalesce=False) as d:
+            await d.auth()
+            vars(self.stub.config).update(config)
+            self.stub._sessions.clear()
+            stats = self.stub.stats
+            logins, attempts = stats.logins, stats.login_attempts
+            results = await asyncio.gather(*[d.get_diary(PERIOD) for _ in range(n)], return_exceptions=True)
+            self.logins, self.attempts = stats.logins - logins, stats.login_attempts - attempts
+            return results
+
+    async def test_single_reauth_on_redirect(self):
+        results = await self.concurrent_diaries()
+        self.assertFalse([r for r in results if isinstance(r, BaseException)])
+        self.assertEqual(self.logins, 1)
+
+    async def test_single_reauth_on_login_page_without_redirect(self):
+        results = await self.concurrent_diaries(login_redirect=False)
+        self.assertFalse([r for r in results if isinstance(r, BaseException)])
+        self.assertEqual(self.logins, 1)
+
+    async def test_failed_reauth(self):
+        results = await self.concurrent_diaries(reject_logins=True)
+        self.assertTrue(all(isinstance(r, AuthExpired) for r in results), results)
+        self.assertEqual(self.attempts, 1)
+
+    async def test_failed_reauth_without_redirect(self):
+        results = await self.concurrent_diaries(login_redirect=False, reject_logins=True)
+        self.assertTrue(all(isinstance(r, AuthExpired) for r in results), results)
+        self.assertEqual(self.attempts, 1)
+
+    async def test_recovers_after_failed_reauth(self):
+        async with self.make_client(coalesce=False) as d:
+            await d.auth()
+            self.stub.config.reject_logins = True
+            self.stub._sessions.clear()
+            results = await asyncio.gather(*[d.get_diary(PERIOD) for _ in range(10)], return_exceptions=True)
+            self.assertTrue(all(isinstance(r, AuthExpired) for r in results), results)
+            # вход снова работает: следующий запрос начинает новую попытку
+            self.stub.config.reject_logins = False
+            attempts = self.stub.stats.login_attempts
+            results = await asyncio.gather(*[d.get_diary(PERIOD) for _ in range(10)])
+            self.assertTrue(all(r.info is not None for r in results))
+            self.assertEqual(self.stub.stats.login_attempts - attempts, 1)
+
+
+class TestStream(StubTestCase):
+    # 5 страниц по 20 пользователей
+    config = StubConfig(school_size=100, per_page=20, login_redirect=False)
+
+    async def stream(self, expire_after: int = 0) -> list:
+        """Все пользователи stream_peoples. expire_after - после скольких пользователей истекает сессия"""
+        users = []
+        async for user in self.dnevnik.stream_peoples():
+            users.append(user.url)
+            if len(users) == expire_after:
+                self.stub._sessions.clear()
+        return users
+
+    async def test_stops_at_found_count(self):
+        users = await self.stream()
+        self.assertEqual(len(set(users)), 100)
+        self.assertEqual(self.requests("school.aspx"), 5)
+
+    async def test_login_page_mid_stream(self):
+        users = await self.stream(expire_after=40)
+        self.assertEqual(len(users), 100)
+        self.assertEqual(len(set(users)), 100)
+        self.assertEqual(self.stub.stats.logins, 2)
+
+    async def test_failed_reauth_mid_stream(self):
+        self.stub.config.reject_logins = True
+        with self.assertRaises(AuthExpired):
+            await self.stream(expire_after=40)
+
+
+class TestDirectory(StubTestCase):
+    # 4 страницы по 30 пользователей
+    config = StubConfig(school_size=100)
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.store = DirectoryStore(":memory:")
+        self.dnevnik.diary_api.directory_store = self.store
+        await self.dnevnik.sync_directory(groups=())
+
+    async def asyncTearDown(self):
+        self.store.close()
+        await super().asyncTearDown()
+
+    async def test_unchanged_fetches_first_and_last(self):
+        stats = await self.dnevnik.sync_directory(groups=())
+        self.assertEqual((stats.unchanged, stats.pages_fetched, stats.pages_changed), (1, 2, 0))
+
+    async def test_last_page_changed(self):
+        self.stub.config.school_replaced = 5
+        stats = await self.dnevnik.sync_directory(groups=())
+        self.assertEqual(stats.unchanged, 0)
+        self.assertEqual(stats.pages_fetched, 4)
+        self.assertEqual(stats.pages_changed, 3)
+        self.assertEqual(stats.users, 100)
+        self.assertEqual(self.dnevnik.find_people(name=full_name(100)).count, 1)
+        self.assertEqual(self.dnevnik.find_people(name=full_name(50)).count, 0)
+
+    async def test_max_age_forces_full_crawl(self):
+        stats = await self.dnevnik.sync_directory(groups=(), max_age=0)
+        self.assertEqual((stats.unchanged, stats.pages_fetched), (0, 4))
+        # пропуск списка не считается полным обходом
+        await asyncio.sleep(0.01)
+        await self.dnevnik.sync_directory(groups=(), max_age=None)
+        stats = await self.dnevnik.sync_directory(groups=(), max_age=0.005)
+        self.assertEqual(stats.pages_fetched, 4)
+
+    async def test_cache_is_bypassed(self):
+        async with self.make_client(cache=ResponseCache(), directory_store=self.store) as d:
+            await d.auth()
+            await d.sync_directory(groups=(), full=True)
+            self.stub.config.school_replaced = 5
+            requests = self.requests("school.aspx")
+            stats = await d.sync_directory(groups=(), full=True)
+            self.assertEqual((stats.pages_fetched, stats.pages_changed), (4, 3))
+            self.assertEqual(self.requests("school.aspx") - requests, 4)
+
+    def test_unknown_group_searches_all(self):
+        self.assertEqual(self.dnevnik.find_people(group="unknown").count, 100)
+        self.assertEqual(self.dnevnik.find_people(group="students").count, 0)
+
+    def test_old_database(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/directory.sqlite3"
+            with sqlite3.connect(path) as db:
+                db.execute("CREATE TABLE scopes (school_id TEXT NOT NULL, scope TEXT NOT NULL, found INTEGER NOT NULL, "
+                           "synced_at REAL NOT NULL, PRIMARY KEY (school_id, scope)) WITHOUT ROWID")
+                db.execute("INSERT INTO scopes VALUES ('1', 'all', 10, 1.0)")
+            db.close()
+            with DirectoryStore(path) as store:
+                self.assertEqual(store.scope_state("1", "all"), (10, {}, 0))
+                store.save_scope("1", "all", 10, 0, crawled=False)
+                self.assertEqual(store.scope_state("1", "all")[2], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
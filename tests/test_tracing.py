@@ -0,0 +1,122 @@
+import asyncio
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from dnevnikru_aio import Dnevnik, TokenBucket  # noqa: E402
+from dnevnikru_aio.exceptions import PageNotFound  # noqa: E402
+from dnevnikru_aio.tracing import JsonLinesSink, MemorySink, Span, SpanSink, Tracer  # noqa: E402
+from stub_server import StubConfig, StubServer  # noqa: E402
+
+"""
+Тесты трассировки: дерево интервалов вызовов на локальной заглушке дневник.ру
+"""
+
+PERIOD = "13.09.2021"
+
+
+class TestTracer(unittest.TestCase):
+    def test_nesting(self):
+        sink = MemorySink()
+        tracer = Tracer(sink)
+        with tracer.span("root", call="x") as root:
+            with tracer.span("child") as child:
+                child.set("size", 1)
+            self.assertIs(Tracer.current(), root)
+        self.assertIsNone(Tracer.current())
+        self.assertEqual([span.name for span in sink.spans], ["child", "root"])
+        self.assertEqual(sink.children(root), [child])
+        self.assertEqual((child.parent_id, child.trace_id), (root.span_id, root.trace_id))
+        self.assertEqual((root.attributes, child.attributes), ({"call": "x"}, {"size": 1}))
+
+    def test_error(self):
+        sink = MemorySink()
+        with self.assertRaises(KeyError):
+            with Tracer(sink).span("root"):
+                raise KeyError()
+        self.assertEqual(sink.find("root")[0].error, "KeyError")
+
+    def test_sink_is_abstract(self):
+        with self.assertRaises(TypeError):
+            SpanSink()
+
+    def test_json_lines(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sink = JsonLinesSink(f"{tmp}/spans.jsonl")
+            tracer = Tracer(sink)
+            with tracer.span("root", endpoint="diary"):
+                pass
+            tracer.close()
+            with open(sink.path, encoding="utf-8") as file:
+                spans = [Span(**json.loads(line)) for line in file]
+        self.assertEqual([(span.name, span.attributes) for span in spans], [("root", {"endpoint": "diary"})])
+
+
+class TestClientTracing(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.stub = StubServer(StubConfig())
+        await self.stub.start()
+        self.sink = MemorySink()
+        self.dnevnik = Dnevnik("user", "password", base_url=self.stub.url, limiter=TokenBucket(1000),
+                               tracer=Tracer(self.sink))
+        await self.dnevnik.auth()
+        self.sink.clear()
+
+    async def asyncTearDown(self):
+        await self.dnevnik.close()
+        await self.stub.stop()
+
+    def tree(self, span: Span) -> tuple:
+        """(название, дочерние деревья)"""
+        return span.name, [self.tree(child) for child in self.sink.children(span)]
+
+    def root(self) -> Span:
+        roots = [span for span in self.sink.spans if span.parent_id is None]
+        self.assertEqual(len(roots), 1, roots)
+        return roots[0]
+
+    async def test_get_diary_tree(self):
+        await self.dnevnik.get_diary(PERIOD)
+        root = self.root()
+        self.assertEqual(self.tree(root), ("get_diary", [
+            ("diary", [
+                ("fetch", [
+                    ("request", [("limiter_wait", []), ("attempt", [])]),
+                    ("read", []), ("parse", []), ("build", []),
+                ]),
+            ]),
+        ]))
+        self.assertTrue(all(span.trace_id == root.trace_id for span in self.sink.spans))
+        self.assertTrue(all(span.error is None for span in self.sink.spans))
+        self.assertEqual(root.attributes["period"], PERIOD)
+        request, attempt = self.sink.find("request")[0], self.sink.find("attempt")[0]
+        self.assertEqual(request.attributes["endpoint"], "diary")
+        self.assertEqual(attempt.attributes, {"attempt": 1, "status": 200})
+        self.assertGreater(self.sink.find("read")[0].attributes["bytes"], 0)
+        self.assertLessEqual(attempt.duration, request.duration)
+
+    async def test_error_status(self):
+        vars(self.stub.config).update(error_rate=1, error_statuses=(404,))
+        with self.assertRaises(PageNotFound):
+            await self.dnevnik.get_diary(PERIOD)
+        root = self.root()
+        self.assertEqual(root.error, "PageNotFound")
+        self.assertIsNotNone(self.sink.find("request")[0].error)
+        self.assertEqual(self.sink.find("attempt")[0].attributes["status"], 404)
+
+    async def test_concurrent_calls_separate_traces(self):
+        await asyncio.gather(self.dnevnik.get_diary(PERIOD), self.dnevnik.get_diary("20.09.2021"))
+        roots = self.sink.find("get_diary")
+        self.assertEqual(len(roots), 2)
+        self.assertNotEqual(roots[0].trace_id, roots[1].trace_id)
+        for root in roots:
+            self.assertEqual(len([span for span in self.sink.spans if span.trace_id == root.trace_id]), 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import asyncio
+import gc
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dnevnikru_aio.utils import iter_concurrent, iter_prefetch  # noqa: E402
+
+"""
+Тесты асинхронных утилит
+"""
+
+
+class TestConcurrent(unittest.IsolatedAsyncioTestCase):
+    async def failed_tasks(self, ordered: bool) -> list:
+        """Ошибки loop после того, как две задачи упали одновременно. Должно быть пусто"""
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context["message"]))
+
+        async def fail(i: int):
+            raise ValueError(i)
+
+        # не assertRaises: сохранённое исключение через traceback держит задачи живыми
+        try:
+            async for _ in iter_concurrent([lambda: fail(1), lambda: fail(2)], limit=2, ordered=ordered):
+                pass
+        except ValueError:
+            pass
+        else:
+            self.fail("ValueError not raised")
+        # сообщение о непрочитанном исключении пишется при удалении задачи
+        gc.collect()
+        return errors
+
+    async def test_unordered_failures_retrieved(self):
+        self.assertEqual(await self.failed_tasks(ordered=False), [])
+
+    async def test_ordered_failures_retrieved(self):
+        self.assertEqual(await self.failed_tasks(ordered=True), [])
+
+    async def test_unordered_all_results(self):
+        async def value(i: int):
+            await asyncio.sleep(0.001 * (i % 3))
+            return i
+
+        factories = [lambda i=i: value(i) for i in range(20)]
+        self.assertEqual(sorted([r async for r in iter_concurrent(factories, limit=5, ordered=False)]), list(range(20)))
+
+
+class TestPrefetch(unittest.IsolatedAsyncioTestCase):
+    async def test_order_and_end(self):
+        async def source():
+            for i in range(10):
+                await asyncio.sleep(0)
+                yield i
+
+        self.assertEqual([i async for i in iter_prefetch(source(), 3)], list(range(10)))
+
+    async def test_error_after_items(self):
+        async def source():
+            yield 1
+            yield 2
+            raise ValueError("source")
+
+        items = []
+        with self.assertRaises(ValueError):
+            async for item in iter_prefetch(source(), 5):
+                items.append(item)
+        self.assertEqual(items, [1, 2])
+
+    async def test_cancelled_source_does_not_hang(self):
+        async def source():
+            yield 1
+            raise asyncio.CancelledError()
+
+        items = []
+
+        async def consume():
+            async for item in iter_prefetch(source(), 2):
+                items.append(item)
+
+        with self.assertRaises(asyncio.CancelledError):
+            await asyncio.wait_for(consume(), 1)
+        self.assertEqual(items, [1])
+
+    async def test_early_break_closes_source(self):
+        closed = []
+
+        async def source():
+            try:
+                for i in range(100):
+                    await asyncio.sleep(0.001)
+                    yield i
+            finally:
+                closed.append(True)
+
+        prefetch = iter_prefetch(source(), 2)
+        async for item in prefetch:
+            if item == 3:
+                break
+        await prefetch.aclose()
+        self.assertEqual(closed, [True])
+        self.assertEqual(len(asyncio.all_tasks()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()